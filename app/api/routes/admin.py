@@ -0,0 +1,191 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.core.security import require_admin
+from app.services.history_recorder import history_recorder
+from app.services.weather_service import weather_service
+from app.services.event_service import event_service
+from app.services.competitor_service import competitor_service
+from app.services.pricing_engine import pricing_engine
+from app.services.http_client import http_client
+from app.services.cache_sweeper import cache_sweeper
+from app.services.cache_prewarmer import cache_prewarmer
+from app.utils.profiler import request_profiler, collapsed, top_functions
+from app.utils.rate_limit import address_rate_limiter, rate_limiter
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/history-recorder")
+async def history_recorder_stats():
+    """
+    Counters of the pricing history write-behind buffer
+
+    **Returns:**
+    - pending: Rows waiting in the queue
+    - queued / flushed / dropped / failed: Row counters since startup
+    - rejected: Rows offered after shutdown began flushing the queue
+    """
+    return history_recorder.stats()
+
+
+@router.get("/cache")
+async def cache_stats():
+    """
+    Statistics of the in-memory (L1) weather and event caches, the segments
+    shared by the workers, the competitor stats index and the pricing result cache
+
+    **Returns:**
+    - l1: size / maxsize, hits, misses, hit_rate, evictions, expirations
+    - shared: live entries, this worker's hits / misses / writes, waits on another worker's load
+    - coalescing: loads started and requests that joined an in-flight load
+    """
+    return {
+        "weather": weather_service.cache_stats(),
+        "events": event_service.cache_stats(),
+        "competitors": competitor_service.index_stats(),
+        "pricing": pricing_engine.cache_stats()
+    }
+
+
+@router.get("/cache/sweeper")
+async def cache_sweeper_stats():
+    """Runs and rows deleted by the cache table retention sweeper"""
+    return cache_sweeper.stats()
+
+
+@router.post("/cache/sweeper/run")
+async def run_cache_sweeper():
+    """Sweep expired cache rows now, returns rows deleted per table"""
+    return {"deleted": await cache_sweeper.sweep()}
+
+
+@router.get("/cache/prewarmer")
+async def cache_prewarmer_stats():
+    """
+    Refresh-ahead counters per cache
+
+    **Returns:**
+    - refreshed / warmed / failed / skipped: Refresh outcomes since startup
+    - avg/min_lead_seconds: Time entries had left when they were refreshed
+    - misses_avoided: Requests served by a refreshed entry after the old one would have expired
+    - hot_keys: Hottest keys with their decayed request score and seconds to expiry
+    """
+    return cache_prewarmer.stats()
+
+
+@router.post("/cache/prewarmer/run")
+async def run_cache_prewarmer():
+    """Scan for hot keys now, returns how many refreshes were scheduled"""
+    return {"scheduled": cache_prewarmer.scan()}
+
+
+@router.delete("/cache/weather/{city}")
+async def invalidate_weather(city: str):
+    """Drop a city from the in-memory weather cache"""
+    return {"city": city, "invalidated": weather_service.invalidate_cache(city)}
+
+
+@router.delete("/cache/events/{location}")
+async def invalidate_events(location: str):
+    """Drop a city's event snapshot from the in-memory event cache"""
+    return {"location": location, "invalidated": event_service.invalidate_cache(location)}
+
+
+@router.get("/http")
+async def http_client_stats():
+    """
+    Shared upstream HTTP client instrumentation
+
+    **Returns:**
+    - pool: open / idle connections, in-flight and peak in-flight requests
+    - upstreams: requests, errors, status codes and latency per upstream API
+    - circuits: circuit breaker state, failure rate in the window, times opened and calls refused
+    - quotas: call budget use this minute / day and allowed / deferred / exhausted decisions
+    """
+    return {
+        **http_client.stats(),
+        "quotas": {"openweather": weather_service.quota.stats(), "ticketmaster": event_service.quota.stats()},
+    }
+
+
+@router.post("/http/circuits/{upstream}/reset")
+async def reset_circuit(upstream: str):
+    """Close an upstream's circuit now, e.g. once an outage is known to be over"""
+    breaker = http_client.breakers.get(upstream)
+    if breaker is None:
+        raise HTTPException(status_code=404, detail=f"No circuit for upstream {upstream}")
+    breaker.reset()
+    return breaker.stats()
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats():
+    """
+    Inbound rate limiter counters
+
+    **Returns:**
+    - clients: Token buckets currently kept
+    - allowed / limited: Requests let through and refused with 429
+    - evicted_idle / evicted_capacity: Buckets dropped after refilling, or to stay under RATE_LIMIT_MAX_CLIENTS
+    - address: The same for the per-address buckets behind RATE_LIMIT_CLIENT_HEADER
+    """
+    return {**rate_limiter.stats(), "address": address_rate_limiter.stats()}
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    Request profiles kept in the ring buffer, newest last
+
+    Requests are profiled when an admin sends X-Profile: 1 (or ?profile=1)
+    with X-Admin-Key, or 1 in PROFILING_SAMPLE_EVERY requests. Profiled
+    responses carry an X-Profile-Id header. The GIL switch interval is not
+    changed, so CPU-bound code is sampled about every 5 ms, not every interval_ms.
+    """
+    return {
+        **request_profiler.stats(),
+        "profiles": [profile.summary() for profile in request_profiler.profiles()]
+    }
+
+
+def _render_profile(samples, format: str, limit: int):
+    if format == "collapsed":
+        return PlainTextResponse(collapsed(samples))
+    return top_functions(samples, limit)
+
+
+@router.get("/profiles/combined")
+async def combined_profile(
+    format: str = Query("top", pattern="^(top|collapsed)$"),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """Every kept profile merged, the useful view for sampled requests"""
+    return _render_profile(request_profiler.combined(), format, limit)
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: int,
+    format: str = Query("top", pattern="^(top|collapsed)$"),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """
+    One request's profile
+
+    **Formats:**
+    - top: functions by self / total samples and self samples per package (pydantic, sqlalchemy, httpx, app, ...)
+    - collapsed: "frame;frame;frame count" lines for flamegraph.pl or speedscope
+    """
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found, it may have been evicted")
+    rendered = _render_profile(profile.samples, format, limit)
+    if format == "collapsed":
+        return rendered
+    return {**profile.summary(), **rendered}
+
+
+@router.delete("/profiles")
+async def clear_profiles():
+    """Empty the profile ring buffer"""
+    return {"cleared": request_profiler.clear()}
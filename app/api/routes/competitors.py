@@ -0,0 +1,84 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.schemas.competitors import CompetitorPriceBatch, CompetitorStats
+from app.services.competitor_service import competitor_service
+from app.services.competitor_ingest import ingest_stream, IngestError, FORMAT_CSV, FORMAT_NDJSON
+from app.db.database import get_db
+
+router = APIRouter(prefix="/api/competitors", tags=["Competitors"])
+
+
+@router.post("/prices")
+async def record_competitor_prices(request: CompetitorPriceBatch, db=Depends(get_db)):
+    """
+    Record observed competitor prices
+
+    Raw prices are stored and each affected menu item's aggregate (latest price
+    per competitor, mean, median, trimmed mean, p25/p75) is updated in the same
+    transaction. An observation older than the stored one for that competitor
+    is kept in the raw table but doesn't change the aggregate.
+
+    **Parameters:**
+    - prices: List of {menu_item_id, competitor_name, price, recorded_at}
+
+    **Returns:**
+    - recorded: Number of prices stored
+    - stats: Updated aggregate per menu item
+    """
+    try:
+        updated = await competitor_service.record_prices(request.prices, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error recording competitor prices: {str(e)}")
+
+    return {
+        "recorded": len(request.prices),
+        "stats": list(updated.values())
+    }
+
+
+@router.post("/prices/ingest")
+async def ingest_competitor_prices(
+    request: Request,
+    format: Optional[str] = Query(None, description="ndjson or csv, defaults from Content-Type"),
+    db=Depends(get_db)
+):
+    """
+    Bulk load competitor prices from a streamed NDJSON or CSV body
+
+    The body is parsed as it arrives and loaded in batches of
+    COMPETITOR_INGEST_BATCH_SIZE rows, so memory stays flat for any upload
+    size. Invalid rows are skipped and counted. Each batch is committed on its
+    own, a failure part way keeps the batches loaded before it.
+
+    NDJSON: one {"menu_item_id", "competitor_name", "price", "recorded_at"} object per line.
+    CSV: header row with menu_item_id, competitor_name, price and optional recorded_at.
+
+    **Returns:**
+    - accepted / rejected: Row counts
+    - batches, seconds, rows_per_sec
+    - errors: Line number and reason for the first rejected rows
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = FORMAT_CSV if "csv" in content_type else FORMAT_NDJSON
+
+    try:
+        result = await ingest_stream(request.stream(), format, db)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting competitor prices: {str(e)}")
+
+    return result.as_dict()
+
+
+@router.get("/{menu_item_id}/stats", response_model=CompetitorStats)
+async def get_competitor_stats(menu_item_id: int, db=Depends(get_db)):
+    """
+    Aggregated competitor prices for a menu item
+    Served from the in-memory index, falls back to the aggregate table
+    """
+    stats = await competitor_service.get_stats(menu_item_id, db)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No competitor prices for menu item {menu_item_id}")
+    return stats
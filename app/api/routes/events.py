@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Query
 from app.services.event_service import event_service
 from app.db.database import get_db
+from app.utils.responses import respond, negotiate, NEGOTIATED_RESPONSES
 
 router = APIRouter(prefix="/api/events", tags=["Events"])
 
 
-@router.get("/{location}")
+@router.get("/{location}", responses=NEGOTIATED_RESPONSES)
 async def get_events(
     location: str,
+    request: Request,
     radius_km: float = Query(5.0, ge=1.0, le=50.0, description="Search radius in kilometers"),
-    db: Session = Depends(get_db)
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Restaurant latitude"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Restaurant longitude"),
+    db=Depends(get_db)
 ):
     """
     Fetch nearby events for a location
@@ -21,13 +25,17 @@ async def get_events(
     **Parameters:**
     - location: City or area name
     - radius_km: Search radius in kilometers (1-50)
+    - lat / lon: Restaurant coordinates, distances are from the city center without them
     
     **Returns:**
-    - List of events with name, popularity, and distance
+    - Nearest events with name, popularity, venue coordinates and distance
+    - stale / age_seconds: Present when the city's snapshot is past its TTL,
+      it's being refetched or the events API is down
     """
-    events = await event_service.get_events(location, radius_km, db)
-    return {
+    media_type = negotiate(request.headers.get("accept"))
+    events = await event_service.get_events(location, radius_km, db, lat, lon)
+    return respond({
         "location": location,
         "radius_km": radius_km,
         "events": events
-    }
\ No newline at end of file
+    }, media_type)
\ No newline at end of file
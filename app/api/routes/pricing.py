@@ -1,15 +1,41 @@
-from fastapi import APIRouter , HTTPException , Depends 
+import asyncio
+import time
+from fastapi import APIRouter , HTTPException , Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Float, cast, func, tuple_
 from sqlalchemy.orm import Session 
-from app.schemas.pricing import PricingRequest , PricingResponse 
+from typing import Awaitable, Dict, List, Optional, Tuple
+from app.schemas.pricing import (
+    PricingRequest , PricingResponse, BatchPricingRequest, BatchPricingResponse,
+    AutoPricingRequest, AutoPricingResponse, WeatherData, EventData
+)
 from app.services.pricing_engine import pricing_engine 
-from app.db.database import get_db 
+from app.services.weather_service import weather_service, FALLBACK_NOTES
+from app.services.event_service import event_service
+from app.services.competitor_service import competitor_service
+from app.schemas.competitors import CompetitorStats
+from app.core.config import settings
+from app.db.database import get_db, run_db
 from app.models.database import PricingHistory
-from datetime import datetime
+from app.services.history_recorder import history_recorder, history_record
+from app.services.history_export import iter_export, MEDIA_TYPES as EXPORT_MEDIA_TYPES
+from datetime import datetime, timezone
+from app.utils.helpers import encode_cursor, decode_cursor
+from app.utils.metrics import metrics, observe_request_stage, handled_errors
+from app.utils.responses import respond, negotiate, NEGOTIATED_RESPONSES
 
 router = APIRouter(prefix="/api/pricing", tags=["Pricing"])
 
-@router.post("/suggest", response_model=PricingResponse)
-async def suggest_price(request: PricingRequest , db:Session =Depends(get_db)):
+# Used when the weather source is unavailable, gives a weather factor of exactly 1.0
+NEUTRAL_WEATHER = WeatherData(temperature=15.0, condition="Unknown")
+
+# validation: request arrival to handler entry (body parsing, schema validation, dependencies)
+PRICING_STAGE_SECONDS = metrics.histogram(
+    "pricing_stage_duration_seconds", "Time per stage of the pricing endpoints", ["endpoint", "stage"],
+)
+
+@router.post("/suggest", response_model=PricingResponse, responses=NEGOTIATED_RESPONSES)
+async def suggest_price(request: PricingRequest, http_request: Request):
     """
     Generate AI-powered pricing suggestions for menu items
     
@@ -19,7 +45,8 @@ async def suggest_price(request: PricingRequest , db:Session =Depends(get_db)):
     **Parameters:**
     - menu_item_id: Unique identifier for the menu item
     - current_price: Current price of the item
-    - competitor_prices: List of competitor prices for similar items
+    - competitor_prices: List of competitor prices for similar items, optional;
+      the item's stored competitor stats (POST /api/competitors/prices) are used without it
     - weather: Weather conditions (temperature, condition)
     - events: List of nearby events affecting demand
     
@@ -28,60 +55,420 @@ async def suggest_price(request: PricingRequest , db:Session =Depends(get_db)):
     - factors: Weights used in calculation
     - reasoning: Human-readable explanation
     """
+    observe_request_stage(PRICING_STAGE_SECONDS, "suggest", "validation")
+    media_type = negotiate(http_request.headers.get("accept"))
     try:
-        response = pricing_engine.suggest_price(request)
+        stage = time.perf_counter()
+        competitor_stats, = await _stored_competitor_stats([request])
+        response = pricing_engine.suggest_price(request, competitor_stats)
 
-        try:
-            avg_competitor =(sum(request.competitor_prices)/ len(request.competitor_prices) if request.competitor_prices else request.current_price)
-            
-            history_entry = PricingHistory(
-                menu_item_id=request.menu_item_id,
-                current_price=request.current_price,
-                recommended_price=response.recommended_price,
-                competitor_avg_price=avg_competitor,
-                weather_condition=request.weather.condition,
-                temperature=request.weather.temperature,
-                event_count=len(request.events),
-                reasoning=response.reasoning,
-                created_at=datetime.utcnow()
-            )
-            
-            db.add(history_entry)
-            db.commit() 
-        except Exception as db_error:
-            # Don't fail the request if database save fails
-            print(f"Error saving to database: {db_error}")
-            db.rollback()
+        avg_competitor = pricing_engine.competitor_average(request, competitor_stats)
+        if avg_competitor is None:
+            avg_competitor = request.current_price
+        PRICING_STAGE_SECONDS.observe_since(stage, "suggest", "factors")
         
-        return response
+        # History is written behind by the recorder, a full queue never fails the request
+        stage = time.perf_counter()
+        recorded = await history_recorder.record(history_record(request, response, avg_competitor))
+        PRICING_STAGE_SECONDS.observe_since(stage, "suggest", "history_write")
+        
+        return _history_dropped(respond(response, media_type), 0 if recorded else 1)
     
     except Exception as e:
         raise HTTPException(status_code=500,detail=f"Error calculating price: {str(e)}")
 
 
-@router.get("/history/{menu_item_id}")
-async def get_pricing_history(menu_item_id: int,limit: int = 10,db: Session = Depends(get_db)):
+@router.post("/suggest/batch", response_model=BatchPricingResponse, responses=NEGOTIATED_RESPONSES)
+async def suggest_prices_batch(request: BatchPricingRequest, http_request: Request):
+    """
+    Generate pricing suggestions for many menu items in one call
+
+    Evaluates the whole batch with the vectorized pricing engine and hands all
+    history rows to the recorder, which writes them with bulk inserts. Stored
+    competitor stats for the items sent without competitor_prices are read in
+    one lookup. Results are identical to calling /suggest once per item and are
+    returned in request order.
+
+    **Parameters:**
+    - items: List of pricing requests (same shape as /suggest)
+
+    **Returns:**
+    - count: Number of priced items
+    - results: Pricing suggestion per item
+    """
+    if len(request.items) > settings.PRICING_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, max {settings.PRICING_BATCH_MAX_ITEMS} items"
+        )
+
+    observe_request_stage(PRICING_STAGE_SECONDS, "suggest_batch", "validation")
+    media_type = negotiate(http_request.headers.get("accept"))
+    try:
+        stage = time.perf_counter()
+        competitor_stats = await _stored_competitor_stats(request.items)
+        responses = pricing_engine.suggest_prices_batch(request.items, competitor_stats)
+        PRICING_STAGE_SECONDS.observe_since(stage, "suggest_batch", "factors")
+
+        stage = time.perf_counter()
+        now = datetime.utcnow()
+        records = []
+        for item, stats, response in zip(request.items, competitor_stats, responses):
+            avg_competitor = pricing_engine.competitor_average(item, stats)
+            records.append(history_record(
+                item, response, item.current_price if avg_competitor is None else avg_competitor, now
+            ))
+        recorded = await history_recorder.record_many(records)
+        PRICING_STAGE_SECONDS.observe_since(stage, "suggest_batch", "history_write")
+        dropped = len(responses) - recorded
+        if dropped:
+            # the rows themselves are counted by history_rows{outcome}
+            handled_errors.inc("history_batch_dropped")
+
+        # results are engine output, model_construct skips revalidating every item
+        return _history_dropped(
+            respond(BatchPricingResponse.model_construct(count=len(responses), results=responses), media_type),
+            dropped
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating prices: {str(e)}")
+
+
+@router.post("/auto", response_model=AutoPricingResponse, responses=NEGOTIATED_RESPONSES)
+async def auto_price(request: AutoPricingRequest, http_request: Request, db=Depends(get_db)):
+    """
+    Server-side pricing: look up all inputs and suggest a price in one call
+
+    Weather, nearby events and stored competitor aggregates are fetched concurrently,
+    each within its own time budget. A source that is slow or failing is skipped
+    (neutral weather, no events, no competitor stats) instead of failing the request.
+    Weather and events past their cache TTL are still used, marked stale, while
+    they're refetched or while the upstream API is down.
+
+    **Parameters:**
+    - menu_item_id: Unique identifier for the menu item
+    - city: City used for the weather and event lookups
+    - current_price: Current price of the item
+    - radius_km: Event search radius (default 5)
+    - latitude / longitude: Restaurant position, events are measured from the city center without it
+
+    **Returns:**
+    - The /suggest response plus the inputs used
+    - sources: ok, stale, timeout or error per input source
+    - data_age_seconds: Age of the stale inputs
+    - timings_ms: Time spent per source, fan-out, pricing and total
+    """
+    observe_request_stage(PRICING_STAGE_SECONDS, "auto", "validation")
+    media_type = negotiate(http_request.headers.get("accept"))
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    sources: Dict[str, str] = {}
+
+    weather, events_with_age, competitor_stats = await asyncio.gather(
+        _fetch_source(
+            "weather", weather_service.get_weather(request.city, db),
+            settings.AUTO_PRICING_WEATHER_TIMEOUT_SECONDS, timings, sources
+        ),
+        _fetch_source(
+            "events", event_service.get_events_with_age(
+                request.city, request.radius_km, db, request.latitude, request.longitude
+            ),
+            settings.AUTO_PRICING_EVENTS_TIMEOUT_SECONDS, timings, sources
+        ),
+        _fetch_source(
+            "competitors", competitor_service.get_stats(request.menu_item_id),
+            settings.AUTO_PRICING_COMPETITOR_TIMEOUT_SECONDS, timings, sources
+        ),
+    )
+    timings["fan_out"] = _elapsed_ms(start)
+    PRICING_STAGE_SECONDS.observe_since(start, "auto", "fan_out")
+
+    data_age: Dict[str, float] = {}
+    if weather and weather.get("note") in FALLBACK_NOTES:
+        # stand-in values, nothing cached was left to serve
+        weather = None
+        sources["weather"] = "error"
+    elif weather and weather.get("stale"):
+        sources["weather"] = "stale"
+        data_age["weather"] = weather["age_seconds"]
+    events, events_age = events_with_age or (None, None)
+    if events_age is not None:
+        # the snapshot's age, stale even when no event falls in the radius
+        sources["events"] = "stale"
+        data_age["events"] = round(events_age)
+
+    try:
+        pricing_start = time.perf_counter()
+        pricing_request = PricingRequest(
+            menu_item_id=request.menu_item_id,
+            current_price=request.current_price,
+            competitor_prices=[],
+            weather=(
+                WeatherData(temperature=weather["temperature"], condition=weather["condition"])
+                if weather else NEUTRAL_WEATHER
+            ),
+            events=[
+                EventData(
+                    name=event.get("name", "Unknown"),
+                    popularity=event.get("popularity", "Medium"),
+                    distance_km=event.get("distance_km", request.radius_km / 2)
+                )
+                for event in events or []
+            ]
+        )
+        response = pricing_engine.suggest_price(pricing_request, competitor_stats)
+        timings["pricing"] = _elapsed_ms(pricing_start)
+
+        avg_competitor = pricing_engine.competitor_average(pricing_request, competitor_stats)
+        if avg_competitor is None:
+            avg_competitor = pricing_request.current_price
+        PRICING_STAGE_SECONDS.observe_since(pricing_start, "auto", "factors")
+
+        stage = time.perf_counter()
+        recorded = await history_recorder.record(history_record(pricing_request, response, avg_competitor))
+        PRICING_STAGE_SECONDS.observe_since(stage, "auto", "history_write")
+        timings["total"] = _elapsed_ms(start)
+
+        return _history_dropped(respond(AutoPricingResponse(
+            menu_item_id=response.menu_item_id,
+            recommended_price=response.recommended_price,
+            factors=response.factors,
+            reasoning=response.reasoning,
+            weather=pricing_request.weather,
+            events=pricing_request.events,
+            competitor_prices=list(competitor_stats.latest_prices.values()) if competitor_stats else [],
+            competitor_stats=competitor_stats,
+            sources=sources,
+            data_age_seconds=data_age,
+            timings_ms=timings
+        ), media_type), 0 if recorded else 1)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating price: {str(e)}")
+
+
+@router.get("/history/export")
+async def export_pricing_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    menu_item_ids: Optional[List[int]] = Query(None, description="Repeat to export several items, all items when omitted"),
+    start: Optional[datetime] = Query(None, description="Inclusive lower bound on created_at"),
+    end: Optional[datetime] = Query(None, description="Exclusive upper bound on created_at"),
+):
+    """
+    Stream pricing history as NDJSON or CSV for offline analysis
+
+    Rows are read from a server-side cursor HISTORY_EXPORT_CHUNK_ROWS at a time
+    and sent with chunked transfer encoding, so memory use doesn't depend on
+    the export size. Ordered by menu item, then time.
+    """
+    return StreamingResponse(
+        iter_export(menu_item_ids, _naive_utc(start), _naive_utc(end), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="pricing_history.{format}"'}
+    )
+
+
+@router.get("/history/{menu_item_id}", responses=NEGOTIATED_RESPONSES)
+async def get_pricing_history(
+    menu_item_id: int,
+    http_request: Request,
+    limit: int = Query(10, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db=Depends(get_db)
+):
     """
-    Get historical pricing data for a menu item
+    Get historical pricing data for a menu item, newest first
     Useful for analyzing pricing trends over time
+
+    Pages are keyset paginated on (created_at, id): pass the returned
+    next_cursor to get the following page, it's null on the last page.
     """
+    media_type = negotiate(http_request.headers.get("accept"))
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        history = db.query(PricingHistory).filter(PricingHistory.menu_item_id == menu_item_id).order_by(PricingHistory.created_at.desc()
-        ).limit(limit).all()
+        rows = await run_db(db, _query_history, menu_item_id, limit + 1, position)
+        page = rows[:limit]
         
-        return {
+        return respond({
             "menu_item_id": menu_item_id,
             "history": [
                 {
+                    "id": h.id,
                     "date": h.created_at.isoformat(),
                     "current_price": h.current_price,
                     "recommended_price": h.recommended_price,
                     "competitor_avg": h.competitor_avg_price,
                     "reasoning": h.reasoning
                 }
-                for h in history
-            ]
-        }
+                for h in page
+            ],
+            "next_cursor": encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+        }, media_type)
     
     except Exception as e:
-        raise HTTPException(status_code=500,detail=f"Error fetching history: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500,detail=f"Error fetching history: {str(e)}")
+
+
+@router.get("/history/{menu_item_id}/analytics", responses=NEGOTIATED_RESPONSES)
+async def get_pricing_analytics(
+    menu_item_id: int,
+    http_request: Request,
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    start: Optional[datetime] = Query(None, description="Inclusive lower bound on created_at"),
+    end: Optional[datetime] = Query(None, description="Exclusive upper bound on created_at"),
+    db=Depends(get_db)
+):
+    """
+    Time-bucketed pricing history for charting
+
+    Aggregation runs in the database, only one row per bucket is returned.
+    Weeks start on Monday.
+
+    **Returns per bucket:**
+    - count: Pricing decisions in the bucket
+    - avg/min/max_recommended_price
+    - avg_uplift_pct: Mean (recommended - current) / current, in percent
+    - total_events / avg_events: Nearby events seen by those decisions
+    """
+    media_type = negotiate(http_request.headers.get("accept"))
+    try:
+        buckets = await run_db(db, _query_analytics, menu_item_id, bucket, _naive_utc(start), _naive_utc(end))
+
+        return respond({
+            "menu_item_id": menu_item_id,
+            "bucket": bucket,
+            "buckets": [
+                {
+                    "bucket_start": _bucket_start(row.bucket_start),
+                    "count": row.count,
+                    "avg_recommended_price": round(row.avg_recommended_price, 2),
+                    "min_recommended_price": row.min_recommended_price,
+                    "max_recommended_price": row.max_recommended_price,
+                    "avg_uplift_pct": round(row.avg_uplift * 100, 3) if row.avg_uplift is not None else None,
+                    "total_events": row.total_events or 0,
+                    "avg_events": round(row.avg_events or 0.0, 3)
+                }
+                for row in buckets
+            ]
+        }, media_type)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching analytics: {str(e)}")
+
+
+def _query_history(db: Session, menu_item_id: int, limit: int, position: Optional[Tuple[datetime, int]] = None):
+    """History rows for a menu item, newest first, starting after a (created_at, id) position"""
+    query = db.query(
+        PricingHistory.id, PricingHistory.created_at, PricingHistory.current_price,
+        PricingHistory.recommended_price, PricingHistory.competitor_avg_price, PricingHistory.reasoning
+    ).filter(PricingHistory.menu_item_id == menu_item_id)
+    if position is not None:
+        created_at, row_id = position
+        query = query.filter(
+            tuple_(PricingHistory.created_at, PricingHistory.id) < tuple_(_naive_utc(created_at), row_id)
+        )
+    return query.order_by(PricingHistory.created_at.desc(), PricingHistory.id.desc()).limit(limit).all()
+
+
+def _bucket_expression(db: Session, bucket: str):
+    """SQL expression truncating created_at to the start of its bucket"""
+    if db.get_bind().dialect.name == "sqlite":
+        if bucket == "hour":
+            return func.strftime("%Y-%m-%d %H:00:00", PricingHistory.created_at)
+        if bucket == "day":
+            return func.date(PricingHistory.created_at)
+        # move forward to Sunday, then back to that week's Monday
+        return func.date(PricingHistory.created_at, "weekday 0", "-6 days")
+    return func.date_trunc(bucket, PricingHistory.created_at)
+
+
+def _query_analytics(db: Session, menu_item_id: int, bucket: str,
+                     start: Optional[datetime], end: Optional[datetime]):
+    """
+    Per-bucket aggregates of a menu item's history, computed in SQL
+    Averages are cast to Float, Postgres' avg() of an integer is numeric (Decimal)
+    """
+    bucket_start = _bucket_expression(db, bucket).label("bucket_start")
+    query = db.query(
+        bucket_start,
+        func.count(PricingHistory.id).label("count"),
+        cast(func.avg(PricingHistory.recommended_price), Float).label("avg_recommended_price"),
+        func.min(PricingHistory.recommended_price).label("min_recommended_price"),
+        func.max(PricingHistory.recommended_price).label("max_recommended_price"),
+        cast(func.avg(
+            (PricingHistory.recommended_price - PricingHistory.current_price) / PricingHistory.current_price
+        ), Float).label("avg_uplift"),
+        func.sum(PricingHistory.event_count).label("total_events"),
+        cast(func.avg(PricingHistory.event_count), Float).label("avg_events"),
+    ).filter(PricingHistory.menu_item_id == menu_item_id)
+    if start is not None:
+        query = query.filter(PricingHistory.created_at >= start)
+    if end is not None:
+        query = query.filter(PricingHistory.created_at < end)
+    return query.group_by(bucket_start).order_by(bucket_start).all()
+
+
+def _bucket_start(value) -> str:
+    """Bucket label as ISO 8601, SQLite returns strings and Postgres datetimes"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return datetime.fromisoformat(value).isoformat()
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """History timestamps are stored as naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def _fetch_source(name: str, source: Awaitable, timeout: float,
+                        timings: Dict[str, float], sources: Dict[str, str]):
+    """Await one pricing input within its budget, None when it times out or fails"""
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(source, timeout)
+        sources[name] = "ok"
+        return result
+    except asyncio.TimeoutError:
+        sources[name] = "timeout"
+        handled_errors.inc(f"auto_{name}_timeout")
+    except Exception as e:
+        print(f"Error fetching {name} for auto pricing: {e}")
+        handled_errors.inc(f"auto_{name}")
+        sources[name] = "error"
+    finally:
+        timings[name] = _elapsed_ms(start)
+    return None
+
+
+async def _stored_competitor_stats(items: List[PricingRequest]) -> List[Optional[CompetitorStats]]:
+    """
+    Stored competitor stats per item, None for items that carry their own
+    competitor_prices. A failed lookup prices without competitors, like /auto
+    """
+    wanted = [item.menu_item_id for item in items if not item.competitor_prices]
+    stats: Dict[int, CompetitorStats] = {}
+    if wanted:
+        try:
+            stats = await competitor_service.get_stats_many(wanted)
+        except Exception as e:
+            print(f"Error loading competitor stats for pricing: {e}")
+            handled_errors.inc("suggest_competitors")
+    return [None if item.competitor_prices else stats.get(item.menu_item_id) for item in items]
+
+
+def _history_dropped(response: Response, dropped: int) -> Response:
+    """Tell the client when history rows for its request were dropped by a full queue"""
+    if dropped:
+        response.headers["X-History-Dropped"] = str(dropped)
+    return response
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request
 from app.services.weather_service import weather_service
 from app.db.database import get_db
+from app.utils.responses import respond, negotiate, NEGOTIATED_RESPONSES
 
 router = APIRouter(prefix="/api/weather", tags=["Weather"])
 
 
-@router.get("/{city}")
-async def get_weather(city: str, db: Session = Depends(get_db)):
+@router.get("/{city}", responses=NEGOTIATED_RESPONSES)
+async def get_weather(city: str, request: Request, db=Depends(get_db)):
     """
     Fetch real-time weather data for a city
     
@@ -21,6 +21,9 @@ async def get_weather(city: str, db: Session = Depends(get_db)):
     - temperature: Current temperature in Celsius
     - condition: Weather condition (Sunny, Rainy, etc.)
     - cached: Whether data came from cache
+    - stale / age_seconds: Present when the cached data is past its TTL, it's
+      being refetched or the weather API is down
     """
+    media_type = negotiate(request.headers.get("accept"))
     weather_data = await weather_service.get_weather(city, db)
-    return weather_data
\ No newline at end of file
+    return respond(weather_data, media_type)
\ No newline at end of file
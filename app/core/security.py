@@ -0,0 +1,22 @@
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException
+from app.core.config import settings
+
+
+def is_admin_key(key: Optional[str]) -> bool:
+    """Check a key against ADMIN_API_KEY in constant time"""
+    if not settings.ADMIN_API_KEY or not key:
+        return False
+    return secrets.compare_digest(key, settings.ADMIN_API_KEY)
+
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """
+    Dependency guarding admin endpoints
+    Clients send the key in the X-Admin-Key header
+    """
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API disabled, set ADMIN_API_KEY")
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
@@ -1,23 +1,164 @@
-from sqlalchemy import create_engine
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+import anyio
+from sqlalchemy import Column, DateTime, String, Table, create_engine, delete, insert, inspect, select, text
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.utils.metrics import metrics
 
-# Create database engine
-engine = create_engine(settings.DATABASE_URL)
+T = TypeVar("T")
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_POOL_CHECKOUT_SECONDS = metrics.histogram(
+    "db_pool_checkout_duration_seconds", "Time spent waiting for a pooled database connection", ["engine"],
+)
 
-# Base class for models
-Base = declarative_base()
+
+def _engine_options(url: Union[str, URL], name: str) -> dict:
+    """
+    Pool and statement cache options shared by the sync and async engines
+    SQLite manages its own (non queue) pool so sizing only applies to server databases
+    """
+    options = {
+        "query_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "poolclass": _timed_pool_class(url, name),
+    }
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        )
+    return options
+
+
+def _timed_pool_class(url: Union[str, URL], name: str) -> type:
+    """
+    The pool class the dialect would pick for this URL, with connection checkouts timed
+    The checkout/connect pool events only fire once a connection is handed out, so
+    the time spent waiting on an exhausted QueuePool is measured around Pool.connect()
+    """
+    url = make_url(url)
+    base = url.get_dialect().get_pool_class(url)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return base.connect(self)
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe_since(start, name)
+
+    return type(f"Timed{base.__name__}", (base,), {"connect": connect})
 
 
-def get_db():
+def get_async_database_url() -> URL:
     """
-    Dependency function to get database session
-    Use in FastAPI endpoints with Depends(get_db)
+    URL for the async engine
+    Uses ASYNC_DATABASE_URL when set, otherwise swaps DATABASE_URL to an async driver
+    (asyncpg for Postgres, aiosqlite for SQLite)
     """
+    url = make_url(settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+    backend = url.get_backend_name()
+
+    if backend == "postgresql":
+        if not settings.ASYNC_DATABASE_URL:
+            url = url.set(drivername="postgresql+asyncpg")
+        if url.get_driver_name() == "asyncpg" and "prepared_statement_cache_size" not in url.query:
+            url = url.update_query_dict({
+                "prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)
+            })
+    elif backend == "sqlite" and not settings.ASYNC_DATABASE_URL:
+        url = url.set(drivername="sqlite+aiosqlite")
+
+    return url
+
+
+# Engines and session factories, created on first use rather than on import:
+# importing the app loads no database driver and needs no reachable database
+_engine = None
+_session_factory = None
+_async_engine = None
+_async_session_factory = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """The sync engine, created on first call"""
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL, "sync"))
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                _engine = engine
+    return _engine
+
+
+def get_async_engine():
+    """The async engine, created on first call. Only used when DB_ASYNC is enabled"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+                url = get_async_database_url()
+                engine = create_async_engine(url, **_engine_options(url, "async"))
+                _async_session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+                _async_engine = engine
+    return _async_engine
+
+
+def SessionLocal() -> Session:
+    """New Session on the sync engine"""
+    get_engine()
+    return _session_factory()
+
+
+def AsyncSessionLocal():
+    """New AsyncSession on the async engine"""
+    get_async_engine()
+    return _async_session_factory()
+
+
+def dispose_engines(close: bool = True):
+    """
+    Drop the pooled connections of the engines created so far
+    close=False after a fork: the parent's connections are left alone, the
+    child just stops using them
+    """
+    if _engine is not None:
+        _engine.dispose(close=close)
+    if _async_engine is not None:
+        _async_engine.sync_engine.dispose(close=close)
+
+
+def __getattr__(name: str):
+    # database.engine / database.async_engine still work, creating the engine
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine() if settings.DB_ASYNC else None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Threads for closing standalone sessions, see db_session
+_close_limiter = anyio.CapacityLimiter(4)
+
+# Base class for models
+Base = declarative_base()
+
+
+def _get_sync_db():
+    """Yield a regular Session, FastAPI runs this dependency in its threadpool"""
     db = SessionLocal()
     try:
         yield db
@@ -25,8 +166,227 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Initialize database tables"""
-    from app.models.database import PricingHistory, WeatherCache, EventCache, CompetitorPrice
-    Base.metadata.create_all(bind=engine)
-    print("Database initialized succesfully!")
\ No newline at end of file
+async def _get_async_db():
+    """Yield an AsyncSession bound to the async engine"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependency function to get database session
+# Use in FastAPI endpoints with Depends(get_db), pass the session on to run_db
+get_db = _get_async_db if settings.DB_ASYNC else _get_sync_db
+
+
+async def run_db(db: Any, fn: Callable[..., T], *args) -> T:
+    """
+    Run ORM work against the request session without blocking the event loop
+
+    fn is written against a regular Session and called as fn(session, *args).
+    On an AsyncSession it runs through run_sync on the async driver, on a
+    sync Session it is pushed to the threadpool.
+    """
+    if settings.DB_ASYNC and not isinstance(db, Session):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+
+@asynccontextmanager
+async def db_session():
+    """
+    Standalone session for work outside a request (background tasks)
+    Same flavour as get_db, use it with run_db
+    """
+    if settings.DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            # not on the shared threadpool: when all of its threads wait for a
+            # connection, closing is what gives one back
+            await anyio.to_thread.run_sync(db.close, limiter=_close_limiter)
+
+
+def _select_one(db: Session):
+    db.execute(text("SELECT 1"))
+
+
+async def ping_db(timeout: float) -> Dict:
+    """Round trip a SELECT 1 on a fresh session, used by /health"""
+    start = time.perf_counter()
+    try:
+        async with db_session() as db:
+            await asyncio.wait_for(run_db(db, _select_one), timeout)
+    except asyncio.TimeoutError:
+        return {"status": "timeout", "timeout_seconds": timeout}
+    except Exception as e:
+        return {"status": "unreachable", "error": str(e)}
+    return {"status": "connected", "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+def upsert(db: Session, model, values: dict, index_elements: list, increment: tuple = ()):
+    """
+    INSERT ... ON CONFLICT DO UPDATE on Postgres and SQLite
+    Columns in increment are bumped by one on conflict (e.g. a version counter).
+    Other dialects fall back to select-then-update. Caller commits
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(model).values(**values)
+        set_ = {key: stmt.excluded[key] for key in values if key not in index_elements}
+        for key in increment:
+            set_[key] = getattr(model, key) + 1
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+        db.execute(stmt)
+        return
+
+    existing = db.query(model).filter_by(**{key: values[key] for key in index_elements}).first()
+    if existing is None:
+        db.add(model(**values))
+    else:
+        for key, value in values.items():
+            setattr(existing, key, value)
+        for key in increment:
+            setattr(existing, key, getattr(existing, key) + 1)
+
+
+def upsert_many(db: Session, model, rows: list, index_elements: list):
+    """
+    upsert for many rows with the same keys, one executemany on Postgres and SQLite
+    Other dialects upsert row by row. Caller commits
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        for values in rows:
+            upsert(db, model, values, index_elements)
+        return
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={key: stmt.excluded[key] for key in rows[0] if key not in index_elements}
+    )
+    # Core executemany on the session's connection, skips the ORM bulk path
+    db.connection().execute(stmt, rows)
+
+
+def insert_missing(db: Session, model, rows: list, index_elements: list) -> bool:
+    """
+    INSERT ... ON CONFLICT DO NOTHING on Postgres and SQLite, rows whose key
+    exists are left alone. Used to make sure a row exists before locking it
+    with SELECT ... FOR UPDATE, which can't lock a row that isn't there.
+    Returns False (nothing done) on other dialects. Caller commits
+    """
+    if not rows:
+        return True
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return False
+    stmt = insert(model.__table__).on_conflict_do_nothing(index_elements=index_elements)
+    db.connection().execute(stmt, rows)
+    return True
+
+
+# Fingerprint of the models the tables were last created from, see init_db
+schema_version = Table(
+    "schema_version", Base.metadata,
+    Column("fingerprint", String(64), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def schema_fingerprint() -> str:
+    """Hash of the tables, columns and indexes the models declare"""
+    import app.models.database  # noqa: F401, registers the models on Base.metadata
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"table {table.name}")
+        for column in table.columns:
+            parts.append(f"  {column.name} {column.type} null={column.nullable} pk={column.primary_key}")
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            parts.append(f"  index {index.name} {[c.name for c in index.columns]} unique={index.unique}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+# pg_advisory_xact_lock key serializing schema changes between workers
+SCHEMA_LOCK_KEY = 0x6D656E75
+# SQLSTATEs of an object created concurrently: duplicate_table, duplicate_object,
+# and unique_violation, which a racing CREATE TABLE raises on pg_type
+DUPLICATE_OBJECT_STATES = ("42P07", "42710", "23505")
+
+
+def _stamped_fingerprint(conn):
+    if not inspect(conn).has_table(schema_version.name):
+        # a database from before stamping or an empty one
+        return None
+    return conn.execute(select(schema_version.c.fingerprint)).scalar()
+
+
+def _sync_schema(engine: Engine, fingerprint: str, mode: str) -> str:
+    if mode != "always":
+        with engine.connect() as conn:
+            if _stamped_fingerprint(conn) == fingerprint:
+                return "current"
+    applied_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            # one worker at a time, the ones that waited find the first one's stamp
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            if mode != "always" and _stamped_fingerprint(conn) == fingerprint:
+                return "current"
+        Base.metadata.create_all(bind=conn)
+        conn.execute(delete(schema_version))
+        conn.execute(insert(schema_version).values(fingerprint=fingerprint, applied_at=applied_at))
+    return "created"
+
+
+def _is_duplicate_object(error: DBAPIError) -> bool:
+    """Whether a DDL error says the object was already created (by another worker)"""
+    state = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    if state:
+        return state in DUPLICATE_OBJECT_STATES
+    return "already exists" in str(error.orig).lower()
+
+
+def init_db(mode: Optional[str] = None) -> str:
+    """
+    Initialize database tables
+
+    mode (DB_SCHEMA_CHECK by default): "stamp" compares a fingerprint of the
+    models with the one stored in schema_version and only runs create_all when
+    they differ, so a normal boot costs one SELECT. "always" runs create_all
+    every time, "skip" does nothing (schema managed elsewhere). Returns
+    "current", "created" or "skipped"
+    """
+    mode = mode or settings.DB_SCHEMA_CHECK
+    if mode == "skip":
+        return "skipped"
+    fingerprint = schema_fingerprint()
+    engine = get_engine()
+    try:
+        result = _sync_schema(engine, fingerprint, mode)
+    except DBAPIError as e:
+        if not _is_duplicate_object(e):
+            raise
+        # another worker starting at the same time created a table first (Postgres
+        # takes an advisory lock, other databases can race), the retry skips it
+        result = _sync_schema(engine, fingerprint, mode)
+    if result == "created":
+        print("Database initialized succesfully!")
+    return result
@@ -1,8 +1,17 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware 
-from app.api.routes import pricing, weather,events 
+from app.api.routes import pricing, weather,events, admin, competitors
 from app.core.config import settings 
-from app.db.database import init_db
+from app.db.database import ping_db
+from app.services.history_recorder import history_recorder
+from app.services.http_client import http_client
+from app.services.cache_sweeper import cache_sweeper
+from app.services.cache_prewarmer import cache_prewarmer
+from app.services.schema_check import schema_check
+from app.utils.metrics import metrics, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.utils.profiler import ProfilingMiddleware
+from app.utils.rate_limit import RateLimitMiddleware
 
 
 app = FastAPI(
@@ -22,17 +31,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiled requests run under the sampler from the first middleware on
+app.add_middleware(ProfilingMiddleware)
+
+# Refused requests stop here, before any other work
+app.add_middleware(RateLimitMiddleware)
+
+# Outermost, so request latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(pricing.router)
 app.include_router(weather.router)
 app.include_router(events.router)
+app.include_router(competitors.router)
+app.include_router(admin.router)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
-    init_db()
+    """
+    Start background services, the schema check runs alongside them
+    A database that is down or slow delays the boot by at most
+    DB_SCHEMA_STARTUP_WAIT_SECONDS, the check keeps retrying after that
+    """
+    schema_check.start()
+    http_client.start()
+    history_recorder.start()
+    cache_sweeper.start()
+    cache_prewarmer.start()
+    if not await schema_check.wait():
+        print("Database schema check still pending, serving requests meanwhile")
     print(f"{settings.APP_NAME} started succesfully!") 
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered pricing history and close upstream connections before the process exits"""
+    await cache_prewarmer.stop()
+    await cache_sweeper.stop()
+    await history_recorder.stop()
+    await http_client.close()
+    await schema_check.stop()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -44,11 +84,77 @@ async def root():
     }
 
 
+def _upstreams():
+    """name -> (base url, configured), upstreams without a real API key serve mock data"""
+    return {
+        "openweather": (
+            settings.OPENWEATHER_BASE_URL,
+            settings.OPENWEATHER_API_KEY not in (None, "", "demo")
+        ),
+        "ticketmaster": (
+            settings.TICKETMASTER_BASE_URL,
+            settings.TICKETMASTER_API_KEY not in (None, "", "demo_key")
+        ),
+    }
+
+
 @app.get("/health")
-async def health_check():
-    """Detailed health check"""
+async def health_check(
+    response: Response,
+    probe: bool = Query(False, description="Send a HEAD request to each configured upstream")
+):
+    """
+    Detailed health check
+
+    The database gets a SELECT 1 round trip. Upstreams are judged by their last
+    real request, or by a live HEAD request with probe=true. Returns 503 when
+    the database is down and "degraded" when a configured upstream is unreachable
+    or the startup schema check hasn't succeeded yet.
+    """
+    timeout = settings.HEALTH_CHECK_TIMEOUT_SECONDS
+    upstream_config = _upstreams()
+    probed = [name for name, (_, configured) in upstream_config.items() if configured and probe]
+
+    database, *probes = await asyncio.gather(
+        ping_db(timeout),
+        *(http_client.probe(upstream_config[name][0], timeout) for name in probed)
+    )
+    probes = dict(zip(probed, probes))
+
+    upstreams = {}
+    for name, (_, configured) in upstream_config.items():
+        if not configured:
+            upstreams[name] = {"status": "not_configured"}
+        elif name in probes:
+            upstreams[name] = probes[name]
+        elif name in http_client.upstreams:
+            upstreams[name] = http_client.upstreams[name].reachability()
+        else:
+            upstreams[name] = {"status": "unknown"}
+        if configured and name in http_client.breakers:
+            upstreams[name]["circuit"] = http_client.breakers[name].stats()["state"]
+
+    status = "healthy"
+    if any(upstream["status"] == "unreachable" for upstream in upstreams.values()):
+        status = "degraded"
+    if schema_check.status == "pending":
+        status = "degraded"
+    if database["status"] != "connected":
+        status = "unhealthy"
+        response.status_code = 503
+
     return {
-        "status": "healthy",
-        "database": "connected",
+        "status": status,
+        "database": database,
+        "schema": schema_check.stats(),
+        "upstreams": upstreams,
         "version": settings.APP_VERSION
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, Index, UniqueConstraint
 from datetime import datetime , timezone
 from app.db.database import Base
 
@@ -12,6 +12,10 @@ class PricingHistory(Base):
     Store historical pricing decisions for analysis , Can help us track pricing changes 
     """
     __tablename__ = "pricing_history"
+    __table_args__ = (
+        # backs keyset pagination and bucketed analytics per item
+        Index("ix_pricing_history_item_created_id", "menu_item_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     menu_item_id = Column(Integer, index=True)
@@ -29,32 +33,44 @@ class WeatherCache(Base):
     """
     Cache weather data to reduce API calls
     Weather doesn't change every minute, so we can cache it
+    One current row per city, refreshed with an upsert
     """
     __tablename__ = "weather_cache"
+    __table_args__ = (
+        UniqueConstraint("city", name="uq_weather_cache_city"),
+        Index("ix_weather_cache_city_fetched_at", "city", "fetched_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    city = Column(String, index=True)
+    city = Column(String, nullable=False)
     temperature = Column(Float)
     condition = Column(String)
     raw_data = Column(JSON)
-    fetched_at = Column(DateTime, default=utc_now)
+    fetched_at = Column(DateTime, default=utc_now, index=True)
 
 
 class EventCache(Base):
     """
     Cache event data to reduce API calls
     Events don't change frequently within the same day
+    Each fetch is stored as one versioned city-wide snapshot per location,
+    holding the events as compact [name, popularity, latitude, longitude]
+    rows. Radius queries run against an in-memory grid built from it
     """
     __tablename__ = "event_cache"
+    __table_args__ = (
+        UniqueConstraint("location", name="uq_event_cache_location"),
+        Index("ix_event_cache_location_fetched_at", "location", "fetched_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    location = Column(String, index=True)
-    event_name = Column(String)
-    popularity = Column(String)
-    distance_km = Column(Float)
-    event_date = Column(DateTime)
-    raw_data = Column(JSON)
-    fetched_at = Column(DateTime, default=utc_now)
+    location = Column(String, nullable=False)
+    center_lat = Column(Float)  # reference point used when no coordinates are given
+    center_lon = Column(Float)
+    version = Column(Integer, nullable=False, default=1)
+    event_count = Column(Integer, nullable=False, default=0)
+    events = Column(JSON, nullable=False)
+    fetched_at = Column(DateTime, default=utc_now, index=True)
 
 
 class CompetitorPrice(Base):
@@ -68,4 +84,25 @@ class CompetitorPrice(Base):
     menu_item_id = Column(Integer, index=True)
     competitor_name = Column(String)
     price = Column(Float)
-    recorded_at = Column(DateTime, default=utc_now)
\ No newline at end of file
+    recorded_at = Column(DateTime, default=utc_now)
+
+
+class CompetitorPriceAggregate(Base):
+    """
+    Running summary of competitor prices per menu item
+    Keeps the latest price of each competitor and statistics over them,
+    updated incrementally whenever competitor prices are recorded
+    """
+    __tablename__ = "competitor_price_aggregates"
+    
+    menu_item_id = Column(Integer, primary_key=True)
+    latest_prices = Column(JSON, nullable=False)  # {competitor_name: [price, recorded_at]}
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float)
+    median = Column(Float)
+    trimmed_mean = Column(Float)
+    p25 = Column(Float)
+    p75 = Column(Float)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    updated_at = Column(DateTime, default=utc_now)
@@ -0,0 +1,40 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class CompetitorPriceIn(BaseModel):
+    """Schema for one observed competitor price"""
+    menu_item_id: int = Field(..., description="Menu item the price is compared against")
+    competitor_name: str = Field(..., min_length=1, description="Name of the competitor")
+    price: float = Field(..., gt=0, description="Competitor price")
+    recorded_at: Optional[datetime] = Field(None, description="When the price was observed, defaults to now")
+
+
+class CompetitorPriceBatch(BaseModel):
+    """Request schema for recording competitor prices"""
+    prices: List[CompetitorPriceIn] = Field(..., min_length=1)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prices": [
+                    {"menu_item_id": 123, "competitor_name": "Cafe Blue", "price": 240},
+                    {"menu_item_id": 123, "competitor_name": "Spice Hub", "price": 260}
+                ]
+            }
+        }
+
+
+class CompetitorStats(BaseModel):
+    """Aggregate over the latest price of each competitor for a menu item"""
+    menu_item_id: int
+    count: int = Field(..., description="Number of competitors with a price")
+    mean: float
+    median: float
+    trimmed_mean: float = Field(..., description="Mean without the top and bottom COMPETITOR_TRIM_FRACTION")
+    p25: float
+    p75: float
+    min_price: float
+    max_price: float
+    latest_prices: Dict[str, float] = Field(..., description="Latest price per competitor")
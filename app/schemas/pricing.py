@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List, Optional
+from app.schemas.competitors import CompetitorStats
 
 
 class WeatherData(BaseModel):
@@ -36,7 +37,9 @@ class PricingRequest(BaseModel):
     """Request schema for pricing suggestions"""
     menu_item_id: int = Field(..., description="Unique identifier for menu item")
     current_price: float = Field(..., gt=0, description="Current price of the item")
-    competitor_prices: List[float] = Field(..., description="List of competitor prices")
+    competitor_prices: List[float] = Field(
+        default=[], description="List of competitor prices, the stored competitor stats are used when empty"
+    )
     weather: WeatherData
     events: List[EventData] = Field(default=[], description="List of nearby events")
     
@@ -85,4 +88,48 @@ class PricingResponse(BaseModel):
                 },
                 "reasoning": "Price adjustment recommended due to: competitors are pricing higher, favorable weather (Sunny, 32°C), nearby events (Food Festival) increasing demand."
             }
-        }
\ No newline at end of file
+        }
+
+
+class BatchPricingRequest(BaseModel):
+    """Request schema for repricing many menu items in one call"""
+    items: List[PricingRequest] = Field(..., min_length=1, description="Menu items to price")
+
+
+class BatchPricingResponse(BaseModel):
+    """Response schema for batch pricing suggestions, results keep the request order"""
+    count: int
+    results: List[PricingResponse]
+
+
+
+class AutoPricingRequest(BaseModel):
+    """Request schema for server-side pricing, inputs are looked up by the server"""
+    menu_item_id: int = Field(..., description="Unique identifier for menu item")
+    city: str = Field(..., description="City used for weather and event lookups")
+    current_price: float = Field(..., gt=0, description="Current price of the item")
+    radius_km: float = Field(5.0, ge=1.0, le=50.0, description="Event search radius in kilometers")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Restaurant latitude for event distances")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Restaurant longitude for event distances")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "menu_item_id": 123,
+                "city": "Mumbai",
+                "current_price": 250
+            }
+        }
+
+
+class AutoPricingResponse(PricingResponse):
+    """Pricing suggestion plus the inputs the server gathered for it"""
+    weather: WeatherData
+    events: List[EventData]
+    competitor_prices: List[float]
+    competitor_stats: Optional[CompetitorStats] = Field(None, description="Stored competitor aggregates used for the item")
+    sources: Dict[str, str] = Field(..., description="Status per input source: ok, stale, timeout or error")
+    data_age_seconds: Dict[str, float] = Field(
+        default_factory=dict, description="Age of the inputs served stale because their source was failing or expired"
+    )
+    timings_ms: Dict[str, float] = Field(..., description="Per-stage timing breakdown in milliseconds")
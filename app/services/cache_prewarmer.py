@@ -0,0 +1,204 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Set, Tuple
+from app.core.config import settings
+from app.services.weather_service import weather_service
+from app.services.event_service import event_service
+from app.utils.metrics import metrics, handled_errors
+
+# A key whose refresh failed is left alone this long
+FAILURE_BACKOFF_SECONDS = 60.0
+
+PREWARM_REFRESHES = metrics.counter(
+    "prewarm_refreshes_total", "Prewarmer refreshes: refreshed (ahead of expiry), warmed (not cached), failed, skipped",
+    ["cache", "outcome"],
+)
+PREWARM_LEAD_SECONDS = metrics.histogram(
+    "prewarm_refresh_lead_seconds", "Time an entry had left when the prewarmer replaced it", ["cache"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+class RefreshStats:
+    """Outcome counters and lead time for one cache"""
+
+    def __init__(self):
+        self.refreshed = 0
+        self.warmed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.lead_total = 0.0
+        self.lead_min: Optional[float] = None
+
+    def observe_lead(self, lead: float):
+        self.lead_total += lead
+        self.lead_min = lead if self.lead_min is None else min(self.lead_min, lead)
+
+    def as_dict(self) -> Dict:
+        return {
+            "refreshed": self.refreshed,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "avg_lead_seconds": round(self.lead_total / self.refreshed, 1) if self.refreshed else None,
+            "min_lead_seconds": round(self.lead_min, 1) if self.lead_min is not None else None,
+        }
+
+
+class CachePrewarmer:
+    """
+    Refresh-ahead for the weather and event L1 caches
+
+    The services count requests per key (decayed, see KeyHeat). Every interval
+    the prewarmer takes the key_budget hottest keys of each cache and refreshes
+    the ones expiring within lead seconds, plus a random jitter so keys cached
+    together don't all refresh in the same scan. Hot keys that aren't cached
+    at all are warmed. At most max_concurrency upstream calls run at once, so
+    with interval well below lead a hot key never expires on the request path.
+    """
+
+    def __init__(self, caches: Dict, interval: float = 5.0, key_budget: int = 50,
+                 lead: float = 60.0, jitter: float = 30.0, max_concurrency: int = 4,
+                 min_score: float = 2.0):
+        self.caches = caches
+        self.interval = interval
+        self.key_budget = key_budget
+        self.lead = lead
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.min_score = min_score
+
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Set[Tuple[str, str]] = set()
+        self._refreshes: Set[asyncio.Task] = set()
+        self._backoff: Dict[Tuple[str, str], float] = {}
+
+        # Counters
+        self.scans = 0
+        self.stats_by_cache = {name: RefreshStats() for name in caches}
+
+    def start(self):
+        """Start the scan loop on the running event loop"""
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        if self.interval >= self.lead:
+            print("PREWARM_INTERVAL_SECONDS is not below PREWARM_LEAD_SECONDS, hot keys can still expire")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        tasks = [self._task] if self._task is not None else []
+        tasks += list(self._refreshes)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._refreshes.clear()
+        self._pending.clear()
+
+    def scan(self) -> int:
+        """Schedule refreshes for hot keys close to expiry, returns how many were scheduled"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        now = time.monotonic()
+        scheduled = 0
+        for name, service in self.caches.items():
+            for key, _ in service.heat.hottest(self.key_budget, self.min_score):
+                if (name, key) in self._pending or self._backoff.get((name, key), 0) > now:
+                    continue
+                remaining = service.expires_in(key)
+                if remaining is not None and remaining > self.lead + random.uniform(0, self.jitter):
+                    continue
+                self._pending.add((name, key))
+                task = asyncio.get_running_loop().create_task(self._refresh(name, service, key))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+                scheduled += 1
+        self.scans += 1
+        return scheduled
+
+    async def _refresh(self, name: str, service, key: str):
+        stats = self.stats_by_cache[name]
+        try:
+            async with self._semaphore:
+                # the entry may have been replaced while waiting for a slot
+                remaining = service.expires_in(key)
+                if remaining is not None and remaining > self.lead + self.jitter:
+                    stats.skipped += 1
+                    PREWARM_REFRESHES.inc(name, "skipped")
+                    return
+                try:
+                    replaced = await service.refresh(key)
+                except Exception as e:
+                    print(f"Error prewarming {name} for {key}: {e}")
+                    handled_errors.inc("prewarm")
+                    replaced = False
+
+            if not replaced:
+                stats.failed += 1
+                PREWARM_REFRESHES.inc(name, "failed")
+                self._backoff[(name, key)] = time.monotonic() + FAILURE_BACKOFF_SECONDS
+            elif remaining is None:
+                stats.warmed += 1
+                PREWARM_REFRESHES.inc(name, "warmed")
+            else:
+                stats.refreshed += 1
+                stats.observe_lead(remaining)
+                PREWARM_REFRESHES.inc(name, "refreshed")
+                PREWARM_LEAD_SECONDS.observe(remaining, name)
+                # the first request after the old expiry would have been a miss
+                service.heat.mark_refreshed(key, time.monotonic() + remaining)
+        finally:
+            self._pending.discard((name, key))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Error scanning hot cache keys: {e}")
+                handled_errors.inc("prewarm")
+            now = time.monotonic()
+            self._backoff = {key: until for key, until in self._backoff.items() if until > now}
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "scans": self.scans,
+            "in_flight": len(self._pending),
+            "caches": {
+                name: {
+                    **self.stats_by_cache[name].as_dict(),
+                    "misses_avoided": service.heat.misses_avoided,
+                    "tracked_keys": len(service.heat),
+                    "hot_keys": [
+                        {"key": key, "score": round(score, 2), "expires_in": _rounded(service.expires_in(key))}
+                        for key, score in service.heat.hottest(10, self.min_score)
+                    ],
+                }
+                for name, service in self.caches.items()
+            },
+        }
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+# Global instance
+cache_prewarmer = CachePrewarmer(
+    {"weather": weather_service, "events": event_service},
+    interval=settings.PREWARM_INTERVAL_SECONDS,
+    key_budget=settings.PREWARM_KEY_BUDGET,
+    lead=settings.PREWARM_LEAD_SECONDS,
+    jitter=settings.PREWARM_JITTER_SECONDS,
+    max_concurrency=settings.PREWARM_MAX_CONCURRENCY,
+    min_score=settings.PREWARM_MIN_SCORE,
+)
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import timedelta
+from typing import Dict, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import db_session, run_db
+from app.models.database import WeatherCache, EventCache, utc_now
+from app.utils.metrics import handled_errors
+
+
+class CacheSweeper:
+    """
+    Background retention sweeper for the cache tables
+
+    Every interval it deletes rows whose fetched_at is older than the table's
+    retention, batch_size rows per statement and committing between batches so
+    locks stay short. A single run stops after max_batches per table.
+    """
+
+    def __init__(self, interval: float = 300.0, batch_size: int = 1000, max_batches: int = 50):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.retention = {
+            WeatherCache: timedelta(hours=settings.WEATHER_CACHE_RETENTION_HOURS),
+            EventCache: timedelta(hours=settings.EVENT_CACHE_RETENTION_HOURS),
+        }
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.runs = 0
+        self.deleted: Dict[str, int] = {model.__tablename__: 0 for model in self.retention}
+        self.last_run_at = None
+
+    def start(self):
+        """Start the sweep loop on the running event loop"""
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def sweep(self) -> Dict[str, int]:
+        """Run one sweep over every table, returns rows deleted per table"""
+        result = {}
+        async with db_session() as db:
+            for model, retention in self.retention.items():
+                cutoff = (utc_now() - retention).replace(tzinfo=None)
+                deleted = 0
+                for _ in range(self.max_batches):
+                    count = await run_db(db, _delete_batch, model, cutoff, self.batch_size)
+                    deleted += count
+                    if count < self.batch_size:
+                        break
+                result[model.__tablename__] = deleted
+                self.deleted[model.__tablename__] += deleted
+        self.runs += 1
+        self.last_run_at = utc_now().isoformat()
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "deleted": self.deleted,
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Error sweeping cache tables: {e}")
+                handled_errors.inc("cache_sweep")
+
+
+def _delete_batch(db: Session, model, cutoff, batch_size: int) -> int:
+    """Delete up to batch_size expired rows and commit"""
+    try:
+        ids = select(model.id).where(model.fetched_at < cutoff).limit(batch_size)
+        result = db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        return result.rowcount
+    except Exception:
+        db.rollback()
+        raise
+
+
+# Global instance
+cache_sweeper = CacheSweeper(
+    interval=settings.CACHE_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.CACHE_SWEEP_BATCH_SIZE,
+)
@@ -0,0 +1,265 @@
+import asyncio
+import csv
+import io
+import json
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import run_db
+from app.models.database import CompetitorPrice, utc_now
+from app.services.competitor_service import competitor_service
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+CSV_COLUMNS = ("menu_item_id", "competitor_name", "price", "recorded_at")
+
+
+class IngestError(ValueError):
+    """The upload can't be read at all (bad header, oversized line)"""
+
+
+class IngestResult:
+    """Counters for one ingestion run"""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors: List[Dict] = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < settings.COMPETITOR_INGEST_MAX_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def as_dict(self) -> Dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.accepted / self.seconds, 1) if self.seconds else 0.0,
+            "errors": self.errors,
+        }
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[str]:
+    """
+    Split a UTF-8 byte stream into text lines without holding more than one partial line
+    Lines are split and measured as bytes (a newline byte never occurs inside
+    a multi-byte character), raises IngestError for any line longer than
+    max_line_bytes
+    """
+    pending = b""
+    first = True
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > max_line_bytes:
+            raise IngestError(f"Line longer than {max_line_bytes} bytes")
+        for line in lines:
+            yield _decode_line(line, max_line_bytes, first)
+            first = False
+    if pending:
+        yield _decode_line(pending, max_line_bytes, first)
+
+
+def _decode_line(line: bytes, max_line_bytes: int, first: bool) -> str:
+    if len(line) > max_line_bytes:
+        raise IngestError(f"Line longer than {max_line_bytes} bytes")
+    try:
+        # a byte order mark can only start the stream
+        return line.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        raise IngestError("Upload is not valid UTF-8")
+
+
+def _validate(row: Dict, now: datetime) -> Dict:
+    """Coerce one parsed row to a CompetitorPrice mapping, ValueError when it's invalid"""
+    try:
+        menu_item_id = int(row["menu_item_id"])
+        competitor_name = str(row["competitor_name"]).strip()
+        price = float(row["price"])
+    except KeyError as e:
+        raise ValueError(f"missing {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("menu_item_id must be an integer and price a number")
+
+    if not competitor_name:
+        raise ValueError("competitor_name is empty")
+    if not price > 0 or price == float("inf"):
+        raise ValueError("price must be a positive number")
+
+    recorded_at = row.get("recorded_at") or None
+    if recorded_at is None:
+        recorded_at = now
+    else:
+        try:
+            recorded_at = datetime.fromisoformat(str(recorded_at).replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError("recorded_at must be an ISO 8601 timestamp")
+        if recorded_at.tzinfo is not None:
+            recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return {
+        "menu_item_id": menu_item_id,
+        "competitor_name": competitor_name,
+        "price": price,
+        "recorded_at": recorded_at,
+    }
+
+
+async def _parse_ndjson(lines: AsyncIterator[str], result: IngestResult):
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            result.reject(line_no, "invalid JSON")
+            continue
+        if not isinstance(row, dict):
+            result.reject(line_no, "expected a JSON object")
+            continue
+        yield line_no, row
+
+
+async def _csv_records(lines: AsyncIterator[str], max_record_bytes: int):
+    """
+    (first line number, text) per CSV record, physical lines joined while a
+    quoted field is open so RFC 4180 fields can contain newlines. Quotes are
+    escaped by doubling, so an odd quote count means the record continues
+    """
+    line_no = 0
+    start = 0
+    parts: List[str] = []
+    quotes = 0
+    size = 0
+    async for line in lines:
+        line_no += 1
+        if not parts:
+            start = line_no
+        parts.append(line)
+        quotes += line.count('"')
+        size += len(line.encode())
+        if quotes % 2:
+            if size > max_record_bytes:
+                raise IngestError(f"CSV record starting on line {start} longer than {max_record_bytes} bytes")
+            continue
+        yield start, "\n".join(parts)
+        parts, quotes, size = [], 0, 0
+    if parts:
+        # unterminated quote, the reader takes the field up to the end
+        yield start, "\n".join(parts)
+
+
+async def _parse_csv(lines: AsyncIterator[str], result: IngestResult):
+    header = None
+    async for line_no, record in _csv_records(lines, settings.COMPETITOR_INGEST_MAX_LINE_BYTES):
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            missing = set(CSV_COLUMNS[:3]) - set(header)
+            if missing:
+                raise IngestError(f"CSV header is missing {', '.join(sorted(missing))}")
+            continue
+        if len(values) != len(header):
+            result.reject(line_no, f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield line_no, dict(zip(header, values))
+
+
+async def ingest_stream(chunks: AsyncIterator[bytes], fmt: str, db,
+                        batch_size: Optional[int] = None) -> IngestResult:
+    """
+    Load competitor prices from an NDJSON or CSV byte stream
+
+    Rows are validated as they are parsed and loaded batch_size at a time
+    (COPY on psycopg2, multi-row INSERT elsewhere), each batch committed with
+    its aggregate updates. Parsing of the next batch overlaps the load of the
+    previous one, so at most two batches are in memory whatever the upload size.
+    """
+    if fmt not in (FORMAT_NDJSON, FORMAT_CSV):
+        raise IngestError(f"Unsupported format {fmt}, use {FORMAT_NDJSON} or {FORMAT_CSV}")
+    batch_size = batch_size or settings.COMPETITOR_INGEST_BATCH_SIZE
+
+    result = IngestResult()
+    lines = iter_lines(chunks, settings.COMPETITOR_INGEST_MAX_LINE_BYTES)
+    rows = _parse_ndjson(lines, result) if fmt == FORMAT_NDJSON else _parse_csv(lines, result)
+
+    now = utc_now().replace(tzinfo=None)
+    batch: List[Dict] = []
+    loading: Optional[asyncio.Task] = None
+    try:
+        async for line_no, row in rows:
+            try:
+                batch.append(_validate(row, now))
+            except ValueError as e:
+                result.reject(line_no, str(e))
+                continue
+            if len(batch) >= batch_size:
+                if loading is not None:
+                    await _finish(loading, result)
+                loading = asyncio.ensure_future(run_db(db, _load_batch, batch))
+                batch = []
+
+        if loading is not None:
+            await _finish(loading, result)
+            loading = None
+        if batch:
+            await _finish(asyncio.ensure_future(run_db(db, _load_batch, batch)), result)
+    finally:
+        if loading is not None and not loading.done():
+            # don't leave a load running on a session the caller is about to close
+            await asyncio.gather(loading, return_exceptions=True)
+        result.seconds = time.perf_counter() - result.started
+    return result
+
+
+async def _finish(loading: asyncio.Task, result: IngestResult):
+    accepted, updated = await loading
+    result.accepted += accepted
+    result.batches += 1
+    competitor_service.refresh_index(updated)
+
+
+def _load_batch(db: Session, rows: List[Dict]):
+    """Insert one batch of raw prices, fold it into the aggregates and commit"""
+    try:
+        if db.get_bind().dialect.driver == "psycopg2":
+            _copy_rows(db, rows)
+        else:
+            db.connection().execute(insert(CompetitorPrice.__table__), rows)
+        updated = competitor_service.fold_into_aggregates(db, rows)
+        db.commit()
+        return len(rows), updated
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _copy_rows(db: Session, rows: List[Dict]):
+    """COPY a batch through the session's own psycopg2 connection (same transaction)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in CSV_COLUMNS])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {CompetitorPrice.__tablename__} ({', '.join(CSV_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
@@ -0,0 +1,266 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import db_session, insert_missing, run_db, upsert_many
+from app.models.database import CompetitorPrice, CompetitorPriceAggregate, utc_now
+from app.schemas.competitors import CompetitorPriceIn, CompetitorStats
+from app.utils.cache import TTLCache
+from app.utils.shared_cache import SharedCache
+
+# Cached marker for items that have no competitor prices yet
+_NO_PRICES = object()
+
+
+def _percentile(sorted_prices: List[float], q: float) -> float:
+    """Linear interpolation between closest ranks (same as numpy's default)"""
+    position = q * (len(sorted_prices) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_prices) - 1)
+    return sorted_prices[lower] + (sorted_prices[upper] - sorted_prices[lower]) * (position - lower)
+
+
+def _stats_to_json(stats) -> Optional[dict]:
+    return None if stats is _NO_PRICES else stats.model_dump()
+
+
+def _stats_from_json(data: Optional[dict]):
+    return _NO_PRICES if data is None else CompetitorStats.model_validate(data)
+
+
+class ItemAggregate:
+    """
+    Latest price per competitor for one menu item, kept in sorted order
+    Applying a new price is a bisect remove + insort, no raw rows are scanned
+    """
+
+    def __init__(self, latest: Optional[Dict[str, Tuple[float, str]]] = None):
+        self.latest: Dict[str, Tuple[float, str]] = {}
+        self.sorted_prices: List[float] = []
+        for name, (price, recorded_at) in (latest or {}).items():
+            self.latest[name] = (price, recorded_at)
+            insort(self.sorted_prices, price)
+
+    def apply(self, competitor_name: str, price: float, recorded_at: datetime) -> bool:
+        """Record a price, ignored when a newer one is already known for that competitor"""
+        stamp = recorded_at.isoformat()
+        current = self.latest.get(competitor_name)
+        if current is not None:
+            if current[1] > stamp:
+                return False
+            del self.sorted_prices[bisect_left(self.sorted_prices, current[0])]
+        self.latest[competitor_name] = (price, stamp)
+        insort(self.sorted_prices, price)
+        return True
+
+    def stats(self, menu_item_id: int) -> Optional[CompetitorStats]:
+        prices = self.sorted_prices
+        n = len(prices)
+        if n == 0:
+            return None
+        trim = int(n * settings.COMPETITOR_TRIM_FRACTION)
+        trimmed = prices[trim:n - trim] or prices
+        return CompetitorStats(
+            menu_item_id=menu_item_id,
+            count=n,
+            mean=sum(prices) / n,
+            median=_percentile(prices, 0.5),
+            trimmed_mean=sum(trimmed) / len(trimmed),
+            p25=_percentile(prices, 0.25),
+            p75=_percentile(prices, 0.75),
+            min_price=prices[0],
+            max_price=prices[-1],
+            latest_prices={name: price for name, (price, _) in self.latest.items()},
+        )
+
+
+class CompetitorService:
+    """
+    Records competitor prices and maintains per-item aggregates
+
+    Every write appends the raw CompetitorPrice rows and updates the item's
+    row in competitor_price_aggregates in the same transaction. Stats are
+    served from an in-memory index (refreshed from the aggregate table after
+    COMPETITOR_INDEX_TTL_SECONDS so writes from other workers show up), backed
+    by a segment shared with the other workers on the host: the worker that
+    writes or loads an item's stats publishes them there.
+    """
+
+    def __init__(self):
+        self._index = TTLCache(
+            maxsize=settings.COMPETITOR_INDEX_MAX_ITEMS,
+            ttl=settings.COMPETITOR_INDEX_TTL_SECONDS
+        )
+        self._shared = SharedCache(
+            "competitors", slots=settings.COMPETITOR_INDEX_MAX_ITEMS, slot_bytes=2048,
+            encode=_stats_to_json, decode=_stats_from_json,
+            directory=settings.SHARED_CACHE_DIR, lease_seconds=settings.SHARED_CACHE_LEASE_SECONDS
+        )
+
+    async def record_prices(self, prices: List[CompetitorPriceIn], db) -> Dict[int, CompetitorStats]:
+        """Store prices and return the updated stats per affected menu item"""
+        updated = await run_db(db, self._record, prices)
+        self.refresh_index(updated)
+        return updated
+
+    async def get_stats(self, menu_item_id: int, db=None) -> Optional[CompetitorStats]:
+        """
+        Stats for one menu item, O(1) when it's in the index
+        On a miss the shared segment is checked, then the aggregate row is
+        read, on a session of its own when db is None
+        """
+        cached = self._cached(menu_item_id)
+        if cached is not None:
+            return None if cached is _NO_PRICES else cached
+        if db is None:
+            async with db_session() as db:
+                stats = await run_db(db, self._load_stats, menu_item_id)
+        else:
+            stats = await run_db(db, self._load_stats, menu_item_id)
+        self._store(menu_item_id, stats if stats is not None else _NO_PRICES)
+        return stats
+
+    async def get_stats_many(self, menu_item_ids: Iterable[int], db=None) -> Dict[int, CompetitorStats]:
+        """
+        Stats for several menu items, items without prices are left out
+        Index and shared segment first, the misses are read in one query
+        """
+        found: Dict[int, CompetitorStats] = {}
+        missing = []
+        for menu_item_id in dict.fromkeys(menu_item_ids):
+            cached = self._cached(menu_item_id)
+            if cached is None:
+                missing.append(menu_item_id)
+            elif cached is not _NO_PRICES:
+                found[menu_item_id] = cached
+        if not missing:
+            return found
+        if db is None:
+            async with db_session() as db:
+                aggregates = await run_db(db, self._load_aggregates, missing)
+        else:
+            aggregates = await run_db(db, self._load_aggregates, missing)
+        for menu_item_id in missing:
+            aggregate = aggregates.get(menu_item_id)
+            stats = aggregate.stats(menu_item_id) if aggregate else None
+            self._store(menu_item_id, stats if stats is not None else _NO_PRICES)
+            if stats is not None:
+                found[menu_item_id] = stats
+        return found
+
+    def _cached(self, menu_item_id: int):
+        """Index entry for an item, adopted from the shared segment on an index miss"""
+        cached = self._index.get(menu_item_id)
+        if cached is None:
+            shared = self._shared.get(menu_item_id)
+            if shared is not None:
+                cached, ttl = shared
+                self._index.set(menu_item_id, cached, ttl=ttl)
+        return cached
+
+    def invalidate(self, menu_item_id: int) -> bool:
+        shared = self._shared.invalidate(menu_item_id)
+        return self._index.invalidate(menu_item_id) or shared
+
+    def index_stats(self) -> Dict:
+        return {**self._index.stats(), "shared": self._shared.stats()}
+
+    def refresh_index(self, updated: Dict[int, CompetitorStats]):
+        """Put freshly written stats in the index and publish them to the other workers"""
+        for menu_item_id, stats in updated.items():
+            self._store(menu_item_id, stats)
+
+    def _store(self, menu_item_id: int, stats):
+        self._index.set(menu_item_id, stats)
+        self._shared.set(menu_item_id, stats, settings.COMPETITOR_INDEX_TTL_SECONDS)
+
+    def _record(self, db: Session, prices: Iterable[CompetitorPriceIn]) -> Dict[int, CompetitorStats]:
+        """Append raw rows and fold them into the aggregates, one transaction"""
+        now = utc_now().replace(tzinfo=None)
+        rows = []
+        for price in prices:
+            recorded_at = price.recorded_at or now
+            if recorded_at.tzinfo is not None:
+                recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+            rows.append({
+                "menu_item_id": price.menu_item_id,
+                "competitor_name": price.competitor_name,
+                "price": price.price,
+                "recorded_at": recorded_at,
+            })
+
+        try:
+            db.bulk_insert_mappings(CompetitorPrice, rows)
+            updated = self.fold_into_aggregates(db, rows)
+            db.commit()
+            return updated
+        except Exception:
+            db.rollback()
+            raise
+
+    def fold_into_aggregates(self, db: Session, rows: Iterable[dict]) -> Dict[int, CompetitorStats]:
+        """
+        Apply raw price rows (naive UTC recorded_at) to their items' aggregate rows
+        Caller inserts the raw rows and commits
+        """
+        by_item: Dict[int, list] = {}
+        for row in rows:
+            by_item.setdefault(row["menu_item_id"], []).append(
+                (row["competitor_name"], row["price"], row["recorded_at"])
+            )
+
+        # FOR UPDATE only locks rows that exist: without the placeholders two
+        # first writes for an item would both read nothing and the second
+        # upsert would overwrite the first one's competitors. The second
+        # writer's placeholder insert waits on the first one's row instead
+        menu_item_ids = sorted(by_item)
+        insert_missing(db, CompetitorPriceAggregate, [
+            {"menu_item_id": menu_item_id, "latest_prices": {}, "count": 0} for menu_item_id in menu_item_ids
+        ], index_elements=["menu_item_id"])
+        aggregates = self._load_aggregates(db, menu_item_ids, for_update=True)
+        updated = {}
+        values = []
+        for menu_item_id in menu_item_ids:
+            aggregate = aggregates.get(menu_item_id) or ItemAggregate()
+            for competitor_name, price, recorded_at in by_item[menu_item_id]:
+                aggregate.apply(competitor_name, price, recorded_at)
+            stats = aggregate.stats(menu_item_id)
+            values.append({
+                "menu_item_id": menu_item_id,
+                "latest_prices": {name: list(value) for name, value in aggregate.latest.items()},
+                "count": stats.count,
+                "mean": stats.mean,
+                "median": stats.median,
+                "trimmed_mean": stats.trimmed_mean,
+                "p25": stats.p25,
+                "p75": stats.p75,
+                "min_price": stats.min_price,
+                "max_price": stats.max_price,
+                "updated_at": utc_now(),
+            })
+            updated[menu_item_id] = stats
+        upsert_many(db, CompetitorPriceAggregate, values, index_elements=["menu_item_id"])
+        return updated
+
+    def _load_aggregates(self, db: Session, menu_item_ids: List[int],
+                         for_update: bool = False) -> Dict[int, ItemAggregate]:
+        """Stored aggregates for several items in one query, missing items are left out"""
+        query = db.query(CompetitorPriceAggregate.menu_item_id, CompetitorPriceAggregate.latest_prices).filter(
+            CompetitorPriceAggregate.menu_item_id.in_(menu_item_ids)
+        ).order_by(CompetitorPriceAggregate.menu_item_id)
+        if for_update:
+            # serializes concurrent writers for the same items on Postgres, rows locked in id order
+            query = query.with_for_update()
+        return {
+            menu_item_id: ItemAggregate({name: tuple(value) for name, value in latest_prices.items()})
+            for menu_item_id, latest_prices in query.all()
+        }
+
+    def _load_stats(self, db: Session, menu_item_id: int) -> Optional[CompetitorStats]:
+        aggregate = self._load_aggregates(db, [menu_item_id]).get(menu_item_id)
+        return aggregate.stats(menu_item_id) if aggregate else None
+
+
+# Global instance
+competitor_service = CompetitorService()
@@ -1,9 +1,71 @@
-import httpx
+import asyncio
+import math
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.models.database import EventCache
+from app.db.database import db_session, run_db, upsert
+from app.services.http_client import http_client
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.quota import UpstreamQuota
+from app.models.database import EventCache, utc_now
+from app.utils.cache import TTLCache, KeyHeat
+from app.utils.shared_cache import SharedCache
+from app.utils.singleflight import SingleFlight
+from app.utils.helpers import age_seconds
+from app.utils.geo import GridIndex, centroid, EARTH_RADIUS_KM
+from app.utils.metrics import cache_lookup_seconds, handled_errors
+
+
+# Reference point of the mock data, events sit due north/south of it
+MOCK_CENTER = (19.0760, 72.8777)
+
+
+class CityEvents:
+    """
+    City-wide event snapshot with a grid index over venue coordinates
+    One instance serves any restaurant position and radius in the city
+    """
+
+    def __init__(self, events: List[list], center: Optional[Tuple[float, float]] = None):
+        self.events = events  # [name, popularity, latitude, longitude]
+        self.grid = GridIndex(settings.EVENT_GRID_CELL_KM)
+        for event in events:
+            self.grid.insert(event[2], event[3], event)
+        if center is None and events:
+            center = centroid([(event[2], event[3]) for event in events])
+        self.center = center
+
+    def nearby(self, latitude: Optional[float], longitude: Optional[float],
+               radius_km: float, limit: int) -> List[Dict]:
+        """
+        Nearest events within radius_km with haversine distances
+        Without coordinates the snapshot's center stands in for the restaurant
+        """
+        if latitude is None or longitude is None:
+            if self.center is None:
+                return []
+            latitude, longitude = self.center
+        return [
+            {
+                "name": name,
+                "popularity": popularity,
+                "distance_km": round(distance, 2),
+                "latitude": lat,
+                "longitude": lon
+            }
+            for distance, (name, popularity, lat, lon) in self.grid.query(latitude, longitude, radius_km)[:limit]
+        ]
+
+    def to_json(self) -> list:
+        """[events, center], the grid is rebuilt by from_json"""
+        return [self.events, self.center]
+
+    @classmethod
+    def from_json(cls, data: list) -> "CityEvents":
+        events, center = data
+        return cls(events, tuple(center) if center else None)
 
 
 class EventService:
@@ -15,104 +77,321 @@ class EventService:
     def __init__(self):
         self.api_key = settings.TICKETMASTER_API_KEY
         self.base_url = settings.TICKETMASTER_BASE_URL
+        self.cache_ttl = settings.EVENT_CACHE_HOURS * 3600
+        # how long past the TTL a snapshot is still served while it's refetched
+        self.max_stale = settings.EVENT_STALE_MAX_HOURS * 3600
+        # L1 in-process tier of indexed city snapshots, the event_cache table is L2
+        self._l1 = TTLCache(maxsize=settings.EVENT_L1_MAX_ENTRIES, ttl=self.cache_ttl, stale=self.max_stale)
+        # one in-flight load per city, concurrent misses share it
+        self._flight = SingleFlight()
+        # segment shared with the other workers on the host, between L1 and L2;
+        # a slot fits a full fetch of events with names of average length
+        self._shared = SharedCache(
+            "events", slots=settings.EVENT_L1_MAX_ENTRIES, slot_bytes=1024 + settings.EVENT_FETCH_SIZE * 128,
+            encode=CityEvents.to_json, decode=CityEvents.from_json,
+            directory=settings.SHARED_CACHE_DIR, lease_seconds=settings.SHARED_CACHE_LEASE_SECONDS
+        )
+        # request frequency per city, read by the cache prewarmer
+        self.heat = KeyHeat(max_keys=settings.PREWARM_TRACK_MAX_KEYS, half_life=settings.PREWARM_HALF_LIFE_SECONDS)
+        # background refetches of stale snapshots
+        self._revalidations = set()
+        # Ticketmaster call budget
+        self.quota = UpstreamQuota(
+            "ticketmaster", settings.TICKETMASTER_CALLS_PER_MINUTE, settings.TICKETMASTER_CALLS_PER_DAY,
+            settings.UPSTREAM_QUOTA_RESERVE, directory=settings.SHARED_CACHE_DIR
+        )
+
+        # Counters
+        self.stale_served = 0
     
-    async def get_events(self, location: str, radius_km: float = 5.0, 
-                         db: Optional[Session] = None) -> List[Dict]:
+    async def get_events(self, location: str, radius_km: float = 5.0, db=None,
+                         latitude: Optional[float] = None,
+                         longitude: Optional[float] = None) -> List[Dict]:
+        """Get events within radius_km of a restaurant, nearest first, see get_events_with_age"""
+        events, _ = await self.get_events_with_age(location, radius_km, db, latitude, longitude)
+        return events
+
+    async def get_events_with_age(self, location: str, radius_km: float = 5.0, db=None,
+                                  latitude: Optional[float] = None,
+                                  longitude: Optional[float] = None) -> Tuple[List[Dict], Optional[float]]:
         """
-        Get nearby events for a location
+        Get events within radius_km of a restaurant, nearest first, and the
+        snapshot's age in seconds when it is stale (None when fresh)
+        The city's snapshot comes from the in-memory tier, then the workers'
+        shared segment, then the database, then the API; passing the request session (sync or async) enables the
+        database tier. Without coordinates distances are from the city center
+        An expired snapshot within the staleness bound is used straight away
+        while it's refetched in the background, its events are marked stale
+        with the snapshot's age. The returned age covers the case of no events
+        in the radius, where there is nothing to mark
         """
-        
+        start = time.perf_counter()
+        self.heat.touch(location)
+        city = self._l1.get(location)
+        cached = city is not None
+        age = None
+        stale = None if cached else self._l1.get_stale(location)
+        if cached:
+            cache_lookup_seconds.observe_since(start, "events", "l1_hit")
+        elif stale is not None:
+            city, expired_for = stale
+            cached = True
+            age = self.cache_ttl + expired_for
+            self._revalidate(location, db is not None)
+            cache_lookup_seconds.observe_since(start, "events", "stale")
+        else:
+            city, cached, age = await self._flight.do(
+                location, lambda: self._shared_load(location, db is not None)
+            )
+            result = "stale" if age is not None else "l2_hit" if cached else "miss"
+            cache_lookup_seconds.observe_since(start, "events", result)
+        events = city.nearby(latitude, longitude, radius_km, settings.EVENT_MAX_RESULTS)
+        if age is not None:
+            self.stale_served += 1
+        for event in events:
+            event["cached"] = cached
+            if age is not None:
+                event["stale"] = True
+                event["age_seconds"] = round(age)
+        return events, age
+
+    def _revalidate(self, location: str, use_db: bool):
+        """Refetch an expired city in the background, one refetch per city at a time"""
+        if self._flight.in_flight(location):
+            return
+        task = asyncio.ensure_future(self._flight.do(location, lambda: self._shared_load(location, use_db)))
+        self._revalidations.add(task)
+        task.add_done_callback(self._revalidation_done)
+
+    def _revalidation_done(self, task: asyncio.Future):
+        self._revalidations.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error revalidating events: {task.exception()}")
+            handled_errors.inc("events_revalidate")
+
+    async def _shared_load(self, location: str, use_db: bool) -> Tuple[CityEvents, bool, Optional[float]]:
+        """
+        Coalesced L1 miss, runs once per city at a time
+        Opens its own session so it can outlive the request that started it
+        """
+        if not use_db:
+            return await self._load(location)
+        async with db_session() as db:
+            return await self._load(location, db)
+
+    async def _load(self, location: str, db=None) -> Tuple[CityEvents, bool, Optional[float]]:
+        """
+        L1 miss path: the workers' shared segment, then (one worker at a time,
+        the others wait and take its result from the segment) the database
+        tier and the API
+        Returns (snapshot, came from cache, age when stale)
+        """
+        city = self._adopt(location)
+        if city is not None:
+            return city, True, None
+        if not await self._shared.claim(location):
+            city = self._adopt(location)
+            if city is not None:
+                return city, True, None
+        try:
+            return await self._load_claimed(location, db)
+        finally:
+            self._shared.release(location)
+
+    async def _load_claimed(self, location: str, db=None) -> Tuple[CityEvents, bool, Optional[float]]:
+        """
+        Database tier, then the API
+        When the API fails the last known snapshot (stale L1 entry or L2 row)
+        is used if there is one
+        """
+        hit = None
         if db:
-            cached = self._get_from_cache(location, db)
-            if cached:
-                return cached
-        
-        events = await self._fetch_from_api(location, radius_km)
+            hit = await run_db(db, self._get_from_cache, location)
+            if hit and hit[1] < self.cache_ttl:
+                city, age = hit
+                self._store(location, city, ttl=self.cache_ttl - age)
+                return city, True, None
         
+        # with something to serve instead the call can wait when the budget is tight
+        stale = self._l1.get_stale(location)
+        events, center = await self._fetch_from_api(location, deferrable=stale is not None or hit is not None)
+        if events is None:
+            if stale is not None:
+                return stale[0], True, self.cache_ttl + stale[1]
+            if hit:
+                return hit[0], True, hit[1]
+            return CityEvents([]), False, None
+
+        # a city without upcoming events is a valid snapshot, cached like any other
+        city = CityEvents(events, center)
+        if db:
+            await run_db(db, self._save_to_cache, location, events, city.center)
+        self._store(location, city)
         
-        if db and events:
-            self._save_to_cache(location, events, db)
-        
-        return events
+        return city, False, None
+
+    def _adopt(self, location: str) -> Optional[CityEvents]:
+        """Take a snapshot another worker loaded from the shared segment into L1"""
+        shared = self._shared.get(location)
+        if shared is None:
+            return None
+        city, ttl = shared
+        self._l1.set(location, city, ttl=ttl)
+        return city
+
+    def _store(self, location: str, city: CityEvents, ttl: Optional[float] = None):
+        """Put a snapshot in L1 and publish it to the other workers"""
+        ttl = self.cache_ttl if ttl is None else ttl
+        self._l1.set(location, city, ttl=ttl)
+        self._shared.set(location, city, ttl)
+
+    def expires_in(self, location: str) -> Optional[float]:
+        """Seconds left on a city's L1 snapshot, None when it isn't cached"""
+        return self._l1.expires_in(location)
+
+    async def refresh(self, location: str) -> bool:
+        """
+        Refetch a city's events and replace both tiers, used by the prewarmer
+        Skipped while a request is already loading the city. When another
+        worker already refreshed it, its snapshot is taken instead. A failed
+        fetch keeps the current snapshot, a city whose events are over gets an
+        empty one. Returns whether it was replaced
+        """
+        if self._flight.in_flight(location):
+            return False
+        if not await self._shared.claim(location, min_ttl=(self.expires_in(location) or 0.0) + 1.0):
+            return self._adopt(location) is not None
+        try:
+            events, center = await self._fetch_from_api(location, deferrable=True)
+            if events is None:
+                return False
+            city = CityEvents(events, center)
+            async with db_session() as db:
+                await run_db(db, self._save_to_cache, location, events, city.center)
+            self._store(location, city)
+            return True
+        finally:
+            self._shared.release(location)
+
+    def invalidate_cache(self, location: str) -> bool:
+        """Drop a city's snapshot from the in-memory tier and the shared segment"""
+        shared = self._shared.invalidate(location)
+        return self._l1.invalidate(location) or shared
+
+    def cache_stats(self) -> Dict:
+        """L1 and shared segment statistics, request coalescing and stale serving counters"""
+        return {
+            "l1": self._l1.stats(),
+            "shared": self._shared.stats(),
+            "coalescing": self._flight.stats(),
+            "stale_served": self.stale_served,
+        }
     
-    def _get_from_cache(self, location: str, db: Session) -> Optional[List[Dict]]:
-        """Check if we have recent cached event data"""
+    def _get_from_cache(self, db: Session, location: str) -> Optional[Tuple[CityEvents, float]]:
+        """
+        Check if we have a recent snapshot for this city
+        Single-row read on the location unique index
+        Returns (indexed snapshot, snapshot age in seconds). Snapshots past the
+        TTL are returned while within the staleness bound, callers check the age
+        """
         cache_expiry = datetime.utcnow() - timedelta(
-            hours=settings.EVENT_CACHE_HOURS
+            seconds=self.cache_ttl + self.max_stale
         )
         
-        cached_events = db.query(EventCache).filter(
+        snapshot = db.query(
+            EventCache.events, EventCache.center_lat, EventCache.center_lon, EventCache.fetched_at
+        ).filter(
             EventCache.location == location,
             EventCache.fetched_at > cache_expiry
-        ).all()
+        ).first()
+        # end the read, the connection goes back to the pool while the API is called
+        db.rollback()
         
-        if cached_events:
-            return [
-                {
-                    "name": event.event_name,
-                    "popularity": event.popularity,
-                    "distance_km": event.distance_km,
-                    "cached": True
-                }
-                for event in cached_events
-            ]
+        if snapshot:
+            center = None
+            if snapshot.center_lat is not None and snapshot.center_lon is not None:
+                center = (snapshot.center_lat, snapshot.center_lon)
+            return CityEvents(snapshot.events, center), age_seconds(snapshot.fetched_at)
         
         return None
     
-    async def _fetch_from_api(self, location: str, radius_km: float) -> List[Dict]:
+    async def _fetch_from_api(self, location: str,
+                              deferrable: bool = False) -> Tuple[Optional[List[list]], Optional[Tuple[float, float]]]:
         """
-        Fetch events from Ticketmaster API
-        In production, use real API key and handle errors properly
+        Fetch every upcoming event of a city from Ticketmaster API
+        Returns compact [name, popularity, latitude, longitude] rows and the
+        reference center (None means the centroid of the venues). The rows are
+        None when the API failed or the call budget refused the call (deferrable:
+        cached data can be served instead), an empty list means no events
         """
         if not self.api_key or self.api_key == "demo_key":
-            # Return mock data for demo
+            # Return mock data for demo, set TICKETMASTER_API_KEY for real data
+            north = self._offset_lat(MOCK_CENTER[0], 2.5)
+            south = self._offset_lat(MOCK_CENTER[0], -4.0)
             return [
-                {
-                    "name": "Food Festival",
-                    "popularity": "High",
-                    "distance_km": 2.5,
-                    "note": "Using mock data. Set TICKETMASTER_API_KEY for real data."
-                },
-                {
-                    "name": "Music Concert",
-                    "popularity": "Medium",
-                    "distance_km": 4.0,
-                    "note": "Mock event data"
-                }
-            ]
+                ["Food Festival", "High", north, MOCK_CENTER[1]],
+                ["Music Concert", "Medium", south, MOCK_CENTER[1]]
+            ], MOCK_CENTER
+        
+        if not self.quota.acquire(deferrable):
+            return None, None
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/events.json",
-                    params={
-                        "apikey": self.api_key,
-                        "city": location,
-                        "radius": radius_km,
-                        "unit": "km"
-                    },
-                    timeout=10.0
-                )
+            response = await http_client.get(
+                f"{self.base_url}/events.json",
+                params={
+                    "apikey": self.api_key,
+                    "city": location,
+                    "size": settings.EVENT_FETCH_SIZE
+                },
+                upstream="ticketmaster",
+                timeout=settings.TICKETMASTER_TIMEOUT_SECONDS
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                events = []
+                
+                for event in data.get("_embedded", {}).get("events", []):
+                    coordinates = self._venue_coordinates(event)
+                    if coordinates is None:
+                        # can't be placed on the map, so it can't be in anyone's radius
+                        continue
+                    events.append([
+                        event.get("name", "Unknown Event"),
+                        self._determine_popularity(event),
+                        coordinates[0],
+                        coordinates[1]
+                    ])
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    events = []
-                    
-                    for event in data.get("_embedded", {}).get("events", [])[:5]:
-                        events.append({
-                            "name": event.get("name", "Unknown Event"),
-                            "popularity": self._determine_popularity(event),
-                            "distance_km": radius_km / 2,  # Approximate
-                            "cached": False
-                        })
-                    
-                    return events
-                else:
-                    return []
+                return events, None
+            else:
+                return None, None
         
+        except CircuitOpenError:
+            # the upstream is known to be down, fail fast without logging every request
+            return None, None
         except Exception as e:
             print(f"Error fetching events: {e}")
-            return []
+            handled_errors.inc("events_fetch")
+            return None, None
+
+    @staticmethod
+    def _venue_coordinates(event_data: Dict) -> Optional[Tuple[float, float]]:
+        """(lat, lon) of the event's first venue, None when Ticketmaster has no location"""
+        venues = event_data.get("_embedded", {}).get("venues", [])
+        if not venues:
+            return None
+        position = venues[0].get("location") or {}
+        try:
+            return float(position["latitude"]), float(position["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _offset_lat(latitude: float, km: float) -> float:
+        """Latitude km north (negative: south) along the meridian"""
+        return latitude + math.degrees(km / EARTH_RADIUS_KM)
     
     def _determine_popularity(self, event_data: Dict) -> str:
         """
@@ -128,21 +407,23 @@ class EventService:
         
         return "Medium"
     
-    def _save_to_cache(self, location: str, events: List[Dict], db: Session):
-        """Save events to cache"""
+    def _save_to_cache(self, db: Session, location: str, events: List[list],
+                       center: Optional[Tuple[float, float]]):
+        """Store the fetch as the new snapshot for this city (version bumped)"""
         try:
-            for event in events:
-                cache_entry = EventCache(
-                    location=location,
-                    event_name=event.get("name", "Unknown"),
-                    popularity=event.get("popularity", "Medium"),
-                    distance_km=event.get("distance_km", 5.0),
-                    raw_data=event
-                )
-                db.add(cache_entry)
+            upsert(db, EventCache, {
+                "location": location,
+                "center_lat": center[0] if center else None,
+                "center_lon": center[1] if center else None,
+                "version": 1,
+                "event_count": len(events),
+                "events": events,
+                "fetched_at": utc_now()
+            }, index_elements=["location"], increment=("version",))
             db.commit()
         except Exception as e:
             print(f"Error saving events to cache: {e}")
+            handled_errors.inc("events_cache_write")
             db.rollback()
 
 event_service = EventService()
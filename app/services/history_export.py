@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional, Sequence
+from sqlalchemy import select
+from app.core.config import settings
+from app.db.database import SessionLocal, AsyncSessionLocal
+from app.models.database import PricingHistory
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+MEDIA_TYPES = {
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_CSV: "text/csv",
+}
+
+EXPORT_COLUMNS = (
+    "id", "menu_item_id", "created_at", "current_price", "recommended_price",
+    "competitor_avg_price", "weather_condition", "temperature", "event_count", "reasoning",
+)
+
+
+def export_query(menu_item_ids: Optional[Sequence[int]] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Select for an export, ordered along the (menu_item_id, created_at, id) index"""
+    stmt = select(*(getattr(PricingHistory, column) for column in EXPORT_COLUMNS))
+    if menu_item_ids:
+        stmt = stmt.where(PricingHistory.menu_item_id.in_(menu_item_ids))
+    if start is not None:
+        stmt = stmt.where(PricingHistory.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(PricingHistory.created_at < end)
+    stmt = stmt.order_by(PricingHistory.menu_item_id, PricingHistory.created_at, PricingHistory.id)
+    # yield_per turns on stream_results, a server-side cursor on Postgres
+    return stmt.execution_options(yield_per=settings.HISTORY_EXPORT_CHUNK_ROWS)
+
+
+def _encode(rows: List, fmt: str) -> bytes:
+    """One chunk of rows as NDJSON lines or CSV records"""
+    if fmt == FORMAT_CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            [row.created_at.isoformat() if column == "created_at" and row.created_at else value
+             for column, value in zip(EXPORT_COLUMNS, row)]
+            for row in rows
+        )
+        return buffer.getvalue().encode()
+
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_default) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _header(fmt: str) -> Optional[bytes]:
+    if fmt == FORMAT_CSV:
+        return (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+    return None
+
+
+def iter_export_sync(stmt, fmt: str) -> Iterator[bytes]:
+    """
+    Export chunks from a sync session of its own
+    Meant for StreamingResponse, which pulls each chunk in the threadpool
+    """
+    header = _header(fmt)
+    if header:
+        yield header
+    db = SessionLocal()
+    try:
+        for partition in db.execute(stmt).partitions():
+            yield _encode(partition, fmt)
+    finally:
+        db.close()
+
+
+async def iter_export_async(stmt, fmt: str) -> AsyncIterator[bytes]:
+    """Export chunks streamed from an async session of its own"""
+    header = _header(fmt)
+    if header:
+        yield header
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            yield _encode(partition, fmt)
+
+
+def iter_export(menu_item_ids: Optional[Sequence[int]], start: Optional[datetime],
+                end: Optional[datetime], fmt: str):
+    """
+    Byte chunks of an export, HISTORY_EXPORT_CHUNK_ROWS rows each
+
+    The session is opened by the iterator itself rather than taken from the
+    request, it has to outlive the endpoint while the response streams.
+    """
+    stmt = export_query(menu_item_ids, start, end)
+    if settings.DB_ASYNC:
+        return iter_export_async(stmt, fmt)
+    return iter_export_sync(stmt, fmt)
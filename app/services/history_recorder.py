@@ -0,0 +1,242 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import db_session, run_db
+from app.models.database import PricingHistory
+from app.utils.metrics import metrics, handled_errors
+
+HISTORY_FLUSH_SECONDS = metrics.histogram(
+    "history_flush_duration_seconds", "Bulk insert time per pricing history batch", ["outcome"],
+)
+
+# Column order of the compact tuples held in the queue
+HISTORY_FIELDS = (
+    "menu_item_id",
+    "current_price",
+    "recommended_price",
+    "competitor_avg_price",
+    "weather_condition",
+    "temperature",
+    "event_count",
+    "reasoning",
+    "created_at",
+)
+
+POLICY_DROP = "drop"
+POLICY_BLOCK = "block"
+
+
+class HistoryRecorder:
+    """
+    Write-behind buffer for PricingHistory rows
+
+    Requests enqueue a compact record into a bounded in-memory queue and return
+    straight away. A background worker flushes batches with one bulk insert,
+    either when batch_size rows are waiting or flush_interval has passed.
+    When the queue is full the "drop" policy discards the row, "block" makes the
+    request wait up to block_timeout for space before dropping it. Batches
+    always wait, see record_many.
+
+    The worker starts with the first record if start() wasn't called. Once
+    stop() has begun, records are rejected (and counted) until start() is
+    called again, a worker started behind shutdown's back would never be
+    awaited and its rows lost.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, policy: str = POLICY_DROP,
+                 block_timeout: float = 0.5):
+        if policy not in (POLICY_DROP, POLICY_BLOCK):
+            raise ValueError(f"Unknown history queue policy: {policy}")
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Counters
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rejected = 0
+        self.flushes = 0
+
+    def start(self):
+        """Start the flush worker on the running event loop"""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._closing = False
+        if self._queue is None or self._queue.empty():
+            # fresh queue so it binds to the current loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the worker, later records are rejected"""
+        self._closing = True
+        if self._worker is None:
+            return
+        try:
+            await self._worker
+        finally:
+            self._worker = None
+
+    async def record(self, record: Tuple) -> bool:
+        """
+        Enqueue one history record (tuple ordered like HISTORY_FIELDS)
+        Returns False when the row was dropped
+        """
+        if self._closing:
+            self.rejected += 1
+            return False
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if self.policy == POLICY_DROP:
+                self.dropped += 1
+                return False
+            try:
+                await asyncio.wait_for(self._queue.put(record), self.block_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+        self.queued += 1
+        return True
+
+    async def record_many(self, records: List[Tuple]) -> int:
+        """
+        Enqueue many records, returns how many were accepted
+        A batch always waits, whatever the policy, up to block_timeout in total
+        for the worker to make room, a batch larger than the free space would
+        otherwise lose its tail. Rows still left after that are dropped
+        """
+        if self._closing:
+            self.rejected += len(records)
+            return 0
+        self.start()
+        accepted = 0
+        for record in records:
+            try:
+                self._queue.put_nowait(record)
+            except asyncio.QueueFull:
+                break
+            accepted += 1
+        if accepted < len(records):
+            deadline = asyncio.get_running_loop().time() + self.block_timeout
+            for record in records[accepted:]:
+                remaining = deadline - asyncio.get_running_loop().time()
+                try:
+                    await asyncio.wait_for(self._queue.put(record), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    break
+                accepted += 1
+        self.queued += accepted
+        self.dropped += len(records) - accepted
+        return accepted
+
+    def stats(self) -> Dict:
+        """Counters for monitoring"""
+        return {
+            "policy": self.policy,
+            "running": self._worker is not None and not self._worker.done(),
+            "pending": self._queue.qsize() if self._queue else 0,
+            "capacity": self.max_queue,
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+        }
+
+    async def _run(self):
+        """Collect batches by size or time and flush them"""
+        loop = asyncio.get_running_loop()
+        while not (self._closing and self._queue.empty()):
+            batch = []
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0 or self._closing:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple]):
+        """Write one batch, failures are counted but never stop the worker"""
+        rows = [dict(zip(HISTORY_FIELDS, record)) for record in batch]
+        start = time.perf_counter()
+        try:
+            async with db_session() as db:
+                await run_db(db, _bulk_insert, rows)
+            self.flushed += len(rows)
+            self.flushes += 1
+            HISTORY_FLUSH_SECONDS.observe_since(start, "ok")
+        except Exception as e:
+            self.failed += len(rows)
+            HISTORY_FLUSH_SECONDS.observe_since(start, "error")
+            handled_errors.inc("history_flush")
+            print(f"Error flushing pricing history: {e}")
+
+
+def _bulk_insert(db: Session, rows: List[Dict]):
+    """Insert a batch of history rows with a single statement"""
+    try:
+        db.bulk_insert_mappings(PricingHistory, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def history_record(request, response, competitor_avg: float,
+                   created_at: Optional[datetime] = None) -> Tuple:
+    """Compact history record for a pricing request and its response"""
+    return (
+        request.menu_item_id,
+        request.current_price,
+        response.recommended_price,
+        competitor_avg,
+        request.weather.condition,
+        request.weather.temperature,
+        len(request.events),
+        response.reasoning,
+        created_at or datetime.utcnow(),
+    )
+
+
+# Global instance
+history_recorder = HistoryRecorder(
+    max_queue=settings.HISTORY_QUEUE_MAX_ROWS,
+    batch_size=settings.HISTORY_FLUSH_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL_SECONDS,
+    policy=settings.HISTORY_QUEUE_POLICY,
+    block_timeout=settings.HISTORY_BLOCK_TIMEOUT_SECONDS,
+)
+
+metrics.gauge(
+    "history_queue_rows", "Pricing history rows waiting to be flushed", [],
+    lambda: [((), history_recorder.stats()["pending"])],
+)
+metrics.gauge(
+    "history_rows", "Pricing history rows by outcome since startup", ["outcome"],
+    lambda: [((name,), history_recorder.stats()[name]) for name in ("flushed", "dropped", "failed", "rejected")],
+)
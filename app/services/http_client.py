@@ -0,0 +1,231 @@
+import asyncio
+import time
+from typing import Dict, Optional
+import httpx
+from app.core.config import settings
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+from app.utils.metrics import metrics
+
+UPSTREAM_SECONDS = metrics.histogram(
+    "upstream_request_duration_seconds", "Upstream API latency, status is the HTTP code or error",
+    ["upstream", "status"],
+)
+UPSTREAM_REJECTED = metrics.counter(
+    "upstream_circuit_rejected_total", "Upstream calls refused without a request because the circuit was open",
+    ["upstream"],
+)
+# Circuit state as a number for alerting
+CIRCUIT_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class UpstreamStats:
+    """Request counters and latency for one upstream"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.status_codes: Dict[int, int] = {}
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # outcome of the most recent request, read by /health
+        self.last_status: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.last_seen: Optional[float] = None
+
+    def observe(self, seconds: float, status_code: Optional[int], error: Optional[str] = None):
+        self.requests += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_status = status_code
+        self.last_error = error
+        self.last_seen = time.time()
+        if status_code is None:
+            self.errors += 1
+        else:
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def as_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "status_codes": self.status_codes,
+            "avg_ms": round(self.total_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+        }
+
+    def reachability(self) -> Dict:
+        """Judged from the last real request: any HTTP answer below 500 counts as reachable"""
+        if self.last_seen is None:
+            status = "unknown"
+        elif self.last_status is not None and self.last_status < 500:
+            status = "reachable"
+        else:
+            status = "unreachable"
+        return {
+            "status": status,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "last_seen_seconds_ago": round(time.time() - self.last_seen, 1) if self.last_seen else None,
+        }
+
+
+class HTTPClientManager:
+    """
+    One pooled httpx.AsyncClient shared by the upstream integrations
+
+    Created at app startup and closed at shutdown so TCP/TLS connections are
+    kept alive between cache misses. Connection limits, keep-alive expiry and
+    HTTP/2 come from Settings. Pass a transport (e.g. httpx.MockTransport) to
+    start() to stand in for OpenWeather and Ticketmaster.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.upstreams: Dict[str, UpstreamStats] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def start(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """Create the shared client, a no-op if it's already running"""
+        if self._client is not None and not self._client.is_closed:
+            return
+
+        http2 = settings.HTTP2_ENABLED
+        if http2 and not _http2_available():
+            print("HTTP2_ENABLED is set but the h2 package is missing, using HTTP/1.1")
+            http2 = False
+
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            http2=http2,
+            timeout=settings.HTTP_DEFAULT_TIMEOUT_SECONDS,
+            transport=transport,
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client, started on first use outside the app lifecycle"""
+        if self._client is None or self._client.is_closed:
+            self.start()
+        return self._client
+
+    def breaker(self, upstream: str) -> CircuitBreaker:
+        """The upstream's circuit breaker, created on first use from Settings"""
+        breaker = self.breakers.get(upstream)
+        if breaker is None:
+            breaker = self.breakers[upstream] = CircuitBreaker(
+                upstream,
+                window=settings.CIRCUIT_BREAKER_WINDOW_SECONDS,
+                min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+                failure_rate=settings.CIRCUIT_BREAKER_FAILURE_RATE,
+                open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+                half_open_calls=settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+                enabled=settings.CIRCUIT_BREAKER_ENABLED,
+            )
+        return breaker
+
+    async def get(self, url: str, upstream: str, **kwargs) -> httpx.Response:
+        """
+        GET through the shared pool, recording latency and status per upstream
+        Raises CircuitOpenError without sending anything while the upstream's
+        circuit is open. Errors, timeouts, 429 and 5xx answers count as failures
+        """
+        breaker = self.breaker(upstream)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            UPSTREAM_REJECTED.inc(upstream)
+            raise
+        stats = self.upstreams.setdefault(upstream, UpstreamStats())
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        status_code = None
+        error = None
+        try:
+            response = await self.client.get(url, **kwargs)
+            status_code = response.status_code
+            return response
+        except asyncio.CancelledError:
+            breaker.abandon()
+            error = "CancelledError"
+            raise
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.in_flight -= 1
+            if error != "CancelledError":
+                breaker.record(status_code is None or status_code == 429 or status_code >= 500)
+            elapsed = time.perf_counter() - start
+            stats.observe(elapsed, status_code, error)
+            UPSTREAM_SECONDS.observe(elapsed, upstream, str(status_code) if status_code else "error")
+
+    async def probe(self, url: str, timeout: float) -> Dict:
+        """
+        Cheap reachability check: a HEAD request, any HTTP answer means the host is up
+        Not counted in the upstream stats so probes don't hide real traffic errors
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.head(url, timeout=timeout)
+        except Exception as e:
+            return {"status": "unreachable", "error": type(e).__name__}
+        return {
+            "status": "reachable" if response.status_code < 500 else "unreachable",
+            "http_status": response.status_code,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def pool_stats(self) -> Dict:
+        """
+        Connection pool usage derived from the requests this class tracks
+        httpx has no public view of its pool, on HTTP/1.1 every request in
+        flight holds one connection, so in_flight close to max_connections
+        means requests are queueing for a connection
+        """
+        return {
+            "max_connections": settings.HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": round(self.in_flight / settings.HTTP_MAX_CONNECTIONS, 4)
+            if settings.HTTP_MAX_CONNECTIONS > 0 else None,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._client is not None and not self._client.is_closed,
+            "pool": self.pool_stats(),
+            "upstreams": {name: s.as_dict() for name, s in self.upstreams.items()},
+            "circuits": {name: b.stats() for name, b in self.breakers.items()},
+        }
+
+
+# Global instance
+http_client = HTTPClientManager()
+
+metrics.gauge(
+    "upstream_circuit_state", "Circuit breaker state per upstream: 0 closed, 1 half open, 2 open", ["upstream"],
+    lambda: [((name,), CIRCUIT_STATES[b.state]) for name, b in http_client.breakers.items()],
+)
@@ -1,7 +1,12 @@
-import math 
-from typing import List 
+from typing import TYPE_CHECKING, List, Optional
 from app.schemas.pricing import PricingRequest, PricingResponse, FactorWeights, WeatherData, EventData
+from app.schemas.competitors import CompetitorStats
 from app.core.config import settings 
+from app.utils.cache import TTLCache
+from app.services.pricing_rules import PricingRules, load_rules
+
+if TYPE_CHECKING:
+    import numpy as np
 
 class PricingEngine:
     """ 
@@ -10,9 +15,56 @@ class PricingEngine:
 
     """
 
-    def __init__(self):
-        self.internal_weight = settings.INTERNAL_WEIGHT 
-        self.external_weight = settings.EXTERNAL_WEIGHT  
+    def __init__(self, result_cache_size: int = 0, rules: Optional[PricingRules] = None):
+        # Results of suggest_price keyed by the normalized request, LRU bounded
+        # Cleared whenever a weight or the rules change, maxsize 0 disables it
+        self._results = TTLCache(maxsize=result_cache_size)
+        self._rules = rules or load_rules()
+        self._internal_weight = settings.INTERNAL_WEIGHT 
+        self._external_weight = settings.EXTERNAL_WEIGHT  
+        # FactorWeights shared by every response until a weight changes
+        self._factors: Optional[FactorWeights] = None
+
+    @property
+    def internal_weight(self) -> float:
+        return self._internal_weight
+
+    @internal_weight.setter
+    def internal_weight(self, value: float):
+        self._internal_weight = value
+        self._factors = None
+        self._results.clear()
+
+    @property
+    def external_weight(self) -> float:
+        return self._external_weight
+
+    @external_weight.setter
+    def external_weight(self, value: float):
+        self._external_weight = value
+        self._factors = None
+        self._results.clear()
+
+    @property
+    def rules(self) -> PricingRules:
+        """Compiled weather / event rules, see app/core/pricing_rules.json"""
+        return self._rules
+
+    @rules.setter
+    def rules(self, value: PricingRules):
+        self._rules = value
+        self._results.clear()
+
+    def reload_rules(self, path: Optional[str] = None):
+        """Recompile the rules file (PRICING_RULES_FILE by default) and start using it"""
+        self.rules = load_rules(path)
+
+    def cache_stats(self) -> dict:
+        """Hit/miss statistics of the result cache"""
+        return self._results.stats()
+
+    def clear_cache(self):
+        self._results.clear()
 
     def calculate_competitor_factor(self, current_price : float , competitor_prices : List[float]) -> float:
         """  
@@ -22,7 +74,13 @@ class PricingEngine:
         if not competitor_prices:
             return 1.0 
         avg_competitor_price = sum(competitor_prices) / len(competitor_prices)
-        
+        return self.calculate_competitor_factor_from_average(current_price, avg_competitor_price)
+
+    def calculate_competitor_factor_from_average(self, current_price: float, avg_competitor_price: Optional[float]) -> float:
+        """Competitor factor from an already known average competitor price"""
+        if avg_competitor_price is None:
+            return 1.0
+
         # If we're cheaper, we can increase price
         # If we're expensive, we should decrease
         price_ratio = avg_competitor_price / current_price
@@ -36,26 +94,8 @@ class PricingEngine:
         calculate demand based on weather conditions
         Good Weather means higher demand for outings 
         """
-        base_factor = 1.0 
-
-        if 20 <= weather.temperature <= 30:
-            #perfect
-            base_factor+=0.8
-        elif weather.temperature > 35:
-            # Too hot, 
-            base_factor -= 0.05
-        elif weather.temperature < 10:
-            # Cold weather
-            base_factor -= 0.03
-        
-        #condition impact 
-        condition = weather.condition.lower()
-        if any(word in condition for word in ["sunny", "clear", "fair"]):
-            base_factor += 0.05
-        elif any(word in condition for word in ["rain", "storm", "snow"]):
-            base_factor -= 0.08
-        
-        return base_factor 
+        # Temperature band + condition keyword lookups from the compiled rules
+        return (1.0 + self._rules.temperature_adjustment(weather.temperature)) + self._rules.condition_adjustment(weather.condition)
 
     def calculate_event_factor(self, events: List[EventData]) -> float:
         """
@@ -69,31 +109,66 @@ class PricingEngine:
         
         for event in events:
             # Popularity impact
-            popularity_multiplier = {
-                "low": 0.02,
-                "medium": 0.05,
-                "high": 0.10
-            }
-            pop_impact = popularity_multiplier.get(event.popularity.lower(), 0.03)
+            pop_impact = self._rules.event_impact(event.popularity)
             
             # Distance impact (closer events have more impact)
             # Using exponential decay: impact decreases with distance
-            distance_factor = math.exp(-0.3 * event.distance_km)
+            distance_factor = self._rules.decay(event.distance_km)
             
             event_impact = pop_impact * distance_factor
             total_impact += event_impact
         
         return 1.0 + total_impact
     
-    def suggest_price(self, request: PricingRequest) -> PricingResponse:
+    def competitor_average(self, request: PricingRequest,
+                           competitor_stats: Optional[CompetitorStats] = None) -> Optional[float]:
+        """
+        Average competitor price for a request, None when there is nothing to compare
+        Inline competitor_prices win, stored aggregates are the fallback
+        """
+        if request.competitor_prices:
+            return sum(request.competitor_prices) / len(request.competitor_prices)
+        if competitor_stats is not None and competitor_stats.count:
+            return competitor_stats.mean
+        return None
+
+    def suggest_price(self, request: PricingRequest,
+                      competitor_stats: Optional[CompetitorStats] = None) -> PricingResponse:
         """
         Main pricing algorithm that combines all factors
+        competitor_stats (stored aggregates for the item) are used when the
+        request carries no competitor_prices. With the result cache enabled a
+        repeated request returns the same (shared) response object
         """
-        # Calculate individual factors
-        competitor_factor = self.calculate_competitor_factor(
-            request.current_price, 
-            request.competitor_prices
+        avg_comp = self.competitor_average(request, competitor_stats)
+        if self._results.maxsize > 0:
+            key = self._result_key(request, avg_comp)
+            cached = self._results.get(key)
+            if cached is None:
+                cached = self._suggest_price(request, avg_comp)
+                self._results.set(key, cached)
+            return cached
+        return self._suggest_price(request, avg_comp)
+
+    @staticmethod
+    def _result_key(request: PricingRequest, avg_comp: Optional[float]) -> tuple:
+        """
+        Canonical key of everything suggest_price reads
+        The competitor average stands in for the price list / stored stats,
+        popularity is case-folded like calculate_event_factor does
+        """
+        return (
+            request.menu_item_id,
+            request.current_price,
+            avg_comp,
+            request.weather.temperature,
+            request.weather.condition,
+            tuple((e.name, e.popularity.lower(), e.distance_km) for e in request.events),
         )
+
+    def _suggest_price(self, request: PricingRequest, avg_comp: Optional[float]) -> PricingResponse:
+        # Calculate individual factors
+        competitor_factor = self.calculate_competitor_factor_from_average(request.current_price, avg_comp)
         weather_factor = self.calculate_weather_factor(request.weather)
         event_factor = self.calculate_event_factor(request.events)
         
@@ -113,29 +188,130 @@ class PricingEngine:
         recommended_price = round(recommended_price, 2)
         
         # Generate reasoning text
-        reasoning = self._generate_reasoning(
-            request, competitor_factor, weather_factor, event_factor
-        )
+        reasoning = self._build_reasoning(request, avg_comp, weather_factor, event_factor)
         
         return PricingResponse(
             menu_item_id=request.menu_item_id,
             recommended_price=recommended_price,
-            factors=FactorWeights(
+            factors=self._factor_weights(),
+            reasoning=reasoning
+        )
+
+    def _factor_weights(self) -> FactorWeights:
+        if self._factors is None:
+            self._factors = FactorWeights(
                 internal_weight=self.internal_weight,
                 external_weight=self.external_weight
-            ),
-            reasoning=reasoning
+            )
+        return self._factors
+    
+    def suggest_prices_batch(self, requests: List[PricingRequest],
+                             competitor_stats: Optional[List[Optional[CompetitorStats]]] = None) -> List[PricingResponse]:
+        """
+        Vectorized version of suggest_price for repricing whole menus
+        Factors are evaluated as NumPy array operations over the batch, ragged event
+        lists are flattened with offsets. competitor_stats, one entry per request,
+        stand in for missing competitor_prices. Results match suggest_price exactly
+        """
+        n = len(requests)
+        if n == 0:
+            return []
+        # imported on first use, it's a good part of the app's import time
+        import numpy as np
+
+        current_prices = np.fromiter((r.current_price for r in requests), dtype=np.float64, count=n)
+
+        # Competitor factor
+        # averages come from competitor_average, bit-identical to the scalar path
+        avg_comp_list = [
+            self.competitor_average(r, competitor_stats[i] if competitor_stats else None)
+            for i, r in enumerate(requests)
+        ]
+        has_comp = np.fromiter((a is not None for a in avg_comp_list), dtype=bool, count=n)
+        avg_comp = np.fromiter((a or 0.0 for a in avg_comp_list), dtype=np.float64, count=n)
+        price_ratio = avg_comp / current_prices
+        competitor_factor = np.where(
+            has_comp, np.clip(0.95 + (price_ratio - 1) * 0.3, 0.9, 1.15), 1.0
+        )
+
+        # Weather factor, condition adjustments are computed once per distinct condition
+        temperatures = np.fromiter((r.weather.temperature for r in requests), dtype=np.float64, count=n)
+        temp_adjustment = self._rules.temperature_adjustments(temperatures)
+        condition_adjustment = np.fromiter(
+            (self._rules.condition_adjustment(r.weather.condition) for r in requests),
+            dtype=np.float64, count=n
+        )
+        weather_factor = (1.0 + temp_adjustment) + condition_adjustment
+
+        # Event factor over the flattened event list
+        event_counts = np.fromiter((len(r.events) for r in requests), dtype=np.int64, count=n)
+        events = [e for r in requests for e in r.events]
+        if events:
+            pop_impact = np.fromiter(
+                (self._rules.event_impact(e.popularity) for e in events),
+                dtype=np.float64, count=len(events)
+            )
+            distances = np.fromiter((e.distance_km for e in events), dtype=np.float64, count=len(events))
+            # decay (math.exp) only over distinct distances, np.exp can differ from libm in the last bit
+            unique_distances, inverse = np.unique(distances, return_inverse=True)
+            decay = np.fromiter(
+                (self._rules.decay(d) for d in unique_distances.tolist()),
+                dtype=np.float64, count=len(unique_distances)
+            )[inverse.ravel()]
+            event_factor = 1.0 + self._segment_sums(pop_impact * decay, event_counts)
+        else:
+            event_factor = np.ones(n)
+
+        external_factor = weather_factor + event_factor - 1.0
+        price_adjustment = (
+            self.internal_weight * (competitor_factor - 1.0) +
+            self.external_weight * external_factor
         )
+        recommended_prices = current_prices * (1 + price_adjustment)
+
+        factors = self._factor_weights()
+        weather_list = weather_factor.tolist()
+        event_list = event_factor.tolist()
+
+        responses = []
+        for i, (request, price) in enumerate(zip(requests, recommended_prices.tolist())):
+            reasoning = self._build_reasoning(
+                request,
+                avg_comp_list[i],
+                weather_list[i],
+                event_list[i]
+            )
+            responses.append(PricingResponse(
+                menu_item_id=request.menu_item_id,
+                recommended_price=round(price, 2),
+                factors=factors,
+                reasoning=reasoning
+            ))
+        return responses
+
+    @staticmethod
+    def _segment_sums(values: "np.ndarray", counts: "np.ndarray") -> "np.ndarray":
+        """
+        Sum each segment of a flattened ragged array
+        Segments are accumulated left to right (one vectorized step per position)
+        so totals match a plain python loop bit for bit
+        """
+        import numpy as np
+        offsets = np.zeros(len(counts), dtype=np.int64)
+        np.cumsum(counts[:-1], out=offsets[1:])
+        totals = np.zeros(len(counts))
+        for j in range(int(counts.max(initial=0))):
+            rows = np.nonzero(counts > j)[0]
+            totals[rows] += values[offsets[rows] + j]
+        return totals
     
-    def _generate_reasoning(self, request: PricingRequest, 
-                           comp_factor: float, weather_factor: float, 
-                           event_factor: float) -> str:
-        """Generate human-readable reasoning for the price suggestion"""
+    def _build_reasoning(self, request: PricingRequest, avg_comp: Optional[float],
+                         weather_factor: float, event_factor: float) -> str:
+        """Reasoning text from precomputed competitor average and factors"""
         reasons = []
         
         # Competitor analysis
-        if request.competitor_prices:
-            avg_comp = sum(request.competitor_prices) / len(request.competitor_prices)
+        if avg_comp is not None:
             if request.current_price < avg_comp:
                 reasons.append("competitors are pricing higher")
             elif request.current_price > avg_comp:
@@ -163,6 +339,6 @@ class PricingEngine:
         return "Price adjustment recommended due to: " + ", ".join(reasons) + "."
 
 
-pricing_engine = PricingEngine()
+pricing_engine = PricingEngine(result_cache_size=settings.PRICING_RESULT_CACHE_SIZE)
 
 
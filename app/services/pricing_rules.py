@@ -0,0 +1,115 @@
+import json
+import math
+import sys
+from bisect import bisect_right
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_RULES_FILE = Path(__file__).resolve().parent.parent / "core" / "pricing_rules.json"
+
+# Distinct raw condition / popularity strings memoized per rule set
+LOOKUP_CACHE_MAX_ENTRIES = 4096
+
+
+class PricingRules:
+    """
+    Weather and event rules compiled into lookup tables
+
+    Temperature bands become sorted half-open [lo, hi) breakpoints found with
+    bisect (inclusive upper bounds use the next float up, exclusive lower bounds
+    likewise), the first matching band in the file wins. Condition and
+    popularity strings are normalized (lower case), interned and memoized so a
+    repeated value is one dict lookup.
+    """
+
+    def __init__(self, rules: Dict):
+        try:
+            self.breakpoints, self.band_adjustments = self._compile_bands(rules.get("temperature_bands", []))
+            self.condition_rules: List[Tuple[Tuple[str, ...], float]] = [
+                (tuple(sys.intern(k.lower()) for k in rule["keywords"]), float(rule["adjustment"]))
+                for rule in rules.get("conditions", [])
+            ]
+            self.popularity_impact: Dict[str, float] = {
+                sys.intern(name.lower()): float(impact)
+                for name, impact in rules.get("popularity_impact", {}).items()
+            }
+            self.default_event_impact = float(rules.get("default_event_impact", 0.0))
+            self.distance_decay = float(rules.get("distance_decay", 0.0))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # AttributeError: a list or scalar where a mapping belongs
+            raise ValueError(f"Invalid pricing rules: {e}")
+
+        self._band_array = None  # numpy copy of band_adjustments, built on first vectorized use
+        self._conditions: Dict[str, float] = {}
+        self._popularity: Dict[str, float] = {}
+
+    @staticmethod
+    def _compile_bands(bands: List[Dict]) -> Tuple[List[float], List[float]]:
+        """Flatten possibly overlapping bands into breakpoints and one adjustment per interval"""
+        intervals = []
+        for band in bands:
+            lo, hi = -math.inf, math.inf
+            if "min" in band:
+                lo = float(band["min"])
+            if "above" in band:
+                lo = math.nextafter(float(band["above"]), math.inf)
+            if "max" in band:
+                hi = math.nextafter(float(band["max"]), math.inf)
+            if "below" in band:
+                hi = float(band["below"])
+            intervals.append((lo, hi, float(band["adjustment"])))
+
+        breakpoints = sorted({edge for lo, hi, _ in intervals for edge in (lo, hi) if math.isfinite(edge)})
+        # interval i spans [breakpoints[i-1], breakpoints[i]), value from the first band covering it
+        adjustments = []
+        for i in range(len(breakpoints) + 1):
+            point = breakpoints[i - 1] if i > 0 else -math.inf
+            adjustments.append(next((adj for lo, hi, adj in intervals if lo <= point < hi), 0.0))
+        return breakpoints, adjustments
+
+    def temperature_adjustment(self, temperature: float) -> float:
+        if temperature != temperature:  # NaN matches no band
+            return 0.0
+        return self.band_adjustments[bisect_right(self.breakpoints, temperature)]
+
+    def temperature_adjustments(self, temperatures: "np.ndarray") -> "np.ndarray":
+        """Vectorized temperature_adjustment"""
+        import numpy as np
+        if self._band_array is None:
+            self._band_array = np.array(self.band_adjustments, dtype=np.float64)
+        adjustments = self._band_array[np.searchsorted(self.breakpoints, temperatures, side="right")]
+        return np.where(np.isnan(temperatures), 0.0, adjustments)
+
+    def condition_adjustment(self, condition: str) -> float:
+        adjustment = self._conditions.get(condition)
+        if adjustment is None:
+            normalized = condition.lower()
+            adjustment = next(
+                (adj for keywords, adj in self.condition_rules if any(k in normalized for k in keywords)),
+                0.0
+            )
+            if len(self._conditions) < LOOKUP_CACHE_MAX_ENTRIES:
+                self._conditions[sys.intern(condition)] = adjustment
+        return adjustment
+
+    def event_impact(self, popularity: str) -> float:
+        impact = self._popularity.get(popularity)
+        if impact is None:
+            impact = self.popularity_impact.get(popularity.lower(), self.default_event_impact)
+            if len(self._popularity) < LOOKUP_CACHE_MAX_ENTRIES:
+                self._popularity[sys.intern(popularity)] = impact
+        return impact
+
+    def decay(self, distance_km: float) -> float:
+        return math.exp(-self.distance_decay * distance_km)
+
+
+def load_rules(path: Optional[str] = None) -> PricingRules:
+    """Read and compile a rules file, PRICING_RULES_FILE or the bundled defaults"""
+    path = Path(path or settings.PRICING_RULES_FILE or DEFAULT_RULES_FILE)
+    with open(path, encoding="utf-8") as f:
+        return PricingRules(json.load(f))
@@ -0,0 +1,87 @@
+import asyncio
+import random
+from typing import Dict, Optional
+from app.core.config import settings
+from app.db.database import init_db
+from app.models.database import utc_now
+from app.utils.metrics import handled_errors
+
+
+class SchemaCheck:
+    """
+    Startup schema check that doesn't hold up the boot
+
+    Runs init_db in a thread from the event loop, retrying with exponential
+    backoff (plus jitter, so restarting workers don't retry in lockstep) up to
+    retry_max seconds apart while the database is unreachable. Startup waits
+    at most startup_wait seconds for it, after that the app serves requests
+    and /health reports the schema as pending until a check succeeds.
+    """
+
+    def __init__(self, mode: str = "stamp", startup_wait: float = 5.0, retry_max: float = 30.0):
+        self.mode = mode
+        self.startup_wait = startup_wait
+        self.retry_max = retry_max
+        self._task: Optional[asyncio.Task] = None
+
+        self.status = "pending"
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.checked_at = None
+
+    def start(self):
+        """Start checking on the running event loop"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to timeout (startup_wait by default) for the check, returns whether it finished"""
+        if self._task is None:
+            return False
+        timeout = self.startup_wait if timeout is None else timeout
+        done, _ = await asyncio.wait({self._task}, timeout=timeout)
+        return bool(done)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+        }
+
+    async def _run(self):
+        delay = 0.5
+        while True:
+            self.attempts += 1
+            try:
+                self.status = await asyncio.to_thread(init_db, self.mode)
+                self.last_error = None
+                self.checked_at = utc_now().isoformat()
+                return
+            except Exception as e:
+                print(f"Error checking database schema (attempt {self.attempts}), retrying: {e}")
+                handled_errors.inc("schema_check")
+                self.last_error = str(e)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.retry_max)
+
+
+# Global instance
+schema_check = SchemaCheck(
+    mode=settings.DB_SCHEMA_CHECK,
+    startup_wait=settings.DB_SCHEMA_STARTUP_WAIT_SECONDS,
+    retry_max=settings.DB_SCHEMA_RETRY_MAX_SECONDS,
+)
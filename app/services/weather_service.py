@@ -1,9 +1,27 @@
-import httpx
+import asyncio
+import time
 from datetime import datetime, timedelta , timezone
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.models.database import WeatherCache
+from app.db.database import db_session, run_db, upsert
+from app.services.http_client import http_client
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.quota import UpstreamQuota
+from app.models.database import WeatherCache, utc_now
+from app.utils.cache import TTLCache, KeyHeat
+from app.utils.shared_cache import SharedCache
+from app.utils.singleflight import SingleFlight
+from app.utils.helpers import age_seconds
+from app.utils.metrics import cache_lookup_seconds, handled_errors
+
+# Notes on the stand-in data returned when the API fails and nothing cached is
+# left to serve, it's never cached
+API_ERROR_NOTE = "API error, using fallback data"
+FETCH_ERROR_NOTE = "Error fetching data"
+CIRCUIT_OPEN_NOTE = "Weather API unavailable, using fallback data"
+QUOTA_NOTE = "Weather API call budget used up, using fallback data"
+FALLBACK_NOTES = (API_ERROR_NOTE, FETCH_ERROR_NOTE, CIRCUIT_OPEN_NOTE, QUOTA_NOTE)
 
 
 class WeatherService:
@@ -14,36 +32,214 @@ class WeatherService:
     def __init__(self):
         self.api_key = settings.OPENWEATHER_API_KEY 
         self.base_url = settings.OPENWEATHER_BASE_URL 
+        self.cache_ttl = settings.WEATHER_CACHE_MINUTES * 60
+        # how long past the TTL an entry is still served while it's refetched
+        self.max_stale = settings.WEATHER_STALE_MAX_MINUTES * 60
+        # L1 in-process tier, the weather_cache table is L2
+        self._l1 = TTLCache(maxsize=settings.WEATHER_L1_MAX_ENTRIES, ttl=self.cache_ttl, stale=self.max_stale)
+        # one in-flight load per city, concurrent misses share it
+        self._flight = SingleFlight()
+        # segment shared with the other workers on the host, between L1 and L2
+        self._shared = SharedCache(
+            "weather", slots=settings.WEATHER_L1_MAX_ENTRIES, slot_bytes=512,
+            directory=settings.SHARED_CACHE_DIR, lease_seconds=settings.SHARED_CACHE_LEASE_SECONDS
+        )
+        # request frequency per city, read by the cache prewarmer
+        self.heat = KeyHeat(max_keys=settings.PREWARM_TRACK_MAX_KEYS, half_life=settings.PREWARM_HALF_LIFE_SECONDS)
+        # background refetches of stale entries
+        self._revalidations = set()
+        # OpenWeather call budget
+        self.quota = UpstreamQuota(
+            "openweather", settings.OPENWEATHER_CALLS_PER_MINUTE, settings.OPENWEATHER_CALLS_PER_DAY,
+            settings.UPSTREAM_QUOTA_RESERVE, directory=settings.SHARED_CACHE_DIR
+        )
+
+        # Counters
+        self.stale_served = 0
+        self.fallbacks_served = 0
     
-    async def get_weather(self, city:str  , db:Optional[Session]=None) -> Dict:
+    async def get_weather(self, city:str  , db=None) -> Dict:
         """ 
         fetched weahter data for a city
-        checks from cache first , if cache miss go for API 
+        checks from cache first (memory, the workers' shared segment, then database) , if cache miss go for API 
+        passing the request session (sync or async) enables the database tier
+        An expired entry within the staleness bound is returned straight away
+        (marked stale, with its age) while it's refetched in the background
+        """
+        start = time.perf_counter()
+        self.heat.touch(city)
+        cached = self._l1.get(city)
+        if cached is not None:
+            cache_lookup_seconds.observe_since(start, "weather", "l1_hit")
+            return cached
+
+        stale = self._l1.get_stale(city)
+        if stale is not None:
+            self._revalidate(city, db is not None)
+            cache_lookup_seconds.observe_since(start, "weather", "stale")
+            self.stale_served += 1
+            return self._stale(stale[0], self.cache_ttl + stale[1])
+
+        weather = await self._flight.do(city, lambda: self._shared_load(city, db is not None))
+        result = "stale" if weather.get("stale") else "l2_hit" if weather.get("cached") else "miss"
+        cache_lookup_seconds.observe_since(start, "weather", result)
+        if result == "stale":
+            self.stale_served += 1
+        return weather
+
+    def _revalidate(self, city: str, use_db: bool):
+        """Refetch an expired city in the background, one refetch per city at a time"""
+        if self._flight.in_flight(city):
+            return
+        task = asyncio.ensure_future(self._flight.do(city, lambda: self._shared_load(city, use_db)))
+        self._revalidations.add(task)
+        task.add_done_callback(self._revalidation_done)
+
+    def _revalidation_done(self, task: asyncio.Future):
+        self._revalidations.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error revalidating weather: {task.exception()}")
+            handled_errors.inc("weather_revalidate")
+
+    def _stale(self, weather_data: Dict, age: float) -> Dict:
+        """Copy of cached data marked with how old it is"""
+        return {**weather_data, "stale": True, "age_seconds": round(age)}
+
+    async def _shared_load(self, city: str, use_db: bool) -> Dict:
+        """
+        Coalesced L1 miss, runs once per city at a time
+        Opens its own session so it can outlive the request that started it
+        """
+        if not use_db:
+            return await self._load(city)
+        async with db_session() as db:
+            return await self._load(city, db)
+
+    async def _load(self, city: str, db=None) -> Dict:
+        """
+        L1 miss path: the workers' shared segment, then (one worker at a time,
+        the others wait and take its result from the segment) the database
+        tier and the API
+        """
+        weather_data = self._adopt(city)
+        if weather_data is not None:
+            return weather_data
+        if not await self._shared.claim(city):
+            weather_data = self._adopt(city)
+            if weather_data is not None:
+                return weather_data
+        try:
+            return await self._load_claimed(city, db)
+        finally:
+            self._shared.release(city)
+
+    async def _load_claimed(self, city: str, db=None) -> Dict:
+        """
+        Database tier, then the API
+        When the API fails the last known data (stale L1 entry or L2 row) is
+        returned instead of the stand-in values
         """
+        hit = None
         if db:
-            cached = self._get_from_cache(city , db)
-            if cached:
+            hit = await run_db(db, self._get_from_cache, city)
+            if hit and hit[1] < self.cache_ttl:
+                cached, age = hit
+                self._store(city, cached, ttl=self.cache_ttl - age)
                 return cached
         
-        #fetch from API
-        weather_data = self._fetch_from_api(city)
+        #fetch from API, with something to serve instead the call can wait when the budget is tight
+        stale = self._l1.get_stale(city)
+        weather_data = await self._fetch_from_api(city, deferrable=stale is not None or hit is not None)
+        if weather_data.get("note") in FALLBACK_NOTES:
+            if stale is not None:
+                return self._stale(stale[0], self.cache_ttl + stale[1])
+            if hit:
+                return self._stale(*hit)
+            self.fallbacks_served += 1
+            return weather_data
 
         #save to cache
-        if db and weather_data:
-            self._save_to_cache(city, weather_data, db)
+        if weather_data:
+            if db:
+                await run_db(db, self._save_to_cache, city, weather_data)
+            self._store(city, {**weather_data, "cached": True})
         
         return weather_data
+
+    def _adopt(self, city: str) -> Optional[Dict]:
+        """Take a city another worker loaded from the shared segment into L1"""
+        shared = self._shared.get(city)
+        if shared is None:
+            return None
+        weather_data, ttl = shared
+        self._l1.set(city, weather_data, ttl=ttl)
+        return weather_data
+
+    def _store(self, city: str, weather_data: Dict, ttl: Optional[float] = None):
+        """Put a city in L1 and publish it to the other workers"""
+        ttl = self.cache_ttl if ttl is None else ttl
+        self._l1.set(city, weather_data, ttl=ttl)
+        self._shared.set(city, weather_data, ttl)
+
+    def expires_in(self, city: str) -> Optional[float]:
+        """Seconds left on a city's L1 entry, None when it isn't cached"""
+        return self._l1.expires_in(city)
+
+    async def refresh(self, city: str) -> bool:
+        """
+        Refetch a city from the API and replace both tiers, used by the prewarmer
+        Skipped while a request is already loading the city. When another
+        worker already refreshed it, its entry is taken instead. On an API
+        failure the current entry is kept. Returns whether the entry was replaced
+        """
+        if self._flight.in_flight(city):
+            return False
+        if not await self._shared.claim(city, min_ttl=(self.expires_in(city) or 0.0) + 1.0):
+            return self._adopt(city) is not None
+        try:
+            weather_data = await self._fetch_from_api(city, deferrable=True)
+            if weather_data.get("note") in FALLBACK_NOTES:
+                return False
+            async with db_session() as db:
+                await run_db(db, self._save_to_cache, city, weather_data)
+            self._store(city, {**weather_data, "cached": True})
+            return True
+        finally:
+            self._shared.release(city)
+
+    def invalidate_cache(self, city: str) -> bool:
+        """Drop a city from the in-memory tier and the shared segment, the next request re-reads L2"""
+        shared = self._shared.invalidate(city)
+        return self._l1.invalidate(city) or shared
+
+    def cache_stats(self) -> Dict:
+        """L1 and shared segment statistics, request coalescing and stale serving counters"""
+        return {
+            "l1": self._l1.stats(),
+            "shared": self._shared.stats(),
+            "coalescing": self._flight.stats(),
+            "stale_served": self.stale_served,
+            "fallbacks_served": self.fallbacks_served,
+        }
     
-    def _get_from_cache(self, city:str, db:Session ) -> Optional[Dict]:
+    def _get_from_cache(self, db:Session, city:str) -> Optional[Tuple[Dict, float]]:
+        """
+        Look up a row in the weather_cache table, returns (data, age in seconds)
+        Rows past the TTL are returned while within the staleness bound, callers check the age
+        """
 
         cache_expiry = datetime.now(timezone.utc) - timedelta(
-            minutes=settings.WEATHER_CACHE_MINUTES
+            seconds=self.cache_ttl + self.max_stale
             )
         
-        cached_weather = db.query(WeatherCache).filter(
+        cached_weather = db.query(
+            WeatherCache.temperature, WeatherCache.condition, WeatherCache.fetched_at
+        ).filter(
             WeatherCache.city == city,
             WeatherCache.fetched_at > cache_expiry
         ).first()
+        # end the read, the connection goes back to the pool while the API is called
+        db.rollback()
         
         if cached_weather:
             return {
@@ -51,11 +247,12 @@ class WeatherService:
                 "temperature": cached_weather.temperature,
                 "condition": cached_weather.condition,
                 "cached": True
-            }
+            }, age_seconds(cached_weather.fetched_at)
         
         return None
     
-    async def _fetch_from_api(self, city:str) -> Dict:
+    async def _fetch_from_api(self, city:str, deferrable: bool = False) -> Dict:
+        """deferrable: cached data can be served instead, see UpstreamQuota"""
 
         if not self.api_key or self.api_key == "demo":
             # Return mock data for demo
@@ -66,55 +263,74 @@ class WeatherService:
                 "note": "Using mock data. Set OPENWEATHER_API_KEY for real data."
             }
         
+        if not self.quota.acquire(deferrable):
+            return {
+                "city": city,
+                "temperature": 25,
+                "condition": "Clear",
+                "note": QUOTA_NOTE
+            }
+        
         try:
-            async with httpx.AsyncClient() as client:
-                response=await client.get(
-                    f"{self.base_url}/weather",
-                    params={
-                        "q": city,
-                        "appid": self.api_key,
-                        "units": "metric"
-                    },
-                    timeout=10.0
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "city": city,
-                        "temperature": data["main"]["temp"],
-                        "condition": data["weather"][0]["main"],
-                        "cached": False
-                    }
-                else:
-                    # Fallback to mock data on error
-                    return {
-                        "city": city,
-                        "temperature": 25,
-                        "condition": "Clear",
-                        "note": "API error, using fallback data"
-                    }
+            response=await http_client.get(
+                f"{self.base_url}/weather",
+                params={
+                    "q": city,
+                    "appid": self.api_key,
+                    "units": "metric"
+                },
+                upstream="openweather",
+                timeout=settings.OPENWEATHER_TIMEOUT_SECONDS
+            )
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "city": city,
+                    "temperature": data["main"]["temp"],
+                    "condition": data["weather"][0]["main"],
+                    "cached": False
+                }
+            else:
+                # Fallback to mock data on error
+                return {
+                    "city": city,
+                    "temperature": 25,
+                    "condition": "Clear",
+                    "note": API_ERROR_NOTE
+                }
+        except CircuitOpenError:
+            # the upstream is known to be down, fail fast without logging every request
+            return {
+                "city": city,
+                "temperature": 25,
+                "condition": "Clear",
+                "note": CIRCUIT_OPEN_NOTE
+            }
         except Exception as e:
             print(f"Error fetching weather: {e}")
+            handled_errors.inc("weather_fetch")
             return {
                 "city": city,
                 "temperature": 25,
                 "condition": "Clear",
-                "note": "Error fetching data"
+                "note": FETCH_ERROR_NOTE
             }
         
-    def _save_to_cache(self, city: str, weather_data: Dict, db: Session):
+    def _save_to_cache(self, db: Session, city: str, weather_data: Dict):
         
+        """Upsert the current row for a city"""
         try:
-            cache_entry = WeatherCache(
-                city=city,
-                temperature=weather_data.get("temperature", 25),
-                condition=weather_data.get("condition", "Clear"),
-                raw_data=weather_data
-            )
-            db.add(cache_entry)
+            upsert(db, WeatherCache, {
+                "city": city,
+                "temperature": weather_data.get("temperature", 25),
+                "condition": weather_data.get("condition", "Clear"),
+                "raw_data": weather_data,
+                "fetched_at": utc_now()
+            }, index_elements=["city"])
             db.commit()
         except Exception as e:
             print(f"Error saving to cache: {e}")
+            handled_errors.inc("weather_cache_write")
             db.rollback()
 
 
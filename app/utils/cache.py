@@ -0,0 +1,186 @@
+import heapq
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry and LRU eviction
+    Used as the L1 tier in front of the SQL cache tables. Not thread safe,
+    meant to be used from the event loop. maxsize <= 0 disables the cache.
+    Expired entries are kept for another stale seconds, get() returns the
+    default for them (without counting a miss) and get_stale() returns them
+    and counts the stale hit.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, stale: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale = stale
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it recently used"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at is not None:
+            now = time.monotonic()
+            if expires_at <= now:
+                if expires_at + self.stale <= now:
+                    del self._data[key]
+                    self.expirations += 1
+                    self.misses += 1
+                # else still servable through get_stale(), which counts it
+                return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Store a value, ttl (seconds) defaults to the cache ttl
+        Entries with no time left are not stored
+        """
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            self._data.pop(key, None)
+            return
+
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """
+        (value, seconds since it expired) for an expired entry still within
+        the stale window, None otherwise. Live entries aren't returned
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[0] is None:
+            return None
+        expired_for = time.monotonic() - entry[0]
+        if expired_for < 0 or expired_for >= self.stale:
+            return None
+        self.stale_hits += 1
+        return entry[1], expired_for
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Seconds until a live entry expires, None when missing or it never expires. Not counted in the stats"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] is None:
+            return None
+        remaining = entry[0] - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop one key, returns whether it was cached"""
+        return self._data.pop(key, None) is not None
+
+    def keys(self) -> List[Hashable]:
+        """Snapshot of the cached keys, least recently used first"""
+        return list(self._data.keys())
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+
+
+class KeyHeat:
+    """
+    Exponentially decayed request counts per key, to find the hot ones
+
+    Every touch adds 1 to the key's score, scores halve every half_life
+    seconds. Past max_keys the coldest tenth of the keys is dropped.
+    A refresher can mark a key with the time its old entry would have
+    expired, the first touch after that counts as a miss avoided.
+    """
+
+    def __init__(self, max_keys: int = 10000, half_life: float = 600.0):
+        self.max_keys = max_keys
+        self._decay = math.log(2) / half_life
+        self._scores: Dict[Hashable, Tuple[float, float]] = {}
+        self._refreshed: Dict[Hashable, float] = {}
+        self.misses_avoided = 0
+
+    def touch(self, key: Hashable):
+        now = time.monotonic()
+        entry = self._scores.get(key)
+        score = 1.0 if entry is None else entry[0] * math.exp(-self._decay * (now - entry[1])) + 1.0
+        self._scores[key] = (score, now)
+        if entry is None and len(self._scores) > self.max_keys:
+            self._prune()
+
+        deadline = self._refreshed.get(key)
+        if deadline is not None and now >= deadline:
+            del self._refreshed[key]
+            self.misses_avoided += 1
+
+    def score(self, key: Hashable, now: Optional[float] = None) -> float:
+        entry = self._scores.get(key)
+        if entry is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return entry[0] * math.exp(-self._decay * (now - entry[1]))
+
+    def hottest(self, n: int, min_score: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """Up to n (key, score) pairs, hottest first"""
+        now = time.monotonic()
+        scored = ((key, self.score(key, now)) for key in self._scores)
+        return [(key, score) for key, score in heapq.nlargest(n, scored, key=lambda pair: pair[1]) if score >= min_score]
+
+    def mark_refreshed(self, key: Hashable, old_deadline: float):
+        """old_deadline: time.monotonic() at which the replaced entry would have expired"""
+        # an earlier mark nobody has passed yet is the one the next request is measured against
+        self._refreshed.setdefault(key, old_deadline)
+        if len(self._refreshed) > self.max_keys:
+            # forget marks for keys nobody asked for again
+            now = time.monotonic()
+            self._refreshed = {k: d for k, d in self._refreshed.items() if d > now}
+
+    def _prune(self):
+        now = time.monotonic()
+        keep = heapq.nlargest(self.max_keys * 9 // 10, self._scores, key=lambda key: self.score(key, now))
+        self._scores = {key: self._scores[key] for key in keep}
+
+    def __len__(self) -> int:
+        return len(self._scores)
@@ -0,0 +1,136 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one upstream
+
+    closed: calls go through and their outcomes are kept for window seconds.
+    Once at least min_calls are in the window and the failed share reaches
+    failure_rate, the circuit opens.
+    open: calls are refused with CircuitOpenError for open_seconds, callers
+    fall back straight away instead of waiting on a dead upstream.
+    half_open: up to half_open_calls trial calls go through. A success closes
+    the circuit, a failure opens it again.
+
+    Not thread safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, name: str, window: float = 30.0, min_calls: int = 5,
+                 failure_rate: float = 0.5, open_seconds: float = 30.0,
+                 half_open_calls: int = 1, enabled: bool = True):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+
+        self.state = CLOSED
+        self._outcomes: deque = deque()  # (time, failed)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trials = 0
+
+        # Counters
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError when the call shouldn't be made, otherwise let it through"""
+        if not self.enabled or self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN:
+            retry_in = self._opened_at + self.open_seconds - now
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, retry_in)
+            self.state = HALF_OPEN
+            self._trials = 0
+        if self._trials >= self.half_open_calls:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, 0.0)
+        self._trials += 1
+
+    def record(self, failed: bool):
+        """Outcome of a call that before_call let through"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            if failed:
+                self._open(now)
+            else:
+                self._close()
+            return
+        if self.state == OPEN:
+            return  # started before the circuit opened
+
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        self._expire(now)
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+            self._open(now)
+
+    def abandon(self):
+        """A call before_call let through never finished (cancelled), frees its trial slot"""
+        if self.state == HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def _expire(self, now: float):
+        horizon = now - self.window
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._failures = 0
+        self.opened += 1
+        print(f"Circuit for {self.name} opened, refusing calls for {self.open_seconds:.0f}s")
+
+    def _close(self):
+        self.state = CLOSED
+        self._opened_at = None
+        self._trials = 0
+
+    def reset(self):
+        """Close the circuit and forget the window"""
+        self._outcomes.clear()
+        self._failures = 0
+        self._close()
+
+    def stats(self) -> Dict:
+        self._expire(time.monotonic())
+        calls = len(self._outcomes)
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(self._opened_at + self.open_seconds - time.monotonic(), 0.0), 1)
+        return {
+            "state": self.state if self.enabled else "disabled",
+            "window_calls": calls,
+            "window_failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_in_seconds": retry_in,
+        }
@@ -0,0 +1,92 @@
+import math
+from typing import Any, Dict, List, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometers"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def centroid(points: List[Tuple[float, float]]) -> Tuple[float, float]:
+    """Plain average of (lat, lon) points, fine at city scale"""
+    return (
+        sum(lat for lat, _ in points) / len(points),
+        sum(lon for _, lon in points) / len(points),
+    )
+
+
+class GridIndex:
+    """
+    Fixed-size lat/lon grid for radius queries
+    Points are bucketed into cells of cell_km (north-south), a query only
+    visits the cells overlapping the radius' bounding box and then filters
+    them by haversine distance. Boxes crossing the antimeridian wrap around,
+    a radius reaching over a pole covers every longitude
+    """
+
+    def __init__(self, cell_km: float = 2.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = {}
+        self._size = 0
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def insert(self, lat: float, lon: float, item: Any):
+        self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, item))
+        self._size += 1
+
+    @staticmethod
+    def _bounds(lat: float, lon: float, radius_km: float) -> Tuple[float, float, List[Tuple[float, float]]]:
+        """Latitude range and longitude ranges (split at the antimeridian) holding the radius"""
+        # same sphere as haversine_km, with a little slack for rounding at the edge
+        angle = radius_km / EARTH_RADIUS_KM * (1 + 1e-9)
+        dlat = math.degrees(angle)
+        lat_lo, lat_hi = lat - dlat, lat + dlat
+        # widest longitude offset of the circle is asin(sin(r) / cos(lat)),
+        # past 1 the circle contains a pole
+        if lat_lo <= -90 or lat_hi >= 90 or math.sin(angle) >= math.cos(math.radians(lat)):
+            return max(lat_lo, -90.0), min(lat_hi, 90.0), [(-180.0, 180.0)]
+        reach = math.sin(angle) / math.cos(math.radians(lat))
+        dlon = math.degrees(math.asin(reach))
+        lon_lo, lon_hi = lon - dlon, lon + dlon
+        if lon_lo < -180:
+            return lat_lo, lat_hi, [(-180.0, lon_hi), (lon_lo + 360, 180.0)]
+        if lon_hi > 180:
+            return lat_lo, lat_hi, [(lon_lo, 180.0), (-180.0, lon_hi - 360)]
+        return lat_lo, lat_hi, [(lon_lo, lon_hi)]
+
+    def query(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Any]]:
+        """(distance_km, item) within radius_km of a point, nearest first"""
+        lat_lo, lat_hi, lon_ranges = self._bounds(lat, lon, radius_km)
+        row_lo, row_hi = self._cell(lat_lo, 0.0)[0], self._cell(lat_hi, 0.0)[0]
+        columns = [(self._cell(0.0, lo)[1], self._cell(0.0, hi)[1]) for lo, hi in lon_ranges]
+
+        found = []
+        if (row_hi - row_lo + 1) * sum(hi - lo + 1 for lo, hi in columns) > len(self._cells):
+            # radius wider than the data, scanning occupied cells is cheaper
+            candidates = (point for points in self._cells.values() for point in points)
+        else:
+            candidates = (
+                point
+                for i in range(row_lo, row_hi + 1)
+                for col_lo, col_hi in columns
+                for j in range(col_lo, col_hi + 1)
+                for point in self._cells.get((i, j), ())
+            )
+        for point_lat, point_lon, item in candidates:
+            distance = haversine_km(lat, lon, point_lat, point_lon)
+            if distance <= radius_km:
+                found.append((distance, item))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self) -> int:
+        return self._size
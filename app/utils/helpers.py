@@ -1,5 +1,7 @@
-from datetime import datetime
-from typing import List
+import base64
+import json
+from datetime import datetime, timezone
+from typing import List, Tuple
 
 
 def calculate_average(prices: List[float]) -> float:
@@ -26,6 +28,29 @@ def is_cache_valid(cached_time: datetime, expiry_minutes: int) -> bool:
     return difference < expiry_minutes
 
 
+def age_seconds(timestamp: datetime) -> float:
+    """Seconds elapsed since a UTC timestamp, naive or timezone aware"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (datetime.utcnow() - timestamp).total_seconds()
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque keyset pagination cursor for a (timestamp, id) position"""
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor, ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
 def normalize_value(value: float, min_val: float, max_val: float) -> float:
     """
     Normalize a value between 0 and 1
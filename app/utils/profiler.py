@@ -0,0 +1,288 @@
+import itertools
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from app.core.config import settings
+from app.core.security import is_admin_key
+
+# Deepest stack kept per sample, frames beyond it are cut at the root end
+MAX_STACK_DEPTH = 128
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def _module_path(filename: str) -> str:
+    """Dotted module path of a source file, relative to site-packages, the stdlib or the project"""
+    path = filename.replace("\\", "/")
+    for marker in ("/site-packages/", "/dist-packages/"):
+        if marker in path:
+            path = path.rsplit(marker, 1)[1]
+            break
+    else:
+        if "/lib/python" in path:
+            # stdlib: .../lib/python3.11/asyncio/events.py
+            path = path.rsplit("/lib/python", 1)[1].split("/", 1)[-1]
+        elif "/app/" in path:
+            path = "app/" + path.rsplit("/app/", 1)[1]
+    if path.endswith(".py"):
+        path = path[:-3]
+    return path.replace("/", ".")
+
+
+class Profile:
+    """Stack samples taken while one request was running"""
+
+    def __init__(self, profile_id: int, method: str, path: str, trigger: str, thread_id: int):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.thread_id = thread_id
+        self.started_at = datetime.now(timezone.utc)
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        self.samples: Counter = Counter()
+        self._start = time.perf_counter()
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "samples": sum(self.samples.values()),
+        }
+
+
+def collapsed(samples: Counter) -> str:
+    """Brendan Gregg's collapsed format, one "root;...;leaf count" line per stack, for flamegraph tools"""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in samples.most_common())
+
+
+def top_functions(samples: Counter, limit: int = 20) -> Dict:
+    """
+    Per function sample counts: self (the function was on top of the stack)
+    and total (anywhere in the stack). packages groups self samples by top
+    level package, e.g. pydantic, sqlalchemy, httpx or app
+    """
+    total = sum(samples.values())
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    packages: Counter = Counter()
+    for stack, count in samples.items():
+        # stack[0] is the thread name
+        frames = stack[1:] or stack
+        own[frames[-1]] += count
+        packages[frames[-1].split(".", 1)[0].split(":", 1)[0]] += count
+        for label in set(frames):
+            inclusive[label] += count
+
+    def share(count: int) -> float:
+        return round(count / total * 100, 1) if total else 0.0
+
+    return {
+        "samples": total,
+        "functions": [
+            {"function": label, "self": count, "self_pct": share(count),
+             "total": inclusive[label], "total_pct": share(inclusive[label])}
+            for label, count in own.most_common(limit)
+        ],
+        "cumulative": [
+            {"function": label, "total": count, "total_pct": share(count)}
+            for label, count in inclusive.most_common(limit)
+        ],
+        "packages": [
+            {"package": name, "self": count, "self_pct": share(count)}
+            for name, count in packages.most_common()
+        ],
+    }
+
+
+class RequestProfiler:
+    """
+    Sampling profiler for individual requests
+
+    While at least one profiled request is in flight a daemon thread snapshots
+    every thread's stack each interval. Samples from the event loop thread go
+    to every active profile, threadpool samples only when they run app code
+    (run_db work, sync dependencies). Other requests sharing the loop at the
+    same time show up too, profiles are cleanest on a quiet instance or when
+    aggregated over many sampled requests. The last max_profiles are kept.
+
+    The sampler needs the GIL to take a snapshot, and the interpreter's switch
+    interval (5 ms by default) is left alone since it is process wide. While
+    the loop runs pure Python, samples come at most once per switch interval.
+    """
+
+    def __init__(self, interval: float = 0.001, max_profiles: int = 50, sample_every: int = 0):
+        self.interval = interval
+        self.sample_every = sample_every
+        self._profiles: deque = deque(maxlen=max_profiles)
+        self._active: Dict[int, Profile] = {}
+        self._ids = itertools.count(1)
+        self._requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+
+    def trigger(self, scope) -> Optional[str]:
+        """Why this request should be profiled: header / query (admins only), sampled, or None"""
+        requested = None
+        admin_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = "header" if value.decode("latin-1").lower() in TRUE_VALUES else None
+            elif name == b"x-admin-key":
+                admin_key = value.decode("latin-1")
+        query = scope.get("query_string", b"")
+        if requested is None and b"profile=" in query:
+            values = parse_qs(query.decode("latin-1")).get("profile", [])
+            if values and values[-1].lower() in TRUE_VALUES:
+                requested = "query"
+        if requested and is_admin_key(admin_key):
+            return requested
+
+        if self.sample_every > 0:
+            self._requests += 1
+            if self._requests % self.sample_every == 0:
+                return "sampled"
+        return None
+
+    def begin(self, method: str, path: str, trigger: str) -> Profile:
+        profile = Profile(next(self._ids), method, path, trigger, threading.get_ident())
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile: Profile, status: Optional[int]):
+        profile.duration_ms = round((time.perf_counter() - profile._start) * 1000, 3)
+        profile.status = status
+        with self._lock:
+            self._active.pop(profile.id, None)
+            self._profiles.append(profile)
+
+    def profiles(self) -> List[Profile]:
+        with self._lock:
+            return list(self._profiles)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        return next((p for p in self.profiles() if p.id == profile_id), None)
+
+    def combined(self) -> Counter:
+        """Samples of every kept profile added together"""
+        merged: Counter = Counter()
+        for profile in self.profiles():
+            merged.update(profile.samples)
+        return merged
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._profiles)
+            self._profiles.clear()
+        return count
+
+    def stats(self) -> Dict:
+        return {
+            "kept": len(self._profiles),
+            "max_profiles": self._profiles.maxlen,
+            "active": len(self._active),
+            "sample_every": self.sample_every,
+            "interval_ms": self.interval * 1000,
+        }
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{_module_path(code.co_filename)}:{code.co_name}"
+        return label
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.values())
+
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            loop_threads = {profile.thread_id for profile in active}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = self._stack(frame)
+                if thread_id not in loop_threads and not any(label.startswith("app.") for label in stack):
+                    continue  # idle worker or server thread
+                stacks.append((thread_id, (names.get(thread_id, str(thread_id)),) + stack))
+            frame = None  # don't keep the last stack alive while sleeping
+
+            with self._lock:
+                # profiles that ended meanwhile are readable by the admin API, leave them alone
+                for profile in self._active.values():
+                    for thread_id, stack in stacks:
+                        if thread_id in loop_threads and profile.thread_id != thread_id:
+                            continue
+                        profile.samples[stack] += 1
+            time.sleep(self.interval)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware running selected requests under the request profiler
+    Profiled responses carry an X-Profile-Id header to look the profile up with
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = request_profiler.trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = request_profiler.begin(scope["method"], scope["path"], trigger)
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", str(profile.id).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_profiler.end(profile, status)
+
+
+# Global instance
+request_profiler = RequestProfiler(
+    interval=settings.PROFILING_INTERVAL_MS / 1000,
+    max_profiles=settings.PROFILING_MAX_PROFILES,
+    sample_every=settings.PROFILING_SAMPLE_EVERY,
+)
@@ -0,0 +1,117 @@
+import os
+import struct
+import time
+from typing import Dict, Optional
+from app.utils.metrics import metrics
+from app.utils.shared_cache import SharedSegment
+
+# minute, calls in it, day, calls in it
+COUNTERS = struct.Struct("<qqqq")
+
+quota_decisions = metrics.counter(
+    "upstream_quota_decisions_total",
+    "Upstream call budget decisions: allowed, deferred (cache served, budget tight) or exhausted",
+    ["upstream", "decision"],
+)
+
+
+class UpstreamQuota:
+    """
+    Per-minute and per-day call budget for one upstream API
+
+    Windows are fixed (the clock minute and the UTC day) like the providers'
+    own counters. Callers say whether the call is deferrable, i.e. there is
+    cached data to serve instead (a stale entry, a background refetch, a
+    prewarm). Once less than reserve of either budget is left, deferrable
+    calls are refused so the rest goes to requests with nothing cached, and
+    once a budget is spent every call is refused until the window rolls over.
+    A limit of 0 means no limit. Not thread safe, meant for the event loop.
+
+    With a directory the call counts live in a segment shared by the host's
+    workers (see SharedSegment), so the budget holds for the host rather
+    than each worker. Without one they are per process.
+    """
+
+    def __init__(self, name: str, per_minute: int = 0, per_day: int = 0, reserve: float = 0.2,
+                 directory: Optional[str] = None):
+        self.name = name
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.reserve = reserve
+        self._minute = -1
+        self._day = -1
+        self.minute_calls = 0
+        self.day_calls = 0
+        self._segment = SharedSegment(
+            f"{name} quota", os.path.join(directory, f"quota-{name}.v1.counters") if directory else None,
+            COUNTERS.size,
+        )
+
+        # Counters
+        self.allowed = 0
+        self.deferred = 0
+        self.exhausted = 0
+
+    def _roll(self, now: float):
+        minute = int(now // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self.minute_calls = 0
+        day = int(now // 86400)
+        if day != self._day:
+            self._day = day
+            self.day_calls = 0
+
+    @staticmethod
+    def _left(limit: int, used: int) -> float:
+        """Share of a budget left, 1.0 without a limit"""
+        return 1.0 if limit <= 0 else (limit - used) / limit
+
+    def acquire(self, deferrable: bool = False) -> bool:
+        """Count one call against the budget, False when it shouldn't be made"""
+        buf = self._segment.mapping()
+        if buf is None:
+            decision = self._decide(deferrable)
+        else:
+            with self._segment.locked(0, COUNTERS.size, exclusive=True):
+                self._minute, self.minute_calls, self._day, self.day_calls = COUNTERS.unpack_from(buf, 0)
+                decision = self._decide(deferrable)
+                COUNTERS.pack_into(buf, 0, self._minute, self.minute_calls, self._day, self.day_calls)
+
+        if decision == "exhausted":
+            self.exhausted += 1
+        elif decision == "deferred":
+            self.deferred += 1
+        else:
+            self.allowed += 1
+        quota_decisions.inc(self.name, decision)
+        return decision == "allowed"
+
+    def _decide(self, deferrable: bool) -> str:
+        self._roll(time.time())
+        left = min(self._left(self.per_minute, self.minute_calls), self._left(self.per_day, self.day_calls))
+        if left <= 0:
+            return "exhausted"
+        if deferrable and left <= self.reserve:
+            return "deferred"
+        self.minute_calls += 1
+        self.day_calls += 1
+        return "allowed"
+
+    def stats(self) -> Dict:
+        buf = self._segment.mapping()
+        if buf is not None:
+            with self._segment.locked(0, COUNTERS.size, exclusive=False):
+                self._minute, self.minute_calls, self._day, self.day_calls = COUNTERS.unpack_from(buf, 0)
+        self._roll(time.time())
+        return {
+            "shared": self._segment.enabled,
+            "per_minute": self.per_minute or None,
+            "per_day": self.per_day or None,
+            "minute_calls": self.minute_calls,
+            "day_calls": self.day_calls,
+            "reserve": self.reserve,
+            "allowed": self.allowed,
+            "deferred": self.deferred,
+            "exhausted": self.exhausted,
+        }
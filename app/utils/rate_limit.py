@@ -0,0 +1,270 @@
+import math
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.utils.metrics import metrics
+from app.utils.shared_cache import WAYS, SharedSegment, _key_hash
+
+# Idle buckets dropped per new client at most, keeps the cleanup O(1)
+EVICT_PER_INSERT = 2
+# Shared bucket: key hash (0 marks an empty slot), tokens, last seen
+BUCKET = struct.Struct("<Qdd")
+
+rate_limited_requests = metrics.counter(
+    "http_rate_limited_total", "Requests refused with 429 by the inbound rate limiter",
+)
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets, rate_per_minute sustained with bursts up to burst
+
+    Buckets live in shards picked by the key's hash, each an LRU ordered dict,
+    so a lookup is O(1). A bucket that has been idle long enough to refill
+    completely is indistinguishable from a new one, so it can be dropped:
+    every new client evicts up to two such buckets from the cold end of its
+    shard, which keeps the idle ones from piling up. max_clients is a hard cap
+    on top, past it the least recently seen client of the shard is forgotten.
+    No locks, acquire() runs on the event loop. rate_per_minute <= 0
+    disables the limiter.
+
+    With a directory the buckets live in a segment shared by the host's
+    workers instead (see SharedSegment), so a client gets the same limit
+    however many workers there are. A key hashes to a group of WAYS slots
+    under one byte range lock, a new client takes the group's empty or least
+    recently seen slot. The monotonic clock is system wide, so the workers'
+    timestamps compare. The counters stay per process.
+    """
+
+    def __init__(self, rate_per_minute: float = 60, burst: int = 20, shards: int = 16,
+                 max_clients: int = 100000, name: str = "clients", directory: Optional[str] = None):
+        self.enabled = rate_per_minute > 0
+        self.rate = rate_per_minute / 60.0
+        self.burst = float(max(burst, 1))
+        # a bucket idle this long is full again
+        self.idle_seconds = self.burst / self.rate if self.rate > 0 else 0.0
+        self.max_per_shard = max(max_clients // max(shards, 1), 1)
+        self._shards = [OrderedDict() for _ in range(max(shards, 1))]
+        self.groups = max(-(-max_clients // WAYS), 1)
+        self._segment = SharedSegment(
+            f"{name} rate limit",
+            os.path.join(directory, f"ratelimit-{name}-{self.groups * WAYS}.v1.buckets") if directory else None,
+            self.groups * WAYS * BUCKET.size,
+        )
+
+        # Counters
+        self.allowed = 0
+        self.limited = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def acquire(self, key, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Take one token for key, returns (allowed, seconds until a token is available)"""
+        if now is None:
+            now = time.monotonic()
+        buf = self._segment.mapping()
+        if buf is None:
+            allowed, tokens = self._take(key, now)
+        else:
+            allowed, tokens = self._take_shared(buf, key, now)
+        if allowed:
+            self.allowed += 1
+            return True, 0.0
+        self.limited += 1
+        return False, (1.0 - tokens) / self.rate
+
+    def _take(self, key, now: float) -> Tuple[bool, float]:
+        """Take a token from the in-process bucket, returns (taken, tokens left)"""
+        shard = self._shards[hash(key) % len(self._shards)]
+        bucket = shard.get(key)
+        if bucket is None:
+            self._evict(shard, now)
+            bucket = shard[key] = [self.burst, now]
+        else:
+            shard.move_to_end(key)
+            tokens = bucket[0] + (now - bucket[1]) * self.rate
+            bucket[0] = tokens if tokens < self.burst else self.burst
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return True, bucket[0]
+        return False, bucket[0]
+
+    def _take_shared(self, buf, key, now: float) -> Tuple[bool, float]:
+        """Take a token from the bucket in the shared segment, returns (taken, tokens left)"""
+        key_hash = _key_hash(str(key).encode())
+        length = WAYS * BUCKET.size
+        with self._segment.locked(key_hash % self.groups * length, length, exclusive=True) as base:
+            offset, victim, victim_seen = None, base, None
+            for way in range(WAYS):
+                slot = base + way * BUCKET.size
+                slot_hash, tokens, seen = BUCKET.unpack_from(buf, slot)
+                if slot_hash == key_hash:
+                    offset = slot
+                    break
+                if victim_seen is None or seen < victim_seen:
+                    victim, victim_seen = slot, seen  # an empty slot was never seen, 0.0
+            if offset is None:
+                if victim_seen:
+                    if now - victim_seen >= self.idle_seconds:
+                        self.evicted_idle += 1
+                    else:
+                        self.evicted_capacity += 1
+                offset, tokens = victim, self.burst
+            else:
+                # a segment left from before a reboot can hold timestamps from the future
+                tokens = min(tokens + max(now - seen, 0.0) * self.rate, self.burst)
+            taken = tokens >= 1.0
+            if taken:
+                tokens -= 1.0
+            BUCKET.pack_into(buf, offset, key_hash, tokens, now)
+        return taken, tokens
+
+    def _evict(self, shard: OrderedDict, now: float):
+        """Make room in a shard before a new client is added"""
+        for _ in range(EVICT_PER_INSERT):
+            if not shard or now - next(iter(shard.values()))[1] < self.idle_seconds:
+                break
+            shard.popitem(last=False)
+            self.evicted_idle += 1
+        if len(shard) >= self.max_per_shard:
+            shard.popitem(last=False)
+            self.evicted_capacity += 1
+
+    def __len__(self) -> int:
+        buf = self._segment.mapping()
+        if buf is None:
+            return sum(len(shard) for shard in self._shards)
+        # unlocked scan, a slot being written can be miscounted
+        return sum(1 for offset in range(0, self._segment.size, BUCKET.size) if BUCKET.unpack_from(buf, offset)[0])
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "shared": self._segment.enabled,
+            "rate_per_minute": round(self.rate * 60, 3),
+            "burst": int(self.burst),
+            "clients": len(self),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware answering 429 once a client runs out of tokens
+
+    Clients are identified by their address: the peer address, or with
+    RATE_LIMIT_TRUSTED_PROXIES = N the X-Forwarded-For entry added by the
+    outermost of the N proxies (counted from the right, entries further left
+    are whatever the client sent). When RATE_LIMIT_CLIENT_HEADER is set and
+    present (a POS id) that client gets its own bucket too, but the header is
+    not authenticated, so the address bucket (RATE_LIMIT_ADDRESS_PER_MINUTE)
+    still caps everything coming from one address. Paths under
+    RATE_LIMIT_EXEMPT_PATHS are never limited. An X-Forwarded-For header
+    while RATE_LIMIT_TRUSTED_PROXIES = 0 means every client behind that proxy
+    shares the proxy's bucket, which is logged once per worker.
+    """
+
+    def __init__(self, app, limiter: Optional[TokenBucketLimiter] = None,
+                 address_limiter: Optional[TokenBucketLimiter] = None):
+        self.app = app
+        # not `or`, an empty limiter is falsy through __len__
+        self.limiter = rate_limiter if limiter is None else limiter
+        self.address_limiter = address_rate_limiter if address_limiter is None else address_limiter
+        self.exempt = tuple(p.strip() for p in settings.RATE_LIMIT_EXEMPT_PATHS.split(",") if p.strip())
+        header = settings.RATE_LIMIT_CLIENT_HEADER
+        self.client_header = header.lower().encode("latin-1") if header else None
+        self.trusted_proxies = max(settings.RATE_LIMIT_TRUSTED_PROXIES, 0)
+        # cleared once a forwarded request has been reported
+        self.check_forwarded = self.trusted_proxies == 0
+
+    def client_keys(self, scope) -> Tuple[str, Optional[str]]:
+        """(client address, client header value or None)"""
+        client_id = None
+        forwarded = []
+        if self.client_header is not None or self.trusted_proxies:
+            for name, value in scope["headers"]:
+                if name == self.client_header:
+                    client_id = value.decode("latin-1")
+                elif name == b"x-forwarded-for" and self.trusted_proxies:
+                    forwarded.extend(value.split(b","))
+        if len(forwarded) >= self.trusted_proxies > 0:
+            address = forwarded[-self.trusted_proxies].strip().decode("latin-1")
+            if address:
+                return address, client_id
+        # not forwarded by all of the trusted proxies, only the peer is known
+        client = scope.get("client")
+        return client[0] if client else "unknown", client_id
+
+    def acquire(self, scope) -> Tuple[bool, float]:
+        """Take a token from the address bucket, and the client header's bucket when sent"""
+        address, client_id = self.client_keys(scope)
+        if client_id is None:
+            return self.limiter.acquire(address)
+        if self.address_limiter.enabled:
+            allowed, retry_after = self.address_limiter.acquire(address)
+            if not allowed:
+                return allowed, retry_after
+        return self.limiter.acquire(client_id)
+
+    def _warn_forwarded(self, scope):
+        """Log the first request that came through a proxy nobody told the limiter about"""
+        for name, _ in scope["headers"]:
+            if name == b"x-forwarded-for":
+                self.check_forwarded = False
+                print("Rate limiter: X-Forwarded-For received with RATE_LIMIT_TRUSTED_PROXIES=0, "
+                      "clients behind the proxy share one bucket. Set it to the number of proxies")
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        if self.check_forwarded:
+            self._warn_forwarded(scope)
+        allowed, retry_after = self.acquire(scope)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        rate_limited_requests.inc()
+        body = b'{"detail":"Rate limit exceeded"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Global instance
+rate_limiter = TokenBucketLimiter(
+    rate_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    burst=settings.RATE_LIMIT_BURST,
+    shards=settings.RATE_LIMIT_SHARDS,
+    max_clients=settings.RATE_LIMIT_MAX_CLIENTS,
+    name="clients",
+    directory=settings.SHARED_CACHE_DIR,
+)
+
+# Per-address cap on clients identified by RATE_LIMIT_CLIENT_HEADER
+address_rate_limiter = TokenBucketLimiter(
+    rate_per_minute=settings.RATE_LIMIT_ADDRESS_PER_MINUTE,
+    burst=settings.RATE_LIMIT_ADDRESS_BURST,
+    shards=settings.RATE_LIMIT_SHARDS,
+    max_clients=settings.RATE_LIMIT_MAX_CLIENTS,
+    name="addresses",
+    directory=settings.SHARED_CACHE_DIR,
+)
@@ -0,0 +1,97 @@
+from typing import Any, Dict, List, Optional, Tuple
+import pydantic_core
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional, pydantic_core's encoder is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, MessagePack is refused with 406 without it
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# application/x-msgpack is the older, still common name
+MEDIA_TYPES = (JSON, MSGPACK, "application/x-msgpack")
+
+# Negotiated responses differ by Accept, shared caches have to key on it
+VARY = {"Vary": "Accept"}
+
+# OpenAPI "responses" entry for routes that negotiate their format
+NEGOTIATED_RESPONSES: Dict = {200: {"content": {MSGPACK: {}}}}
+
+
+def _accepted(accept: str) -> List[Tuple[float, int, str]]:
+    """Media ranges of an Accept header as (q, order, type), best first"""
+    ranges = []
+    for order, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type and q > 0:
+            ranges.append((-q, order, media_type.lower()))
+    ranges.sort()
+    return ranges
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick JSON or MessagePack for an Accept header, JSON when there's no preference
+    Raises 406 when only MessagePack is acceptable and msgpack isn't installed,
+    routes call it before doing any work. A plain Request parameter is used
+    to read the header, a Header() dependency costs more than the encoding saves
+    """
+    if not accept or "msgpack" not in accept.lower():
+        return JSON
+    for _, _, media_type in _accepted(accept):
+        if media_type in MEDIA_TYPES[1:]:
+            if msgpack is None:
+                continue
+            return MSGPACK
+        if media_type in (JSON, "application/*", "*/*"):
+            return JSON
+    if msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack requested but the msgpack package is not installed",
+                            headers=VARY)
+    raise HTTPException(status_code=406, detail=f"Supported media types: {', '.join(MEDIA_TYPES)}", headers=VARY)
+
+
+def dumps_json(content: Any) -> bytes:
+    """
+    Encode with orjson when available, pydantic_core otherwise
+    Pydantic models go straight through their compiled serializer, skipping
+    the response_model revalidation and jsonable_encoder pass
+    """
+    if orjson is not None and not isinstance(content, BaseModel):
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            pass  # a model or other type orjson doesn't know, nested somewhere
+    return pydantic_core.to_json(content)
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=pydantic_core.to_jsonable_python)
+
+
+def respond(content: Any, media_type: str = JSON, status_code: int = 200) -> Response:
+    """
+    Serialize a route result as JSON or MessagePack
+
+    Routes returning this Response keep their response_model for the docs,
+    FastAPI doesn't validate or re-encode a Response. Only use it for trusted
+    content (engine output, database rows). Every response carries
+    Vary: Accept, whichever format was picked.
+    """
+    if media_type == MSGPACK:
+        return Response(dumps_msgpack(content), status_code=status_code, media_type=MSGPACK, headers=VARY)
+    return Response(dumps_json(content), status_code=status_code, media_type=JSON, headers=VARY)
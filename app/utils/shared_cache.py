@@ -0,0 +1,324 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.utils.metrics import metrics, handled_errors
+
+try:
+    import fcntl
+except ImportError:  # Windows, no byte range locks
+    fcntl = None
+
+# Slots per lock group, a key can live in any slot of its group
+WAYS = 8
+# key hash, expires at, lease until, lease pid, key length, value length
+SLOT_HEADER = struct.Struct("<QddIHI")
+SLOT_HEADER_SIZE = 40
+# Bumped whenever the layout changes, it's part of the segment file name
+LAYOUT_VERSION = 1
+
+_CLAIMED, _FRESH, _HELD = "claimed", "fresh", "held"
+
+shared_cache_lookups = metrics.counter(
+    "shared_cache_lookups_total", "Lookups in the cache segments shared by the workers of a host",
+    ["cache", "result"],
+)
+
+
+def _key_hash(key: bytes) -> int:
+    # stable across processes, unlike hash(); 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class SharedSegment:
+    """
+    A file of size bytes mapped into every worker process on a host
+
+    MAP_SHARED, so on tmpfs it is plain shared memory, zero filled when new.
+    Byte ranges are locked with fcntl.lockf, which excludes other processes
+    (not other threads). Disabled, mapping() returns None, when path is None,
+    fcntl isn't available or the file can't be opened.
+    """
+
+    def __init__(self, name: str, path: Optional[str], size: int):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.enabled = bool(path)
+        if self.enabled and fcntl is None:
+            print(f"Shared {name} needs fcntl (POSIX), running without it")
+            self.enabled = False
+        self.fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._pid: Optional[int] = None
+
+    def mapping(self) -> Optional[mmap.mmap]:
+        """The segment mapped into this process, opened on first use and again after a fork"""
+        if not self.enabled:
+            return None
+        if self._pid != os.getpid():
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                if os.fstat(fd).st_size < self.size:
+                    # zero filled; concurrent workers truncate to the same size
+                    os.ftruncate(fd, self.size)
+                self._map = mmap.mmap(fd, self.size)
+            except OSError as e:
+                print(f"Error opening shared {self.name} at {self.path}: {e}")
+                handled_errors.inc("shared_cache")
+                self.enabled = False
+                return None
+            self.fd = fd
+            self._pid = os.getpid()
+        return self._map
+
+    @contextmanager
+    def locked(self, start: int, length: int, exclusive: bool):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, length, start)
+        try:
+            yield start
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, length, start)
+
+
+class SharedCache:
+    """
+    Cache segment shared by all worker processes on a host
+
+    A file in directory mapped into every worker (MAP_SHARED, so on tmpfs it
+    is plain shared memory), split into fixed size slots. A key hashes to a
+    group of WAYS slots guarded by a byte range lock (fcntl.lockf), shared for
+    reads and exclusive for writes, so workers only contend on the same group.
+    Values are stored as JSON (encode / decode convert to and from JSON-able
+    data) with a wall clock expiry, values too big for a slot aren't shared.
+
+    One writer per key: before loading a key a worker claims its lease with
+    claim(). Other workers wanting the same key wait for the value to be
+    published instead of loading it too. A lease not released within
+    lease_seconds (the worker died) can be taken over.
+
+    Disabled, every lookup misses and every claim succeeds, when directory is
+    None or fcntl isn't available. Not thread safe, meant for the event loop.
+    """
+
+    def __init__(self, name: str, slots: int = 1024, slot_bytes: int = 1024,
+                 encode: Callable[[Any], Any] = _identity, decode: Callable[[Any], Any] = _identity,
+                 directory: Optional[str] = None, lease_seconds: float = 15.0, poll_seconds: float = 0.05):
+        self.name = name
+        self.groups = max(-(-slots // WAYS), 1)
+        self.slot_bytes = max(slot_bytes, SLOT_HEADER_SIZE + 64)
+        self.encode = encode
+        self.decode = decode
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.size = self.groups * WAYS * self.slot_bytes
+        self._segment = SharedSegment(f"{name} cache", os.path.join(
+            directory, f"{name}-{self.groups * WAYS}x{self.slot_bytes}.v{LAYOUT_VERSION}.cache"
+        ) if directory else None, self.size)
+        self.path = self._segment.path
+
+        # Counters, per process
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.too_large = 0
+        self.lease_waits = 0
+        self.waits_served = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._segment.enabled
+
+    def _mapping(self) -> Optional[mmap.mmap]:
+        return self._segment.mapping()
+
+    def _locked(self, group: int, exclusive: bool):
+        return self._segment.locked(group * WAYS * self.slot_bytes, WAYS * self.slot_bytes, exclusive)
+
+    def _find(self, buf: mmap.mmap, base: int, key_hash: int, key: bytes) -> Tuple[Optional[int], Optional[tuple]]:
+        """(offset, header) of the key's slot in the group at base, (None, None) when it isn't there"""
+        for way in range(WAYS):
+            offset = base + way * self.slot_bytes
+            header = SLOT_HEADER.unpack_from(buf, offset)
+            if header[0] == key_hash:
+                start = offset + SLOT_HEADER_SIZE
+                if buf[start:start + header[4]] == key:
+                    return offset, header
+        return None, None
+
+    def _victim(self, buf: mmap.mmap, base: int, now: float) -> Optional[int]:
+        """Slot for a new key: an empty one, else the one expiring first. Slots being loaded are kept"""
+        victim, victim_expiry = None, None
+        for way in range(WAYS):
+            offset = base + way * self.slot_bytes
+            key_hash, expires_at, lease_until = SLOT_HEADER.unpack_from(buf, offset)[:3]
+            if lease_until > now:
+                continue
+            if key_hash == 0:
+                return offset
+            if victim is None or expires_at < victim_expiry:
+                victim, victim_expiry = offset, expires_at
+        return victim
+
+    def _locate(self, key) -> Tuple[bytes, int, int]:
+        key_bytes = str(key).encode()
+        key_hash = _key_hash(key_bytes)
+        return key_bytes, key_hash, key_hash % self.groups
+
+    def get(self, key) -> Optional[Tuple[Any, float]]:
+        """(value, seconds left) for a live entry, None otherwise"""
+        buf = self._mapping()
+        if buf is None:
+            return None
+        key_bytes, key_hash, group = self._locate(key)
+        now = time.time()
+        payload = None
+        with self._locked(group, exclusive=False) as base:
+            offset, header = self._find(buf, base, key_hash, key_bytes)
+            if offset is not None and header[1] > now:
+                start = offset + SLOT_HEADER_SIZE + header[4]
+                payload = buf[start:start + header[5]]
+        if payload is None:
+            self.misses += 1
+            shared_cache_lookups.inc(self.name, "miss")
+            return None
+        self.hits += 1
+        shared_cache_lookups.inc(self.name, "hit")
+        return self.decode(json.loads(payload)), header[1] - now
+
+    def set(self, key, value: Any, ttl: float) -> bool:
+        """Publish a value for ttl seconds and clear the key's lease, False when it couldn't be stored"""
+        buf = self._mapping()
+        if buf is None or ttl <= 0:
+            return False
+        key_bytes, key_hash, group = self._locate(key)
+        payload = json.dumps(self.encode(value), separators=(",", ":")).encode()
+        if SLOT_HEADER_SIZE + len(key_bytes) + len(payload) > self.slot_bytes:
+            self.too_large += 1
+            return False
+        now = time.time()
+        with self._locked(group, exclusive=True) as base:
+            offset, _ = self._find(buf, base, key_hash, key_bytes)
+            if offset is None:
+                offset = self._victim(buf, base, now)
+                if offset is None:
+                    return False
+            start = offset + SLOT_HEADER_SIZE
+            buf[start:start + len(key_bytes)] = key_bytes
+            buf[start + len(key_bytes):start + len(key_bytes) + len(payload)] = payload
+            SLOT_HEADER.pack_into(buf, offset, key_hash, now + ttl, 0.0, 0, len(key_bytes), len(payload))
+        self.writes += 1
+        return True
+
+    def _try_claim(self, key_bytes: bytes, key_hash: int, group: int, min_ttl: float) -> Tuple[str, float]:
+        buf = self._mapping()
+        now = time.time()
+        pid = os.getpid()
+        with self._locked(group, exclusive=True) as base:
+            offset, header = self._find(buf, base, key_hash, key_bytes)
+            if offset is not None:
+                _, expires_at, lease_until, lease_pid, key_len, value_len = header
+                if expires_at - now > min_ttl:
+                    return _FRESH, 0.0
+                if lease_until > now and lease_pid != pid:
+                    return _HELD, lease_until
+                SLOT_HEADER.pack_into(buf, offset, key_hash, expires_at, now + self.lease_seconds, pid,
+                                      key_len, value_len)
+                return _CLAIMED, 0.0
+            offset = self._victim(buf, base, now)
+            if offset is not None:
+                # placeholder holding the lease, lookups miss on it until the value is published
+                buf[offset + SLOT_HEADER_SIZE:offset + SLOT_HEADER_SIZE + len(key_bytes)] = key_bytes
+                SLOT_HEADER.pack_into(buf, offset, key_hash, 0.0, now + self.lease_seconds, pid, len(key_bytes), 0)
+            # every slot of the group is being loaded, load without a lease
+            return _CLAIMED, 0.0
+
+    async def claim(self, key, min_ttl: float = 0.0) -> bool:
+        """
+        Become the worker loading key. True: the caller loads it, publishes
+        it with set() and calls release(). False: an entry with more than
+        min_ttl seconds left is in the segment, possibly after waiting for
+        the worker that held the lease
+        """
+        if self._mapping() is None:
+            return True
+        key_bytes, key_hash, group = self._locate(key)
+        waited = False
+        while True:
+            state, lease_until = self._try_claim(key_bytes, key_hash, group, min_ttl)
+            if state == _CLAIMED:
+                return True
+            if state == _FRESH:
+                if waited:
+                    self.waits_served += 1
+                return False
+            if not waited:
+                waited = True
+                self.lease_waits += 1
+            await asyncio.sleep(max(min(self.poll_seconds, lease_until - time.time()), 0.001))
+
+    def release(self, key):
+        """Give up this worker's lease on key, a no-op when it doesn't hold it"""
+        buf = self._mapping()
+        if buf is None:
+            return
+        key_bytes, key_hash, group = self._locate(key)
+        with self._locked(group, exclusive=True) as base:
+            offset, header = self._find(buf, base, key_hash, key_bytes)
+            if offset is None or header[3] != os.getpid() or header[2] == 0.0:
+                return
+            if header[5] == 0:
+                # placeholder, nothing was published
+                SLOT_HEADER.pack_into(buf, offset, 0, 0.0, 0.0, 0, 0, 0)
+            else:
+                SLOT_HEADER.pack_into(buf, offset, key_hash, header[1], 0.0, 0, header[4], header[5])
+
+    def invalidate(self, key) -> bool:
+        """Drop a key for every worker, returns whether it had a live entry"""
+        buf = self._mapping()
+        if buf is None:
+            return False
+        key_bytes, key_hash, group = self._locate(key)
+        with self._locked(group, exclusive=True) as base:
+            offset, header = self._find(buf, base, key_hash, key_bytes)
+            if offset is None:
+                return False
+            SLOT_HEADER.pack_into(buf, offset, 0, 0.0, 0.0, 0, 0, 0)
+            return header[1] > time.time()
+
+    def stats(self) -> Dict:
+        stats = {"enabled": self.enabled}
+        buf = self._mapping()
+        if buf is None:
+            return stats
+        now = time.time()
+        # unlocked scan, a slot being written can be miscounted
+        live = sum(
+            1 for offset in range(0, self.size, self.slot_bytes)
+            if SLOT_HEADER.unpack_from(buf, offset)[1] > now
+        )
+        lookups = self.hits + self.misses
+        stats.update({
+            "path": self.path,
+            "slots": self.groups * WAYS,
+            "slot_bytes": self.slot_bytes,
+            "live_entries": live,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "too_large": self.too_large,
+            "lease_waits": self.lease_waits,
+            "waits_served": self.waits_served,
+        })
+        return stats
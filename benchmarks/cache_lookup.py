@@ -0,0 +1,101 @@
+"""
+Weather cache lookup latency as refresh history grows
+
+Compares the old append-only layout (a row per refresh, single column index
+on city) against the upsert layout of WeatherCache (one row per city plus a
+(city, fetched_at) index). Every refresh round writes one row per city, then
+the lookup used by WeatherService._get_from_cache is timed.
+
+    python -m benchmarks.cache_lookup --cities 200 --rounds 1 10 100 500
+    DATABASE_URL=postgresql://... python -m benchmarks.cache_lookup
+
+Without DATABASE_URL a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, create_engine, select
+
+
+def _legacy_table(metadata: MetaData) -> Table:
+    return Table(
+        "bench_weather_cache_legacy", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("city", String, index=True),
+        Column("temperature", Float),
+        Column("condition", String),
+        Column("fetched_at", DateTime),
+    )
+
+
+def _time_lookups(conn, table, cities, samples: int) -> float:
+    """Median lookup latency in microseconds"""
+    expiry = datetime.utcnow() - timedelta(minutes=30)
+    timings = []
+    for _ in range(samples):
+        city = random.choice(cities)
+        start = time.perf_counter()
+        conn.execute(
+            select(table).where(table.c.city == city, table.c.fetched_at > expiry).limit(1)
+        ).first()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    url = os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("DATABASE_URL", url)
+
+    from app.db.database import upsert
+    from app.models.database import WeatherCache
+    from sqlalchemy.orm import Session
+
+    engine = create_engine(url)
+    metadata = MetaData()
+    legacy = _legacy_table(metadata)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    WeatherCache.__table__.drop(engine, checkfirst=True)
+    WeatherCache.__table__.create(engine)
+
+    cities = [f"city-{i}" for i in range(args.cities)]
+    written = 0
+    print(f"{'rounds':>8}{'legacy rows':>14}{'legacy us':>12}{'upsert rows':>14}{'upsert us':>12}")
+
+    with Session(engine) as db:
+        for target in sorted(args.rounds):
+            while written < target:
+                now = datetime.utcnow()
+                rows = [
+                    {"city": city, "temperature": 25.0, "condition": "Clear", "fetched_at": now}
+                    for city in cities
+                ]
+                db.execute(legacy.insert(), rows)
+                for row in rows:
+                    upsert(db, WeatherCache, row, index_elements=["city"])
+                db.commit()
+                written += 1
+
+            conn = db.connection()
+            legacy_rows = written * len(cities)
+            upsert_rows = db.query(WeatherCache).count()
+            legacy_us = _time_lookups(conn, legacy, cities, args.samples)
+            upsert_us = _time_lookups(conn, WeatherCache.__table__, cities, args.samples)
+            print(f"{target:>8}{legacy_rows:>14}{legacy_us:>12.1f}{upsert_rows:>14}{upsert_us:>12.1f}")
+
+    metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
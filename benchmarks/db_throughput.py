@@ -0,0 +1,103 @@
+"""
+Throughput of the DB-backed routes with the sync vs async database layer
+
+Each mode runs in a fresh interpreter because the engine is chosen from
+Settings at import time. Requests go through an in-process ASGI client, so
+the numbers reflect event loop behaviour rather than network cost.
+
+    python -m benchmarks.db_throughput --requests 2000 --concurrency 50
+    DATABASE_URL=postgresql://... python -m benchmarks.db_throughput
+
+Without DATABASE_URL a local SQLite file is used (async mode needs aiosqlite).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PAYLOAD = {
+    "menu_item_id": 1,
+    "current_price": 250,
+    "competitor_prices": [240, 260, 245],
+    "weather": {"temperature": 28, "condition": "Sunny"},
+    "events": [{"name": "Food Festival", "popularity": "High", "distance_km": 2.5}]
+}
+
+
+async def _drive(total: int, concurrency: int) -> dict:
+    import httpx
+    from app.db.database import init_db
+    from app.main import app
+
+    init_db()
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                if i % 2:
+                    response = await client.post("/api/pricing/suggest", json=PAYLOAD)
+                else:
+                    response = await client.get("/api/pricing/history/1", params={"limit": 10})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "req_per_sec": round(total / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def _run_mode(mode: str, args) -> dict:
+    env = dict(os.environ, DB_ASYNC="true" if mode == "async" else "false")
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.db_throughput", "--child",
+         "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_drive(args.requests, args.concurrency))))
+        return
+
+    if "DATABASE_URL" not in os.environ:
+        db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    # every request comes from the same in-process client
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+
+    print(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for mode in ("sync", "async"):
+        result = _run_mode(mode, args)
+        print(f"{mode:<8}{result['req_per_sec']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Cost of the /metrics instrumentation
+
+Times the primitives (histogram observe, counter inc, the disabled fast path,
+a full scrape) and then /api/pricing/suggest and /api/pricing/auto through an
+in-process ASGI client with the registry switched on and off, interleaved so
+drift hits both sides equally.
+
+    python -m benchmarks.metrics_overhead --min-seconds 1
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+from benchmarks.suite import _measure, _measure_async, _mock_upstreams, _payload
+
+
+def primitive_benchmarks(min_seconds: float):
+    from app.utils.metrics import MetricsRegistry, metrics
+
+    registry = MetricsRegistry(enabled=True)
+    histogram = registry.histogram("bench_seconds", "bench", ["stage"])
+    counter = registry.counter("bench_total", "bench", ["stage"])
+    disabled = MetricsRegistry(enabled=False).histogram("bench_seconds", "bench", ["stage"])
+
+    rows = [
+        ("histogram.observe", _measure(lambda: histogram.observe(0.0012, "factors"), min_seconds)),
+        ("histogram.observe_since", _measure(lambda: histogram.observe_since(0.0, "factors"), min_seconds)),
+        ("counter.inc", _measure(lambda: counter.inc("factors"), min_seconds)),
+        ("histogram.observe (disabled)", _measure(lambda: disabled.observe(0.0012, "factors"), min_seconds)),
+        ("registry.render (app)", _measure(metrics.render, min_seconds)),
+    ]
+    print(f"{'primitive':<34}{'median us':>12}{'min us':>12}")
+    for name, result in rows:
+        print(f"{name:<34}{result['median_us']:>12.3f}{result['min_us']:>12.3f}")
+
+
+async def route_benchmarks(min_seconds: float, rounds: int):
+    import httpx
+    from app.db.database import init_db
+    from app.main import app
+    from app.services.history_recorder import history_recorder
+    from app.services.http_client import http_client
+    from app.utils.metrics import metrics
+
+    init_db()
+    http_client.start(transport=httpx.MockTransport(_mock_upstreams))
+    history_recorder.start()
+    samples = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            suggest_payload = _payload(5, 5)
+            auto_payload = {"menu_item_id": 123, "city": "Mumbai", "current_price": 250.0,
+                            "latitude": 19.07, "longitude": 72.8777}
+
+            async def suggest():
+                (await client.post("/api/pricing/suggest", json=suggest_payload)).raise_for_status()
+
+            async def auto():
+                (await client.post("/api/pricing/auto", json=auto_payload)).raise_for_status()
+
+            await auto()  # warm the weather / event caches
+            for _ in range(rounds):
+                for enabled in (False, True):
+                    metrics.enabled = enabled
+                    for name, fn in (("suggest", suggest), ("auto[warm]", auto)):
+                        result = await _measure_async(fn, min_seconds / rounds)
+                        samples.setdefault((name, enabled), []).append(result["median_us"])
+    finally:
+        metrics.enabled = True
+        await history_recorder.stop()
+        await http_client.close()
+
+    print(f"\n{'route':<20}{'off us':>12}{'on us':>12}{'overhead':>12}")
+    for name in ("suggest", "auto[warm]"):
+        off = min(samples[(name, False)])
+        on = min(samples[(name, True)])
+        print(f"{name:<20}{off:>12.1f}{on:>12.1f}{on / off - 1:>+11.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="time budget per measurement")
+    parser.add_argument("--rounds", type=int, default=3, help="on/off alternations per route")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+    os.environ.setdefault("TICKETMASTER_API_KEY", "bench")
+    os.environ.setdefault("PRICING_RESULT_CACHE_SIZE", "0")
+    os.environ.setdefault("CACHE_SWEEP_INTERVAL_SECONDS", "0")
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    os.environ["METRICS_ENABLED"] = "true"
+
+    primitive_benchmarks(args.min_seconds)
+    asyncio.run(route_benchmarks(args.min_seconds, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Weather / event factor cost: hard-coded rules vs the compiled rule tables
+
+The legacy functions below are the if/elif temperature checks and substring
+scans PricingEngine used before the rules moved to app/core/pricing_rules.json.
+Both are run over the same random inputs, results are checked to be identical.
+
+    python -m benchmarks.pricing_rules --requests 20000
+"""
+import argparse
+import math
+import random
+import time
+
+LEGACY_POPULARITY_IMPACT = {"low": 0.02, "medium": 0.05, "high": 0.10}
+CONDITIONS = ["Sunny", "Clear", "Clouds", "Rain", "Thunderstorm", "Snow", "Mist", "Fair", "Drizzle", "Haze"]
+POPULARITIES = ["Low", "Medium", "High", "medium", "Unknown"]
+
+
+def legacy_weather_factor(weather) -> float:
+    base_factor = 1.0
+    if 20 <= weather.temperature <= 30:
+        base_factor += 0.8
+    elif weather.temperature > 35:
+        base_factor -= 0.05
+    elif weather.temperature < 10:
+        base_factor -= 0.03
+    condition = weather.condition.lower()
+    if any(word in condition for word in ["sunny", "clear", "fair"]):
+        base_factor += 0.05
+    elif any(word in condition for word in ["rain", "storm", "snow"]):
+        base_factor += -0.08
+    else:
+        base_factor += 0.0
+    return base_factor
+
+
+def legacy_event_factor(events) -> float:
+    if not events:
+        return 1.0
+    total_impact = 0
+    for event in events:
+        pop_impact = LEGACY_POPULARITY_IMPACT.get(event.popularity.lower(), 0.03)
+        total_impact += pop_impact * math.exp(-0.3 * event.distance_km)
+    return 1.0 + total_impact
+
+
+def _requests(n: int):
+    from app.schemas.pricing import PricingRequest
+    return [
+        PricingRequest(
+            menu_item_id=i,
+            current_price=round(random.uniform(50, 500), 2),
+            competitor_prices=[],
+            weather={
+                "temperature": random.choice([20.0, 30.0, 35.0, 10.0, round(random.uniform(-10, 45), 1)]),
+                "condition": random.choice(CONDITIONS)
+            },
+            events=[
+                {"name": f"event-{j}", "popularity": random.choice(POPULARITIES),
+                 "distance_km": round(random.uniform(0, 10), 1)}
+                for j in range(random.randint(0, 4))
+            ]
+        )
+        for i in range(n)
+    ]
+
+
+def _time(fn, requests) -> float:
+    """Microseconds per request, best of 3"""
+    best = math.inf
+    for _ in range(3):
+        start = time.perf_counter()
+        for r in requests:
+            fn(r)
+        best = min(best, time.perf_counter() - start)
+    return best / len(requests) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from app.services.pricing_engine import PricingEngine
+
+    random.seed(args.seed)
+    requests = _requests(args.requests)
+    engine = PricingEngine()
+
+    mismatches = sum(
+        legacy_weather_factor(r.weather) != engine.calculate_weather_factor(r.weather)
+        or legacy_event_factor(r.events) != engine.calculate_event_factor(r.events)
+        for r in requests
+    )
+
+    rows = [
+        ("weather factor", _time(lambda r: legacy_weather_factor(r.weather), requests),
+         _time(lambda r: engine.calculate_weather_factor(r.weather), requests)),
+        ("event factor", _time(lambda r: legacy_event_factor(r.events), requests),
+         _time(lambda r: engine.calculate_event_factor(r.events), requests)),
+    ]
+    print(f"{args.requests} requests, mismatches: {mismatches}")
+    print(f"{'':<16}{'legacy us':>12}{'compiled us':>14}{'speedup':>10}")
+    for name, legacy, compiled in rows:
+        print(f"{name:<16}{legacy:>12.3f}{compiled:>14.3f}{legacy / compiled:>9.2f}x")
+
+    start = time.perf_counter()
+    engine.suggest_prices_batch(requests)
+    print(f"batch of {args.requests}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
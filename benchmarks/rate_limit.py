@@ -0,0 +1,154 @@
+"""
+Per-request cost of the inbound rate limiter
+
+Times TokenBucketLimiter.acquire for a known client (in process and in a
+shared segment), a new client (insert plus eviction) and a full limiter at
+its client cap, then the middleware
+around a no-op ASGI app against the bare app, so the difference is the
+middleware alone, and GET / and /api/pricing/suggest through an in-process
+ASGI client with the limiter on and off (interleaved). Finally a million
+distinct clients go through a small limiter to show memory stays bounded.
+
+    python -m benchmarks.rate_limit --min-seconds 1
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+
+from benchmarks.suite import _measure, _measure_async, _payload
+
+# Never reached, the benchmarks measure the allowed path
+UNLIMITED = 10 ** 9
+
+
+def primitive_benchmarks(min_seconds: float):
+    from app.utils.rate_limit import TokenBucketLimiter
+
+    limiter = TokenBucketLimiter(rate_per_minute=UNLIMITED, burst=UNLIMITED)
+    limiter.acquire("10.0.0.1")
+    clients = (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in itertools.count())
+    full = TokenBucketLimiter(rate_per_minute=60, burst=20, max_clients=10000)
+    for _ in range(10000):
+        full.acquire(next(clients))
+
+    shared = TokenBucketLimiter(rate_per_minute=UNLIMITED, burst=UNLIMITED, directory=tempfile.mkdtemp())
+    shared.acquire("10.0.0.1")
+
+    rows = [
+        ("acquire (known client)", _measure(lambda: limiter.acquire("10.0.0.1"), min_seconds)),
+        ("acquire (known client, shared)", _measure(lambda: shared.acquire("10.0.0.1"), min_seconds)),
+        ("acquire (new client)", _measure(lambda: limiter.acquire(next(clients)), min_seconds)),
+        ("acquire (new client, at cap)", _measure(lambda: full.acquire(next(clients)), min_seconds)),
+    ]
+    print(f"{'limiter':<34}{'median us':>12}{'min us':>12}")
+    for name, result in rows:
+        print(f"{name:<34}{result['median_us']:>12.3f}{result['min_us']:>12.3f}")
+
+
+async def middleware_benchmarks(min_seconds: float):
+    from app.utils.rate_limit import RateLimitMiddleware, TokenBucketLimiter
+
+    async def app(scope, receive, send):
+        pass
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/api/pricing/suggest", "headers": [
+        (b"host", b"bench"), (b"accept", b"application/json"), (b"x-client-id", b"pos-17"),
+    ], "client": ("10.0.0.1", 50000)}
+    limited = RateLimitMiddleware(app, TokenBucketLimiter(rate_per_minute=UNLIMITED, burst=UNLIMITED))
+    with_header = RateLimitMiddleware(app, TokenBucketLimiter(rate_per_minute=UNLIMITED, burst=UNLIMITED),
+                                      TokenBucketLimiter(rate_per_minute=UNLIMITED, burst=UNLIMITED))
+    with_header.client_header = b"x-client-id"
+
+    rows = [
+        ("bare app", await _measure_async(lambda: app(scope, receive, send), min_seconds)),
+        ("middleware (peer address)", await _measure_async(lambda: limited(scope, receive, send), min_seconds)),
+        ("middleware (client header)", await _measure_async(lambda: with_header(scope, receive, send), min_seconds)),
+    ]
+    print(f"\n{'asgi call':<34}{'median us':>12}{'min us':>12}")
+    for name, result in rows:
+        print(f"{name:<34}{result['median_us']:>12.3f}{result['min_us']:>12.3f}")
+    overhead = rows[1][1]["min_us"] - rows[0][1]["min_us"]
+    print(f"middleware overhead: {overhead:.3f} us per request")
+
+
+async def route_benchmarks(min_seconds: float, rounds: int):
+    import httpx
+    from app.db.database import init_db
+    from app.main import app
+    from app.services.history_recorder import history_recorder
+    from app.utils.rate_limit import rate_limiter
+
+    init_db()
+    history_recorder.start()
+    samples = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            payload = _payload(5, 5)
+
+            async def root():
+                (await client.get("/")).raise_for_status()
+
+            async def suggest():
+                (await client.post("/api/pricing/suggest", json=payload)).raise_for_status()
+
+            for _ in range(rounds):
+                for enabled in (False, True):
+                    rate_limiter.enabled = enabled
+                    for name, fn in (("GET /", root), ("suggest", suggest)):
+                        result = await _measure_async(fn, min_seconds / rounds)
+                        samples.setdefault((name, enabled), []).append(result["median_us"])
+    finally:
+        await history_recorder.stop()
+
+    print(f"\n{'route':<20}{'off us':>12}{'on us':>12}{'overhead':>12}")
+    for name in ("GET /", "suggest"):
+        off = min(samples[(name, False)])
+        on = min(samples[(name, True)])
+        print(f"{name:<20}{off:>12.1f}{on:>12.1f}{on / off - 1:>+11.1%}")
+
+
+def memory_benchmark(clients: int):
+    from app.utils.rate_limit import TokenBucketLimiter
+
+    # buckets refill in 20 s, so about 20000 clients are live at a time
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=20, max_clients=50000)
+    now = 0.0
+    for i in range(clients):
+        # 1000 new clients a second, each seen once
+        now += 0.001
+        limiter.acquire(i, now)
+    stats = limiter.stats()
+    print(f"\n{clients} one-off clients: {stats['clients']} buckets kept, "
+          f"{stats['evicted_idle']} evicted idle, {stats['evicted_capacity']} evicted at the cap")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="time budget per measurement")
+    parser.add_argument("--rounds", type=int, default=3, help="on/off alternations per route")
+    parser.add_argument("--clients", type=int, default=1000000, help="distinct clients for the memory check")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    os.environ.setdefault("PRICING_RESULT_CACHE_SIZE", "0")
+    os.environ.setdefault("CACHE_SWEEP_INTERVAL_SECONDS", "0")
+    os.environ["RATE_LIMIT_PER_MINUTE"] = str(UNLIMITED)
+    os.environ["RATE_LIMIT_BURST"] = str(UNLIMITED)
+
+    primitive_benchmarks(args.min_seconds)
+    asyncio.run(middleware_benchmarks(args.min_seconds))
+    asyncio.run(route_benchmarks(args.min_seconds, args.rounds))
+    memory_benchmark(args.clients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Response serialization cost per response size
+
+For batch pricing responses and history pages of growing size, compares
+FastAPI's default path (response_model validation, then the JSON-mode dump
+and json.dumps) with the fast path (pydantic_core / orjson straight from
+the trusted objects) and MessagePack. Also times building a PricingResponse
+with validation vs model_construct.
+
+    python -m benchmarks.serialization
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from benchmarks.suite import _measure, _payload
+
+BATCH_SIZES = (1, 10, 100, 1000)
+HISTORY_SIZES = (10, 100, 500)
+
+
+def _default_json(content) -> bytes:
+    """What JSONResponse.render does"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _history_page(rows: int) -> dict:
+    start = datetime(2026, 1, 1)
+    return {
+        "menu_item_id": 123,
+        "history": [
+            {
+                "id": i,
+                "date": (start + timedelta(minutes=i)).isoformat(),
+                "current_price": 250.0,
+                "recommended_price": 268.35,
+                "competitor_avg": 251.5,
+                "reasoning": "Price adjustment recommended due to: competitors are pricing higher, favorable weather (Sunny, 28.0°C).",
+            }
+            for i in range(rows)
+        ],
+        "next_cursor": "MjAyNi0wMS0wMVQwMDowMDowMHwx",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="time budget per measurement")
+    args = parser.parse_args()
+
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from app.schemas.pricing import BatchPricingResponse, FactorWeights, PricingRequest, PricingResponse
+    from app.services.pricing_engine import PricingEngine
+    from app.utils import responses
+
+    engine = PricingEngine(result_cache_size=0)
+    adapter = TypeAdapter(BatchPricingResponse)
+    t = args.min_seconds
+
+    print(f"orjson: {'yes' if responses.orjson else 'no'}, msgpack: {'yes' if responses.msgpack else 'no'}\n")
+    header = f"{'response':<22}{'bytes json':>12}{'bytes mp':>10}{'default us':>12}{'fast us':>10}{'msgpack us':>12}{'speedup':>9}"
+
+    print(header)
+    for size in BATCH_SIZES:
+        requests = [PricingRequest(**_payload(5, 3)) for _ in range(size)]
+        content = BatchPricingResponse.model_construct(count=size, results=engine.suggest_prices_batch(requests))
+
+        default = _measure(lambda: _default_json(adapter.dump_python(adapter.validate_python(content), mode="json")), t)
+        fast = _measure(lambda: responses.dumps_json(content), t)
+        packed = _measure(lambda: responses.dumps_msgpack(content), t) if responses.msgpack else None
+        _row(f"batch[n={size}]", content, default, fast, packed)
+
+    for rows in HISTORY_SIZES:
+        content = _history_page(rows)
+        default = _measure(lambda: _default_json(jsonable_encoder(content)), t)
+        fast = _measure(lambda: responses.dumps_json(content), t)
+        packed = _measure(lambda: responses.dumps_msgpack(content), t) if responses.msgpack else None
+        _row(f"history[rows={rows}]", content, default, fast, packed)
+
+    fields = dict(menu_item_id=123, recommended_price=268.35, reasoning="Price adjustment recommended.")
+    validated = _measure(lambda: PricingResponse(
+        **fields, factors=FactorWeights(internal_weight=0.6, external_weight=0.4)), t)
+    constructed = _measure(lambda: PricingResponse.model_construct(
+        **fields, factors=FactorWeights.model_construct(internal_weight=0.6, external_weight=0.4)), t)
+    print(f"\nbuild PricingResponse: validated {validated['median_us']:.3f} us, "
+          f"model_construct {constructed['median_us']:.3f} us")
+
+
+def _row(name, content, default, fast, packed):
+    from app.utils import responses
+
+    json_bytes = len(responses.dumps_json(content))
+    mp_bytes = f"{len(responses.dumps_msgpack(content)):>10}" if packed else f"{'-':>10}"
+    mp_us = f"{packed['median_us']:>12.1f}" if packed else f"{'-':>12}"
+    print(f"{name:<22}{json_bytes:>12}{mp_bytes}{default['median_us']:>12.1f}{fast['median_us']:>10.1f}"
+          f"{mp_us}{default['median_us'] / fast['median_us']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
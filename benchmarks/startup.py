@@ -0,0 +1,119 @@
+"""
+Cold start of a fresh worker: import time and time to first request
+
+Prints the slowest imports of app.main from python -X importtime in a fresh
+interpreter, then starts run.py (one worker) --repeats times per schema
+check mode on a throwaway SQLite database and reports, as medians, the time
+from spawning the process until GET / answers and the latency of the first
+request touching the database (GET /health). The database is stamped by
+the first run, so "stamp" shows the usual boot (one SELECT) and "always" a
+create_all on every boot.
+
+    python -m benchmarks.startup --repeats 5 --top 15
+    DATABASE_URL=postgresql://... python -m benchmarks.startup
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(env: dict, top: int):
+    """(total seconds, [(cumulative us, self us, module)]) for import app.main"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+    total = next(cumulative for cumulative, _, module in rows if module.strip() == "app.main")
+    return total / 1e6, sorted(rows, reverse=True)[:top]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str) -> int:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.status
+
+
+def boot(env: dict, timeout: float = 60.0) -> dict:
+    """Start run.py, poll GET / until it answers, then time one GET /health"""
+    port = _free_port()
+    env = dict(env, PORT=str(port), HOST="127.0.0.1")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "run.py"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("server didn't come up")
+            try:
+                if _get(f"http://127.0.0.1:{port}/") == 200:
+                    break
+            except OSError:
+                time.sleep(0.005)
+        first_request = time.perf_counter() - start
+        health_start = time.perf_counter()
+        try:
+            _get(f"http://127.0.0.1:{port}/health")
+        except urllib.error.HTTPError:
+            pass  # 503 still times the database round trip
+        first_db_request = time.perf_counter() - health_start
+    finally:
+        process.terminate()
+        process.wait()
+    return {"first_request": first_request, "first_db_request": first_db_request}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeats", type=int, default=5, help="boots per schema check mode")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports listed")
+    parser.add_argument("--modes", default="stamp,always,skip", help="DB_SCHEMA_CHECK values to boot with")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        WORKERS="1",
+        DEBUG="false",
+        PREWARM_INTERVAL_SECONDS="0",
+        CACHE_SWEEP_INTERVAL_SECONDS="0",
+    )
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+
+    total, rows = import_profile(env, args.top)
+    print(f"import app.main: {total * 1000:.1f} ms")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, module in rows:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {module}")
+    print()
+
+    # stamps the database, every mode below then boots against an existing schema
+    boot(dict(env, DB_SCHEMA_CHECK="always"))
+    print(f"{'schema check':<14}{'first request ms':>18}{'first db request ms':>21}")
+    for mode in args.modes.split(","):
+        runs = [boot(dict(env, DB_SCHEMA_CHECK=mode)) for _ in range(args.repeats)]
+        first = statistics.median(run["first_request"] for run in runs)
+        first_db = statistics.median(run["first_db_request"] for run in runs)
+        print(f"{mode:<14}{first * 1000:>18.1f}{first_db * 1000:>21.1f}")
+
+
+if __name__ == "__main__":
+    main()
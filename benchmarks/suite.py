@@ -0,0 +1,286 @@
+"""
+Microbenchmarks for the pricing hot paths, with JSON baselines
+
+Engine level: suggest_price over growing competitor / event lists (result
+cache off, plus one cached case), reasoning text, PricingRequest validation
+and the vectorized batch. Route level: /api/pricing/suggest and
+/api/pricing/auto through an in-process ASGI client on a throwaway SQLite
+database, with OpenWeather and Ticketmaster replaced by httpx.MockTransport.
+
+    python -m benchmarks.suite run                       # writes benchmarks/baselines/latest.json
+    python -m benchmarks.suite run --output base.json --only engine
+    python -m benchmarks.suite run --baseline base.json  # run and compare
+    python -m benchmarks.suite compare base.json new.json --threshold 0.15
+    python -m benchmarks.suite run --database-url postgresql://...   # routes on another database
+
+compare (and run --baseline) exits with status 1 when a benchmark's median
+got slower than the baseline by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / "baselines" / "latest.json"
+LIST_SIZES = (0, 5, 50)
+
+
+def _payload(competitors: int, events: int) -> dict:
+    return {
+        "menu_item_id": 123,
+        "current_price": 250.0,
+        "competitor_prices": [240.0 + (i % 7) * 5 for i in range(competitors)],
+        "weather": {"temperature": 28.0, "condition": "Sunny"},
+        "events": [
+            {"name": f"Event {i}", "popularity": ("High", "Medium", "Low")[i % 3], "distance_km": 0.5 + i * 0.25}
+            for i in range(events)
+        ],
+    }
+
+
+def _measure(fn, min_seconds: float, repeats: int = 7) -> dict:
+    """Per-call timings: calibrate a loop count, then time `repeats` loops"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds / repeats or number >= 1 << 20:
+            break
+        number *= 2
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return _summary(samples, number)
+
+
+async def _measure_async(fn, min_seconds: float, repeats: int = 7) -> dict:
+    """_measure for coroutine functions, one await per call"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds / repeats or number >= 1 << 16:
+            break
+        number *= 2
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return _summary(samples, number)
+
+
+def _summary(samples, number: int) -> dict:
+    samples.sort()
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(samples[0], 3),
+        "max_us": round(samples[-1], 3),
+        "loops": number,
+    }
+
+
+def engine_benchmarks(min_seconds: float) -> dict:
+    from app.schemas.pricing import PricingRequest
+    from app.services.pricing_engine import PricingEngine
+
+    engine = PricingEngine(result_cache_size=0)
+    results = {}
+
+    for competitors in LIST_SIZES:
+        for events in LIST_SIZES:
+            request = PricingRequest(**_payload(competitors, events))
+            results[f"engine.suggest_price[c={competitors},e={events}]"] = _measure(
+                lambda: engine.suggest_price(request), min_seconds
+            )
+
+    request = PricingRequest(**_payload(5, 5))
+    cached = PricingEngine(result_cache_size=1024)
+    results["engine.suggest_price[cached,c=5,e=5]"] = _measure(lambda: cached.suggest_price(request), min_seconds)
+
+    avg_comp = engine.competitor_average(request)
+    weather_factor = engine.calculate_weather_factor(request.weather)
+    event_factor = engine.calculate_event_factor(request.events)
+    results["engine.reasoning[c=5,e=5]"] = _measure(
+        lambda: engine._build_reasoning(request, avg_comp, weather_factor, event_factor), min_seconds
+    )
+
+    for size in LIST_SIZES:
+        payload = _payload(size, size)
+        results[f"schema.PricingRequest.validate[c={size},e={size}]"] = _measure(
+            lambda: PricingRequest.model_validate(payload), min_seconds
+        )
+
+    batch = [PricingRequest(**_payload(5, 5)) for _ in range(1000)]
+    results["engine.suggest_prices_batch[n=1000,c=5,e=5]"] = _measure(
+        lambda: engine.suggest_prices_batch(batch), min_seconds, repeats=5
+    )
+    return results
+
+
+def _mock_upstreams(request):
+    """Canned OpenWeather / Ticketmaster responses"""
+    import httpx
+
+    if "weather" in request.url.path:
+        return httpx.Response(200, json={"main": {"temp": 28.0}, "weather": [{"main": "Clear"}]})
+    events = [
+        {
+            "name": f"Event {i}",
+            "classifications": [{"genre": {"name": "Festival" if i % 2 else "Theatre"}}],
+            "_embedded": {"venues": [{"location": {"latitude": str(19.07 + i * 0.004), "longitude": "72.8777"}}]},
+        }
+        for i in range(50)
+    ]
+    return httpx.Response(200, json={"_embedded": {"events": events}})
+
+
+async def _route_benchmarks(min_seconds: float) -> dict:
+    import httpx
+    from app.db.database import init_db
+    from app.main import app
+    from app.services.history_recorder import history_recorder
+    from app.services.http_client import http_client
+
+    init_db()
+    http_client.start(transport=httpx.MockTransport(_mock_upstreams))
+    history_recorder.start()
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for size in LIST_SIZES:
+                payload = _payload(size, size)
+
+                async def suggest():
+                    response = await client.post("/api/pricing/suggest", json=payload)
+                    response.raise_for_status()
+
+                results[f"route.suggest[c={size},e={size}]"] = await _measure_async(suggest, min_seconds)
+
+            auto_payload = {"menu_item_id": 123, "city": "Mumbai", "current_price": 250.0,
+                            "latitude": 19.07, "longitude": 72.8777}
+
+            async def auto():
+                response = await client.post("/api/pricing/auto", json=auto_payload)
+                response.raise_for_status()
+
+            # first call fills the weather / event caches, the benchmark measures warm lookups
+            await auto()
+            results["route.auto[warm]"] = await _measure_async(auto, min_seconds)
+    finally:
+        await history_recorder.stop()
+        await http_client.close()
+    return results
+
+
+def run(args) -> dict:
+    results = {}
+    if args.only in (None, "engine"):
+        results.update(engine_benchmarks(args.min_seconds))
+    if args.only in (None, "route"):
+        results.update(asyncio.run(_route_benchmarks(args.min_seconds)))
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print a side by side table, True when nothing regressed beyond threshold"""
+    ok = True
+    print(f"{'benchmark':<52}{'base us':>12}{'new us':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<52}{'-':>12}{result['median_us']:>12.3f}{'new':>10}")
+            continue
+        change = result["median_us"] / base["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<52}{base['median_us']:>12.3f}{result['median_us']:>12.3f}{change:>+9.1%}{flag}")
+    for name in baseline["results"].keys() - current["results"].keys():
+        print(f"{name:<52}{baseline['results'][name]['median_us']:>12.3f}{'-':>12}{'missing':>10}")
+    return ok
+
+
+def _print_results(report: dict):
+    print(f"{'benchmark':<52}{'median us':>12}{'min us':>12}")
+    for name, result in report["results"].items():
+        print(f"{name:<52}{result['median_us']:>12.3f}{result['min_us']:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and write a JSON report")
+    run_parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    run_parser.add_argument("--only", choices=["engine", "route"])
+    run_parser.add_argument("--min-seconds", type=float, default=0.5, help="time budget per benchmark")
+    run_parser.add_argument("--baseline", type=Path, help="compare against this report after running")
+    run_parser.add_argument("--threshold", type=float, default=0.15)
+    run_parser.add_argument("--database-url", help="database for the route benchmarks, they write pricing "
+                                                  "history; a throwaway SQLite file by default, DATABASE_URL "
+                                                  "from the environment is ignored")
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        ok = compare(json.loads(args.baseline.read_text()), json.loads(args.current.read_text()), args.threshold)
+        sys.exit(0 if ok else 1)
+
+    # Route benchmarks run against a throwaway database and mocked upstream APIs,
+    # settings are read at import time so the environment is set first. The
+    # database is never taken from the environment, a shell with production
+    # settings would get benchmark history rows
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+    os.environ.setdefault("TICKETMASTER_API_KEY", "bench")
+    os.environ.setdefault("PRICING_RESULT_CACHE_SIZE", "0")
+    os.environ.setdefault("CACHE_SWEEP_INTERVAL_SECONDS", "0")
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+
+    report = run(args)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    _print_results(report)
+    print(f"\nreport written to {args.output}")
+
+    if args.baseline:
+        print()
+        if not compare(json.loads(args.baseline.read_text()), report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
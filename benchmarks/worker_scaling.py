@@ -0,0 +1,246 @@
+"""
+Throughput of the real server as the worker count grows
+
+Starts run.py with WORKERS=1, 2, 4 ... on a throwaway SQLite database, with
+the weather and event APIs pointed at a local mock that answers after
+--upstream-ms and counts the calls it gets. Each run starts with a cold
+burst, --burst requests per city at once on separate connections so they
+land on different workers, then load generator processes hammer
+POST /api/pricing/auto over the same --cities cities for --seconds. Every
+multi-worker count runs with the shared cache segment off and on. Reported:
+upstream calls during the burst (without sharing, workers missing the same
+city at the same time each fetch it), then requests per second and p50 / p99
+latency under load. The per-operation cost of the shared segment is timed
+first.
+
+    python -m benchmarks.worker_scaling --workers 1,2,4 --seconds 10
+
+Throughput can only scale up to the cores the server and the load
+generators share, os.cpu_count() is printed next to the results.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MockUpstream(BaseHTTPRequestHandler):
+    """OpenWeather and Ticketmaster stand-in, counts calls per API"""
+    delay = 0.05
+    calls = {"weather": 0, "events": 0}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        api = "weather" if "/weather" in self.path else "events"
+        with self.lock:
+            self.calls[api] += 1
+        time.sleep(self.delay)
+        if api == "weather":
+            body = {"main": {"temp": 28.0}, "weather": [{"main": "Clear"}]}
+        else:
+            body = {"_embedded": {"events": [
+                {
+                    "name": f"Event {i}",
+                    "classifications": [{"genre": {"name": "Festival" if i % 2 else "Theatre"}}],
+                    "_embedded": {"venues": [{"location": {"latitude": str(19.07 + i * 0.004),
+                                                            "longitude": "72.8777"}}]},
+                }
+                for i in range(50)
+            ]}}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def segment_benchmarks(min_seconds: float, workdir: str):
+    from benchmarks.suite import _measure
+    from app.utils.shared_cache import SharedCache
+
+    cache = SharedCache("bench", slots=1024, slot_bytes=512, directory=workdir)
+    weather = {"city": "Mumbai", "temperature": 28.0, "condition": "Clear", "cached": True}
+    cache.set("Mumbai", weather, 3600)
+    rows = [
+        ("get (hit)", _measure(lambda: cache.get("Mumbai"), min_seconds)),
+        ("get (miss)", _measure(lambda: cache.get("Pune"), min_seconds)),
+        ("set", _measure(lambda: cache.set("Mumbai", weather, 3600), min_seconds)),
+    ]
+    print(f"{'shared segment':<20}{'median us':>12}{'min us':>12}")
+    for name, result in rows:
+        print(f"{name:<20}{result['median_us']:>12.3f}{result['min_us']:>12.3f}")
+    print()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 60.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} didn't come up")
+
+
+def _start_server(workers: int, shared: bool, upstream_port: int, workdir: str):
+    port = _free_port()
+    upstream = f"http://127.0.0.1:{upstream_port}"
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        HOST="127.0.0.1",
+        WORKERS=str(workers),
+        DEBUG="false",
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'bench-{workers}-{shared}.db')}",
+        SHARED_CACHE_DIR=os.path.join(workdir, f"shared-{workers}") if shared else "",
+        RATE_LIMIT_PER_MINUTE="0",
+        OPENWEATHER_API_KEY="bench",
+        OPENWEATHER_BASE_URL=upstream,
+        TICKETMASTER_API_KEY="bench",
+        TICKETMASTER_BASE_URL=upstream,
+        OPENWEATHER_CALLS_PER_MINUTE="0",
+        OPENWEATHER_CALLS_PER_DAY="0",
+        TICKETMASTER_CALLS_PER_MINUTE="0",
+        TICKETMASTER_CALLS_PER_DAY="0",
+        PREWARM_INTERVAL_SECONDS="0",
+        CACHE_SWEEP_INTERVAL_SECONDS="0",
+    )
+    process = subprocess.Popen([sys.executable, "run.py"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+    except Exception:
+        process.kill()
+        raise
+    return process, port
+
+
+def _stop_server(process):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def _load(port: int, seconds: float, concurrency: int, cities: int, burst: int = 0) -> dict:
+    import httpx
+
+    latencies = []
+    concurrency = max(concurrency, cities * burst)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0) as client:
+        async def request(i: int):
+            payload = {"menu_item_id": i % 100, "city": f"City {i % cities}", "current_price": 250.0,
+                       "latitude": 19.07, "longitude": 72.8777}
+            start = time.perf_counter()
+            response = await client.post("/api/pricing/auto", json=payload)
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        if burst:
+            await asyncio.gather(*(request(i) for i in range(cities * burst)))
+            return {}
+
+        deadline = time.perf_counter() + seconds
+
+        async def worker(offset: int):
+            i = offset
+            while time.perf_counter() < deadline:
+                latencies.append(await request(i))
+                i += concurrency
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"requests": len(latencies), "seconds": elapsed, "latencies": latencies}
+
+
+def _run_load(port: int, args) -> dict:
+    """--clients load generator processes at once, results merged"""
+    command = [sys.executable, "-m", "benchmarks.worker_scaling", "--load-port", str(port),
+               "--seconds", str(args.seconds), "--concurrency", str(args.concurrency),
+               "--cities", str(args.cities)]
+    processes = [subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+                 for _ in range(args.clients)]
+    results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    requests = sum(result["requests"] for result in results)
+    seconds = max(result["seconds"] for result in results)
+    return {
+        "req_per_sec": round(requests / seconds, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--seconds", type=float, default=10.0, help="timed load per configuration")
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight per load generator")
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--burst", type=int, default=8, help="concurrent cold requests per city")
+    parser.add_argument("--upstream-ms", type=float, default=50.0, help="mock upstream response time")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="time budget per segment measurement")
+    parser.add_argument("--load-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load_port:
+        print(json.dumps(asyncio.run(_load(args.load_port, args.seconds, args.concurrency, args.cities))))
+        return
+
+    MockUpstream.delay = args.upstream_ms / 1000
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), MockUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    workdir = tempfile.mkdtemp()
+
+    segment_benchmarks(args.min_seconds, workdir)
+    print(f"cpu count: {os.cpu_count()}, {args.clients} load generators x {args.concurrency} in flight, "
+          f"{args.cities} cities")
+    print(f"{'workers':<9}{'shared':<8}{'weather calls':>15}{'event calls':>13}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    try:
+        for workers in (int(n) for n in args.workers.split(",")):
+            for shared in ((False, True) if workers > 1 else (False,)):
+                process, port = _start_server(workers, shared, upstream.server_address[1], workdir)
+                try:
+                    MockUpstream.calls.update(weather=0, events=0)
+                    asyncio.run(_load(port, 0, 0, args.cities, burst=args.burst))
+                    calls = dict(MockUpstream.calls)
+                    result = _run_load(port, args)
+                finally:
+                    _stop_server(process)
+                print(f"{workers:<9}{'on' if shared else 'off':<8}{calls['weather']:>15}{calls['events']:>13}"
+                      f"{result['req_per_sec']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}")
+    finally:
+        upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
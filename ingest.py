@@ -0,0 +1,85 @@
+"""
+Bulk load competitor prices from an NDJSON or CSV file
+
+    python ingest.py prices.ndjson
+    python ingest.py prices.csv --batch-size 10000
+    python ingest.py prices.csv --url http://localhost:8000
+
+Without --url the rows go straight into the configured database, with --url
+the file is streamed to POST /api/competitors/prices/ingest of a running app.
+Use - to read from stdin.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _read_chunks(path: str):
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+async def _async_chunks(path: str):
+    chunks = _read_chunks(path)
+    while True:
+        # file reads happen in a thread so a database load can run meanwhile
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+async def _ingest_local(path: str, fmt: str, batch_size: int) -> dict:
+    from app.db.database import init_db, db_session
+    from app.services.competitor_ingest import ingest_stream
+
+    init_db()
+    async with db_session() as db:
+        result = await ingest_stream(_async_chunks(path), fmt, db, batch_size)
+    return result.as_dict()
+
+
+def _ingest_remote(path: str, fmt: str, url: str) -> dict:
+    import httpx
+
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = httpx.post(
+        f"{url.rstrip('/')}/api/competitors/prices/ingest",
+        params={"format": fmt},
+        content=_read_chunks(path),
+        headers={"Content-Type": content_type},
+        timeout=None,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", help="NDJSON or CSV file, - for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="defaults from the file extension")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--url", help="stream to a running app instead of the database")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    if args.url:
+        result = _ingest_remote(args.path, fmt, args.url)
+    else:
+        result = asyncio.run(_ingest_local(args.path, fmt, args.batch_size))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
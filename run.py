@@ -1,13 +1,95 @@
 """
 Main entry point for running the application
+
+WORKERS=1 (the default) runs a single uvicorn process, reloading on code
+changes when DEBUG is on. With more workers:
+- gunicorn, when it's installed (not on Windows): the app is imported once in
+  the master and forked into WORKERS uvicorn workers (preload), kill -HUP on
+  the master replaces the workers gracefully, in-flight requests get
+  WORKER_GRACEFUL_TIMEOUT_SECONDS
+- otherwise uvicorn's own process manager: every worker imports the app
+  itself, kill -HUP restarts the workers one at a time
+The workers share weather / event / competitor cache segments, the rate
+limiter's buckets and the upstream call budgets under SHARED_CACHE_DIR,
+which defaults to a directory per port in /dev/shm (set it empty to turn
+sharing off).
 """
+import os
+import tempfile
+from importlib.util import find_spec
 import uvicorn
 from app.core.config import settings
 
-if __name__ == "__main__":
+
+def shared_cache_dir() -> str:
+    """Host-local directory for the workers' cache segments, memory backed when possible"""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"menu-pricing-{settings.PORT}")
+
+
+def gunicorn_options() -> dict:
+    return {
+        "bind": f"{settings.HOST}:{settings.PORT}",
+        "workers": settings.WORKERS,
+        # the uvicorn-worker package is the maintained home of the worker class
+        "worker_class": "uvicorn_worker.UvicornWorker" if find_spec("uvicorn_worker")
+        else "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "graceful_timeout": settings.WORKER_GRACEFUL_TIMEOUT_SECONDS,
+        "post_fork": _post_fork,
+    }
+
+
+def _post_fork(server, worker):
+    """Connections opened in the master aren't shared with the workers"""
+    from app.db.database import dispose_engines
+    dispose_engines(close=False)
+
+
+def run_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class PricingApplication(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options().items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.main import app
+            return app
+
+    PricingApplication().run()
+
+
+def run_uvicorn():
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=settings.DEBUG
-    )
\ No newline at end of file
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WORKERS,
+        reload=settings.DEBUG and settings.WORKERS == 1,
+        timeout_graceful_shutdown=settings.WORKER_GRACEFUL_TIMEOUT_SECONDS
+    )
+
+
+if __name__ == "__main__":
+    if settings.WORKERS > 1:
+        if settings.DEBUG:
+            print("Reload on code changes is off with WORKERS > 1")
+        # once here rather than racing in every worker's startup, the workers'
+        # own check then finds the schema stamped (or retries if this failed)
+        from app.db.database import init_db
+        try:
+            init_db()
+        except Exception as e:
+            print(f"Database schema check failed, the workers will retry it: {e}")
+        if settings.SHARED_CACHE_DIR is None:
+            # the environment carries it to workers that import the app themselves
+            settings.SHARED_CACHE_DIR = os.environ["SHARED_CACHE_DIR"] = shared_cache_dir()
+        if os.name == "posix" and find_spec("gunicorn"):
+            run_gunicorn()
+        else:
+            print("gunicorn isn't available, running uvicorn's process manager (no preload)")
+            run_uvicorn()
+    else:
+        run_uvicorn()
@@ -0,0 +1,144 @@
+"""
+Shared test setup
+
+Settings are read when app.core.config is imported, so the environment is
+set here first: a throwaway SQLite database (never the configured one), fake
+upstream API keys pointing at hosts only the mock transport answers, and
+the background loops that would add noise switched off.
+"""
+import asyncio
+import os
+import tempfile
+
+_WORKDIR = tempfile.mkdtemp(prefix="menu-pricing-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}",
+    DB_ASYNC="false",
+    DEBUG="false",
+    SHARED_CACHE_DIR="",
+    OPENWEATHER_API_KEY="test-key",
+    OPENWEATHER_BASE_URL="http://openweather.test",
+    TICKETMASTER_API_KEY="test-key",
+    TICKETMASTER_BASE_URL="http://ticketmaster.test",
+    OPENWEATHER_CALLS_PER_MINUTE="0",
+    OPENWEATHER_CALLS_PER_DAY="0",
+    TICKETMASTER_CALLS_PER_MINUTE="0",
+    TICKETMASTER_CALLS_PER_DAY="0",
+    RATE_LIMIT_PER_MINUTE="0",
+    PREWARM_INTERVAL_SECONDS="0",
+    CACHE_SWEEP_INTERVAL_SECONDS="0",
+    HISTORY_FLUSH_INTERVAL_SECONDS="0.05",
+)
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.db import database  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.database import (  # noqa: E402
+    CompetitorPrice, CompetitorPriceAggregate, EventCache, PricingHistory, WeatherCache
+)
+from app.services.competitor_service import competitor_service  # noqa: E402
+from app.services.event_service import event_service  # noqa: E402
+from app.services.history_recorder import history_recorder  # noqa: E402
+from app.services.http_client import http_client  # noqa: E402
+from app.services.weather_service import weather_service  # noqa: E402
+
+
+class FakeUpstream:
+    """
+    OpenWeather and Ticketmaster stand-in for httpx.MockTransport
+    Counts calls per API, answers after delay seconds with status and
+    event_count events
+    """
+
+    def __init__(self, delay: float = 0.0, status: int = 200, event_count: int = 3):
+        self.delay = delay
+        self.status = status
+        self.event_count = event_count
+        self.calls = {"weather": 0, "events": 0}
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        api = "weather" if request.url.host == "openweather.test" else "events"
+        self.calls[api] += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return httpx.Response(self.status, json={"message": "upstream error"})
+        if api == "weather":
+            return httpx.Response(200, json={"main": {"temp": 31.5}, "weather": [{"main": "Clear"}]})
+        if not self.event_count:
+            return httpx.Response(200, json={"page": {"totalElements": 0}})
+        return httpx.Response(200, json={"_embedded": {"events": [
+            {
+                "name": f"Event {i}",
+                "classifications": [{"genre": {"name": "Festival"}}],
+                "_embedded": {"venues": [{"location": {"latitude": str(19.07 + i * 0.01),
+                                                        "longitude": "72.8777"}}]},
+            }
+            for i in range(self.event_count)
+        ]}})
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    database.init_db("always")
+    yield
+    database.dispose_engines()
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Every test starts with empty tables and cold in-process caches"""
+    db = database.SessionLocal()
+    try:
+        for model in (PricingHistory, WeatherCache, EventCache, CompetitorPrice, CompetitorPriceAggregate):
+            db.execute(delete(model))
+        db.commit()
+    finally:
+        db.close()
+    weather_service._l1.clear()
+    event_service._l1.clear()
+    competitor_service._index.clear()
+    http_client.breakers.clear()
+    http_client.upstreams.clear()
+    yield
+
+
+@pytest.fixture
+async def upstream():
+    """Shared HTTP client started on a counting mock of both upstream APIs"""
+    fake = FakeUpstream()
+    await http_client.close()
+    http_client.start(transport=fake.transport())
+    yield fake
+    await http_client.close()
+
+
+@pytest.fixture(params=[False, True], ids=["sync_db", "async_db"])
+def db_mode(request, monkeypatch):
+    """Runs a test with DB_ASYNC off and on (aiosqlite)"""
+    monkeypatch.setattr(settings, "DB_ASYNC", request.param)
+    app.dependency_overrides[database.get_db] = (
+        database._get_async_db if request.param else database._get_sync_db
+    )
+    yield request.param
+    app.dependency_overrides.pop(database.get_db, None)
+
+
+@pytest.fixture
+async def client():
+    """In-process client for the app, with the history recorder running"""
+    history_recorder.start()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app.test") as c:
+        yield c
+    await history_recorder.stop()
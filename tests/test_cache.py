@@ -0,0 +1,29 @@
+"""TTLCache hit, miss and stale accounting"""
+import time
+from app.utils.cache import TTLCache
+
+
+def test_stale_entry_counts_one_stale_hit_and_no_miss():
+    cache = TTLCache(maxsize=10, ttl=0.01, stale=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.get_stale("a")[0] == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stale_hits"]) == (1, 0, 1)
+
+    assert cache.get("b") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_entry_past_the_stale_window_is_a_miss():
+    cache = TTLCache(maxsize=10, ttl=0.01, stale=0.01)
+    cache.set("a", 1)
+    time.sleep(0.03)
+
+    assert cache.get("a") is None
+    assert cache.get_stale("a") is None
+    stats = cache.stats()
+    assert (stats["misses"], stats["stale_hits"], stats["expirations"], stats["size"]) == (1, 0, 1, 0)
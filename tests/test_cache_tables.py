@@ -0,0 +1,105 @@
+"""Upserts into the cache tables and the retention sweeper, on SQLite"""
+from datetime import datetime, timedelta
+import pytest
+from app.core.config import settings
+from app.db.database import SessionLocal, insert_missing, upsert, upsert_many
+from app.models.database import CompetitorPriceAggregate, EventCache, WeatherCache
+from app.services.cache_sweeper import CacheSweeper
+
+pytestmark = pytest.mark.anyio
+
+
+def _weather(city: str, temperature: float, fetched_at: datetime) -> dict:
+    return {"city": city, "temperature": temperature, "condition": "Clear",
+            "raw_data": {"temperature": temperature}, "fetched_at": fetched_at}
+
+
+def _aggregate(menu_item_id: int, count: int) -> dict:
+    return {"menu_item_id": menu_item_id, "latest_prices": {"cafe": [100.0 + count, "2024-01-01T00:00:00"]},
+            "count": count, "mean": 100.0 + count}
+
+
+def test_upsert_updates_the_existing_row():
+    db = SessionLocal()
+    try:
+        upsert(db, WeatherCache, _weather("Pune", 20.0, datetime(2024, 1, 1)), index_elements=["city"])
+        upsert(db, WeatherCache, _weather("Pune", 27.5, datetime(2024, 1, 2)), index_elements=["city"])
+        db.commit()
+        rows = db.query(WeatherCache).filter(WeatherCache.city == "Pune").all()
+        assert len(rows) == 1
+        assert rows[0].temperature == 27.5 and rows[0].fetched_at == datetime(2024, 1, 2)
+    finally:
+        db.close()
+
+
+def test_upsert_increments_the_version():
+    db = SessionLocal()
+    try:
+        for events in ([["A", "High", 1.0, 2.0]], [], [["B", "Low", 1.0, 2.0]] * 2):
+            upsert(db, EventCache, {"location": "Goa", "version": 1, "event_count": len(events),
+                                    "events": events, "fetched_at": datetime(2024, 1, 1)},
+                   index_elements=["location"], increment=("version",))
+        db.commit()
+        row = db.query(EventCache).filter(EventCache.location == "Goa").one()
+        assert (row.version, row.event_count) == (3, 2)
+    finally:
+        db.close()
+
+
+def test_upsert_many_inserts_new_and_updates_existing_rows():
+    db = SessionLocal()
+    try:
+        upsert_many(db, CompetitorPriceAggregate, [_aggregate(1, 1), _aggregate(2, 1)], index_elements=["menu_item_id"])
+        db.commit()
+        upsert_many(db, CompetitorPriceAggregate, [_aggregate(2, 5), _aggregate(3, 2)], index_elements=["menu_item_id"])
+        upsert_many(db, CompetitorPriceAggregate, [], index_elements=["menu_item_id"])
+        db.commit()
+        counts = dict(db.query(CompetitorPriceAggregate.menu_item_id, CompetitorPriceAggregate.count))
+        assert counts == {1: 1, 2: 5, 3: 2}
+        assert db.get(CompetitorPriceAggregate, 2).mean == 105.0
+    finally:
+        db.close()
+
+
+def test_insert_missing_leaves_existing_rows_alone():
+    db = SessionLocal()
+    try:
+        upsert_many(db, CompetitorPriceAggregate, [_aggregate(1, 4)], index_elements=["menu_item_id"])
+        db.commit()
+        assert insert_missing(db, CompetitorPriceAggregate, [_aggregate(1, 0), _aggregate(2, 0)],
+                              index_elements=["menu_item_id"]) is True
+        assert insert_missing(db, CompetitorPriceAggregate, [], index_elements=["menu_item_id"]) is True
+        db.commit()
+        counts = dict(db.query(CompetitorPriceAggregate.menu_item_id, CompetitorPriceAggregate.count))
+        assert counts == {1: 4, 2: 0}
+    finally:
+        db.close()
+
+
+async def test_sweeper_deletes_only_expired_rows():
+    now = datetime.utcnow()
+    weather_cutoff = now - timedelta(hours=settings.WEATHER_CACHE_RETENTION_HOURS)
+    event_cutoff = now - timedelta(hours=settings.EVENT_CACHE_RETENTION_HOURS)
+    db = SessionLocal()
+    try:
+        db.add_all([WeatherCache(**_weather(f"old-{i}", 20.0, weather_cutoff - timedelta(hours=1 + i)))
+                    for i in range(5)])
+        db.add_all([WeatherCache(**_weather(f"new-{i}", 20.0, now - timedelta(minutes=i))) for i in range(2)])
+        db.add(EventCache(location="old", events=[], fetched_at=event_cutoff - timedelta(hours=1)))
+        db.add(EventCache(location="new", events=[], fetched_at=now))
+        db.commit()
+    finally:
+        db.close()
+
+    # two rows per statement, the expired weather rows take three batches
+    sweeper = CacheSweeper(interval=0, batch_size=2)
+    assert await sweeper.sweep() == {"weather_cache": 5, "event_cache": 1}
+    assert await sweeper.sweep() == {"weather_cache": 0, "event_cache": 0}
+    assert sweeper.stats()["deleted"] == {"weather_cache": 5, "event_cache": 1}
+
+    db = SessionLocal()
+    try:
+        assert sorted(c for (c,) in db.query(WeatherCache.city)) == ["new-0", "new-1"]
+        assert [l for (l,) in db.query(EventCache.location)] == ["new"]
+    finally:
+        db.close()
@@ -0,0 +1,51 @@
+"""Concurrent cache misses for one key make a single upstream call"""
+import asyncio
+import pytest
+from app.services.event_service import event_service
+from app.services.weather_service import weather_service, API_ERROR_NOTE
+from app.utils.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+N = 25
+
+
+async def test_concurrent_misses_make_one_upstream_call(upstream):
+    upstream.delay = 0.05
+    weather = await asyncio.gather(*(weather_service.get_weather("Pune") for _ in range(N)))
+    events = await asyncio.gather(*(event_service.get_events("Pune") for _ in range(N)))
+
+    assert upstream.calls == {"weather": 1, "events": 1}
+    assert len(weather) == N and all(w == weather[0] for w in weather)
+    assert weather[0]["temperature"] == 31.5
+    assert len(events) == N and all(e == events[0] for e in events)
+    assert len(events[0]) == 3
+
+
+async def test_upstream_error_reaches_every_waiter(upstream):
+    upstream.delay = 0.05
+    upstream.status = 500
+    weather, events = await asyncio.gather(
+        asyncio.gather(*(weather_service.get_weather("Agra") for _ in range(N))),
+        asyncio.gather(*(event_service.get_events("Agra") for _ in range(N))),
+    )
+
+    assert upstream.calls == {"weather": 1, "events": 1}
+    assert all(w["note"] == API_ERROR_NOTE for w in weather)
+    assert all(e == [] for e in events)
+
+
+async def test_singleflight_shares_exceptions():
+    flight = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("key", failing) for _ in range(N)), return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "upstream down" for r in results)
+    assert flight.stats() == {"calls": 1, "coalesced": N - 1, "in_flight": 0}
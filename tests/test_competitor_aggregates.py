@@ -0,0 +1,78 @@
+"""Competitor price aggregates under concurrent writers"""
+import threading
+from sqlalchemy import event
+from app.db.database import SessionLocal, get_engine
+from app.models.database import CompetitorPriceAggregate
+from app.schemas.competitors import CompetitorPriceIn
+from app.services.competitor_service import competitor_service
+
+WRITERS = 8
+
+
+def _write(menu_item_id: int, competitor: str, price: float):
+    db = SessionLocal()
+    try:
+        competitor_service._record(db, [
+            CompetitorPriceIn(menu_item_id=menu_item_id, competitor_name=competitor, price=price)
+        ])
+    finally:
+        db.close()
+
+
+def _aggregate(menu_item_id: int):
+    db = SessionLocal()
+    try:
+        return db.get(CompetitorPriceAggregate, menu_item_id)
+    finally:
+        db.close()
+
+
+def test_concurrent_first_writes_keep_every_competitor():
+    barrier = threading.Barrier(WRITERS)
+    errors = []
+
+    def writer(i: int):
+        try:
+            barrier.wait()
+            _write(42, f"competitor-{i}", 100.0 + i)
+        except Exception as e:  # surfaced below, a thread can't fail the test itself
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    aggregate = _aggregate(42)
+    assert aggregate.count == WRITERS
+    assert sorted(aggregate.latest_prices) == sorted(f"competitor-{i}" for i in range(WRITERS))
+    assert aggregate.min_price == 100.0 and aggregate.max_price == 100.0 + WRITERS - 1
+
+
+def test_aggregate_row_exists_before_it_is_locked():
+    # SELECT ... FOR UPDATE can only lock an existing row, the placeholder insert has to come first
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "competitor_price_aggregates" in statement:
+            statements.append(" ".join(statement.split()).upper())
+
+    engine = get_engine()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        _write(43, "cafe", 120.0)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    placeholder = next(i for i, s in enumerate(statements) if s.startswith("INSERT") and "DO NOTHING" in s)
+    read = next(i for i, s in enumerate(statements) if s.startswith("SELECT"))
+    assert placeholder < read
+
+    aggregate = _aggregate(43)
+    assert aggregate.count == 1 and aggregate.latest_prices["cafe"][0] == 120.0
+
+    # a later write folds into the row instead of replacing it
+    _write(43, "diner", 140.0)
+    assert sorted(_aggregate(43).latest_prices) == ["cafe", "diner"]
@@ -0,0 +1,63 @@
+"""Line splitting and CSV parsing of bulk competitor price uploads"""
+import pytest
+from app.db.database import db_session
+from app.services.competitor_ingest import IngestError, IngestResult, _parse_csv, ingest_stream, iter_lines
+
+pytestmark = pytest.mark.anyio
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _lines(data: bytes, max_line_bytes: int = 64, size: int = 7):
+    return [line async for line in iter_lines(_chunks(data, size), max_line_bytes)]
+
+
+async def test_lines_split_across_chunks():
+    data = "﻿a,b\r\ncafé,2\nlast".encode()
+    assert await _lines(data) == ["a,b", "café,2", "last"]
+
+
+async def test_line_limit_counts_bytes_not_characters():
+    # 20 characters, 60 bytes
+    line = ("€" * 20).encode()
+    with pytest.raises(IngestError):
+        await _lines(line + b"\nok\n", max_line_bytes=40, size=1000)
+    assert await _lines(line + b"\nok\n", max_line_bytes=60, size=1000) == ["€" * 20, "ok"]
+
+
+async def test_oversized_complete_line_inside_one_chunk_is_refused():
+    data = b"short\n" + b"x" * 100 + b"\nshort\n"
+    with pytest.raises(IngestError):
+        await _lines(data, max_line_bytes=64, size=len(data))
+
+
+async def test_invalid_utf8_is_an_ingest_error():
+    with pytest.raises(IngestError):
+        await _lines(b"ok\n\xff\xfe\n")
+
+
+async def test_csv_quoted_fields_can_span_lines():
+    data = (
+        b'menu_item_id,competitor_name,price\n'
+        b'1,"Cafe ""Blue""\nAnnex",240\n'
+        b'2,Spice Hub,260\n'
+    )
+    result = IngestResult()
+    rows = [row async for row in _parse_csv(iter_lines(_chunks(data, 5), 1024), result)]
+    assert rows == [
+        (2, {"menu_item_id": "1", "competitor_name": 'Cafe "Blue"\nAnnex', "price": "240"}),
+        (4, {"menu_item_id": "2", "competitor_name": "Spice Hub", "price": "260"}),
+    ]
+    assert result.rejected == 0
+
+
+async def test_csv_ingest_loads_multi_line_records(db_mode):
+    data = b'menu_item_id,competitor_name,price\n1,"North\nStar",240\n1,South,250\n1,bad,-5\n'
+    async with db_session() as db:
+        result = await ingest_stream(_chunks(data, 4), "csv", db)
+    assert result.accepted == 2
+    assert result.rejected == 1
+    assert result.errors == [{"line": 5, "error": "price must be a positive number"}]
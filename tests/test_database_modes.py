@@ -0,0 +1,224 @@
+"""
+Routes and database helpers with DB_ASYNC off (sync Session in the
+threadpool) and on (AsyncSession on aiosqlite)
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.database import (
+    DB_POOL_CHECKOUT_SECONDS, SessionLocal, db_session, get_async_engine, get_engine, run_db,
+)
+from app.models.database import PricingHistory
+from app.services.history_recorder import history_recorder
+
+pytestmark = pytest.mark.anyio
+
+SUGGEST = {
+    "menu_item_id": 7,
+    "current_price": 250,
+    "competitor_prices": [240, 260, 245],
+    "weather": {"temperature": 32, "condition": "Sunny"},
+    "events": [{"name": "Food Festival", "popularity": "High", "distance_km": 2.5}],
+}
+
+
+def _count_history(db: Session, menu_item_id: int) -> int:
+    return db.query(PricingHistory).filter(PricingHistory.menu_item_id == menu_item_id).count()
+
+
+def _insert_history(menu_item_id: int, n: int, created_at: datetime):
+    """n rows, pairs of them sharing a timestamp so paging has to break ties on id"""
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(PricingHistory, [
+            {
+                "menu_item_id": menu_item_id,
+                "current_price": 100.0,
+                "recommended_price": 100.0 + i,
+                "competitor_avg_price": 100.0,
+                "weather_condition": "Clear",
+                "temperature": 20.0,
+                "event_count": 0,
+                "reasoning": f"row {i}",
+                "created_at": created_at + timedelta(seconds=i // 2),
+            }
+            for i in range(n)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def test_db_session_and_run_db(db_mode):
+    async with db_session() as db:
+        assert isinstance(db, AsyncSession if db_mode else Session)
+        assert await run_db(db, _count_history, 1) == 0
+
+
+async def test_suggest_records_history(db_mode, client):
+    response = await client.post("/api/pricing/suggest", json=SUGGEST)
+    assert response.status_code == 200
+    assert response.json()["menu_item_id"] == 7
+
+    await history_recorder.stop()
+    async with db_session() as db:
+        assert await run_db(db, _count_history, 7) == 1
+
+
+async def test_history_keyset_paging(db_mode, client):
+    _insert_history(3, 7, datetime(2024, 1, 1, 12))
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/pricing/history/3", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        seen.extend(row["id"] for row in body["history"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 7 and len(set(seen)) == 7
+    # newest first, ties on created_at broken by id descending
+    assert seen == sorted(seen, reverse=True)
+
+    response = await client.get("/api/pricing/history/3", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def _insert_rows(menu_item_id: int, rows):
+    """rows of (created_at, current_price, recommended_price, event_count)"""
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(PricingHistory, [
+            {
+                "menu_item_id": menu_item_id,
+                "current_price": current,
+                "recommended_price": recommended,
+                "competitor_avg_price": current,
+                "weather_condition": "Clear",
+                "temperature": 20.0,
+                "event_count": events,
+                "reasoning": "",
+                "created_at": created_at,
+            }
+            for created_at, current, recommended, events in rows
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def test_history_paging_through_tied_timestamps(db_mode, client):
+    # 23 rows on 3 interleaved timestamps, page boundaries fall inside the ties
+    _insert_rows(4, [(datetime(2024, 1, 1, 12, 0, i % 3), 100.0, 100.0 + i, 0) for i in range(23)])
+    _insert_rows(5, [(datetime(2024, 1, 1, 12), 100.0, 100.0, 0)] * 4)
+    db = SessionLocal()
+    try:
+        ids = sorted(row.id for row in db.query(PricingHistory.id).filter(PricingHistory.menu_item_id == 4))
+    finally:
+        db.close()
+
+    for limit in (1, 4, 7, 23, 50):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            body = (await client.get("/api/pricing/history/4", params=params)).json()
+            assert len(body["history"]) <= limit
+            seen.extend(body["history"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        # every row exactly once, newest first and by id within a timestamp
+        assert sorted(row["id"] for row in seen) == ids
+        assert [(row["date"], row["id"]) for row in seen] == \
+            sorted(((row["date"], row["id"]) for row in seen), reverse=True)
+
+
+ANALYTICS_ROWS = [
+    (datetime(2024, 1, 1, 10, 15), 100.0, 110.0, 1),  # Monday
+    (datetime(2024, 1, 1, 10, 45), 100.0, 90.0, 2),
+    (datetime(2024, 1, 1, 11, 5), 100.0, 120.0, 0),
+    (datetime(2024, 1, 3, 9, 0), 200.0, 200.0, 3),
+    (datetime(2024, 1, 7, 23, 59, 59), 100.0, 130.0, 1),  # Sunday, still the first week
+    (datetime(2024, 1, 8, 0, 0), 100.0, 80.0, 0),  # the next Monday
+]
+
+
+@pytest.mark.parametrize("bucket, expected", [
+    ("hour", [
+        ("2024-01-01T10:00:00", 2, 100.0, 90.0, 110.0, 0.0, 3, 1.5),
+        ("2024-01-01T11:00:00", 1, 120.0, 120.0, 120.0, 20.0, 0, 0.0),
+        ("2024-01-03T09:00:00", 1, 200.0, 200.0, 200.0, 0.0, 3, 3.0),
+        ("2024-01-07T23:00:00", 1, 130.0, 130.0, 130.0, 30.0, 1, 1.0),
+        ("2024-01-08T00:00:00", 1, 80.0, 80.0, 80.0, -20.0, 0, 0.0),
+    ]),
+    ("day", [
+        ("2024-01-01T00:00:00", 3, 106.67, 90.0, 120.0, 6.667, 3, 1.0),
+        ("2024-01-03T00:00:00", 1, 200.0, 200.0, 200.0, 0.0, 3, 3.0),
+        ("2024-01-07T00:00:00", 1, 130.0, 130.0, 130.0, 30.0, 1, 1.0),
+        ("2024-01-08T00:00:00", 1, 80.0, 80.0, 80.0, -20.0, 0, 0.0),
+    ]),
+    ("week", [
+        ("2024-01-01T00:00:00", 5, 130.0, 90.0, 200.0, 10.0, 7, 1.4),
+        ("2024-01-08T00:00:00", 1, 80.0, 80.0, 80.0, -20.0, 0, 0.0),
+    ]),
+])
+async def test_history_analytics_buckets(db_mode, client, bucket, expected):
+    _insert_rows(6, ANALYTICS_ROWS)
+    _insert_rows(16, ANALYTICS_ROWS[:2])
+
+    response = await client.get("/api/pricing/history/6/analytics", params={"bucket": bucket})
+    assert response.status_code == 200
+    buckets = response.json()["buckets"]
+    assert [
+        (b["bucket_start"], b["count"], b["avg_recommended_price"], b["min_recommended_price"],
+         b["max_recommended_price"], b["avg_uplift_pct"], b["total_events"], b["avg_events"])
+        for b in buckets
+    ] == expected
+    for b in buckets:
+        assert all(isinstance(b[key], float) for key in ("avg_recommended_price", "avg_uplift_pct", "avg_events"))
+
+    # end is exclusive
+    response = await client.get("/api/pricing/history/6/analytics",
+                                params={"bucket": bucket, "start": "2024-01-01T11:00:00", "end": "2024-01-08T00:00:00"})
+    assert sum(b["count"] for b in response.json()["buckets"]) == 3
+
+
+async def test_auto_pricing(db_mode, client, upstream):
+    payload = {"menu_item_id": 9, "city": "Mumbai", "current_price": 250.0,
+               "latitude": 19.07, "longitude": 72.8777}
+    response = await client.post("/api/pricing/auto", json=payload)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["sources"] == {"weather": "ok", "events": "ok", "competitors": "ok"}
+    assert body["weather"] == {"temperature": 31.5, "condition": "Clear"}
+    assert len(body["events"]) == 3
+
+    # the second request is served from the cache tiers
+    response = await client.post("/api/pricing/auto", json=payload)
+    assert response.status_code == 200
+    assert upstream.calls == {"weather": 1, "events": 1}
+
+    await history_recorder.stop()
+    async with db_session() as db:
+        assert await run_db(db, _count_history, 9) == 2
+
+
+def _checkouts(engine_name: str) -> int:
+    series = DB_POOL_CHECKOUT_SECONDS._series.get((engine_name,))
+    return sum(series[0]) if series else 0
+
+
+async def test_pool_checkouts_are_timed(db_mode):
+    name = "async" if db_mode else "sync"
+    engine = get_async_engine().sync_engine if db_mode else get_engine()
+    assert isinstance(engine.pool, type(engine.dialect).get_pool_class(engine.url))
+    assert type(engine.pool).__name__.startswith("Timed")
+
+    before = _checkouts(name)
+    async with db_session() as db:
+        await run_db(db, _count_history, 1)
+    assert _checkouts(name) == before + 1
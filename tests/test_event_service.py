@@ -0,0 +1,99 @@
+"""City event snapshots, including cities with nothing on"""
+import json
+import random
+import time
+import pytest
+from app.db.database import SessionLocal
+from app.models.database import EventCache
+from app.services.event_service import CityEvents, event_service
+
+pytestmark = pytest.mark.anyio
+
+
+def _cached_event_count(location: str):
+    db = SessionLocal()
+    try:
+        row = db.query(EventCache).filter(EventCache.location == location).first()
+        return row.event_count if row else None
+    finally:
+        db.close()
+
+
+def _city_events(count=300, seed=3) -> list:
+    rng = random.Random(seed)
+    return [[f"event-{i}", rng.choice(["Low", "Medium", "High"]),
+             19.0 + rng.uniform(-0.3, 0.3), 72.9 + rng.uniform(-0.3, 0.3)] for i in range(count)]
+
+
+def _same_answers(rebuilt: CityEvents, original: CityEvents):
+    assert rebuilt.center == pytest.approx(original.center)
+    rng = random.Random(5)
+    for _ in range(50):
+        lat, lon = 19.0 + rng.uniform(-0.3, 0.3), 72.9 + rng.uniform(-0.3, 0.3)
+        radius = rng.choice([0.5, 2.0, 5.0, 20.0])
+        assert rebuilt.nearby(lat, lon, radius, 25) == original.nearby(lat, lon, radius, 25)
+    # no coordinates, the center stands in
+    assert rebuilt.nearby(None, None, 5.0, 25) == original.nearby(None, None, 5.0, 25)
+
+
+@pytest.mark.parametrize("center", [None, (19.05, 72.95)])
+def test_snapshot_rebuilds_from_json(center):
+    original = CityEvents(_city_events(), center)
+    rebuilt = CityEvents.from_json(json.loads(json.dumps(original.to_json())))
+    _same_answers(rebuilt, original)
+
+
+@pytest.mark.parametrize("center", [None, (19.05, 72.95)])
+def test_snapshot_rebuilds_from_the_cache_table(center):
+    original = CityEvents(_city_events(), center)
+    db = SessionLocal()
+    try:
+        event_service._save_to_cache(db, "Pune", original.events, original.center)
+        rebuilt, age = event_service._get_from_cache(db, "Pune")
+    finally:
+        db.close()
+    assert age < 60
+    _same_answers(rebuilt, original)
+
+
+async def test_empty_city_is_cached(upstream):
+    upstream.event_count = 0
+    assert await event_service.get_events("Shimla") == []
+    assert await event_service.get_events("Shimla") == []
+    assert upstream.calls["events"] == 1
+    assert event_service.expires_in("Shimla") is not None
+
+
+async def test_refresh_replaces_a_snapshot_with_an_empty_one(upstream):
+    assert len(await event_service.get_events("Goa")) == 3
+
+    upstream.event_count = 0
+    assert await event_service.refresh("Goa") is True
+    assert await event_service.get_events("Goa") == []
+    assert _cached_event_count("Goa") == 0
+    assert upstream.calls["events"] == 2
+
+
+async def test_failed_refresh_keeps_the_snapshot(upstream):
+    assert len(await event_service.get_events("Delhi")) == 3
+
+    upstream.status = 500
+    assert await event_service.refresh("Delhi") is False
+    assert len(await event_service.get_events("Delhi")) == 3
+
+
+async def test_auto_reports_stale_events_with_none_in_radius(client, upstream):
+    # far from every fake venue, the radius is empty whatever the snapshot's age
+    payload = {"menu_item_id": 4, "city": "Mumbai", "current_price": 200.0,
+               "latitude": 28.61, "longitude": 77.21}
+    response = await client.post("/api/pricing/auto", json=payload)
+    assert response.json()["sources"]["events"] == "ok"
+
+    _, city = event_service._l1._data["Mumbai"]
+    event_service._l1._data["Mumbai"] = (time.monotonic() - 60, city)
+
+    response = await client.post("/api/pricing/auto", json=payload)
+    body = response.json()
+    assert body["events"] == []
+    assert body["sources"]["events"] == "stale"
+    assert body["data_age_seconds"]["events"] >= event_service.cache_ttl + 60
@@ -0,0 +1,88 @@
+"""Radius queries on the venue grid"""
+import math
+import random
+import pytest
+from app.utils.geo import EARTH_RADIUS_KM, GridIndex, haversine_km
+
+
+def _brute_force(points, lat, lon, radius_km):
+    return sorted(name for name, (p_lat, p_lon) in points.items()
+                  if haversine_km(lat, lon, p_lat, p_lon) <= radius_km)
+
+
+def _grid(points, cell_km=2.0) -> GridIndex:
+    grid = GridIndex(cell_km)
+    for name, (lat, lon) in points.items():
+        grid.insert(lat, lon, name)
+    return grid
+
+
+def _with_filler(points) -> dict:
+    """
+    points plus far away ones in many cells, otherwise a query finds the
+    box bigger than the data and scans every cell instead of the box
+    """
+    rng = random.Random(1)
+    filler = {f"filler-{i}": (rng.uniform(-60, -50), rng.uniform(0, 10)) for i in range(2000)}
+    return {**filler, **points}
+
+
+def _names(grid, lat, lon, radius_km):
+    return sorted(name for _, name in grid.query(lat, lon, radius_km))
+
+
+@pytest.mark.parametrize("bearing", ["north", "south", "east", "west"])
+def test_point_exactly_at_the_radius_is_included(bearing):
+    radius, cell_km = 5.0, 1.0
+    cell_deg = cell_km / 111.32
+    offset = math.degrees(radius / EARTH_RADIUS_KM)
+    # the edge point sits just past a cell boundary, in a cell of its own
+    lat = 2143 * cell_deg - offset + 1e-6
+    lon = 72.8777
+    if bearing == "south":
+        lat = 2143 * cell_deg + offset - 1e-6
+    east = offset / math.cos(math.radians(lat))
+    point = {
+        "north": (lat + offset, lon),
+        "south": (lat - offset, lon),
+        "east": (lat, lon + east),
+        "west": (lat, lon - east),
+    }[bearing]
+    edge = haversine_km(lat, lon, *point)
+    grid = _grid(_with_filler({"edge": point}), cell_km=cell_km)
+    assert _names(grid, lat, lon, edge) == ["edge"]
+    assert _names(grid, lat, lon, edge * (1 - 1e-9)) == []
+
+
+def test_radius_across_the_antimeridian():
+    points = {"fiji-east": (-17.0, 179.98), "samoa-side": (-17.0, -179.98), "far": (-17.0, -179.5)}
+    grid = _grid(_with_filler(points))
+    # 4.25 km apart across the line
+    assert _names(grid, -17.0, 179.99, 5.0) == ["fiji-east", "samoa-side"]
+    assert _names(grid, -17.0, -179.99, 5.0) == ["fiji-east", "samoa-side"]
+    assert _names(grid, -17.0, 180.0, 60.0) == _brute_force(points, -17.0, 180.0, 60.0)
+
+
+@pytest.mark.parametrize("pole", [90.0, -90.0])
+def test_radius_around_a_pole(pole):
+    sign = math.copysign(1.0, pole)
+    # 1 km from the pole, on opposite sides of it
+    near = pole - sign * math.degrees(1.0 / EARTH_RADIUS_KM)
+    points = {"a": (near, 0.0), "b": (near, 180.0), "c": (near, -90.0), "d": (pole - sign * 1.0, 45.0)}
+    grid = _grid(_with_filler(points))
+    assert _names(grid, near, 0.0, 3.0) == ["a", "b", "c"]
+    assert _names(grid, pole, 0.0, 1.5) == ["a", "b", "c"]
+    assert _names(grid, near, 0.0, 200.0) == ["a", "b", "c", "d"]
+
+
+def test_grid_matches_brute_force():
+    rng = random.Random(7)
+    points = {f"p{i}": (rng.uniform(-89.9, 89.9), rng.uniform(-180, 180)) for i in range(400)}
+    # a dense cluster, so small radii hit something
+    points.update({f"c{i}": (19.0 + rng.uniform(-0.2, 0.2), 72.9 + rng.uniform(-0.2, 0.2)) for i in range(400)})
+    points = _with_filler(points)
+    grid = _grid(points)
+    for _ in range(200):
+        lat, lon = rng.choice(list(points.values()))
+        radius = rng.choice([0.5, 2.0, 5.0, 25.0, 500.0])
+        assert _names(grid, lat, lon, radius) == _brute_force(points, lat, lon, radius)
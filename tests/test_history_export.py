@@ -0,0 +1,101 @@
+"""Streaming pricing history exports, several fetch batches per export"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.database import PricingHistory
+from app.services.history_export import EXPORT_COLUMNS, iter_export
+
+pytestmark = pytest.mark.anyio
+
+CHUNK_ROWS = 7
+START = datetime(2024, 3, 1, 8)
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """30 rows for item 1, 15 for item 2 and 5 for item 3, inserted out of order"""
+    monkeypatch.setattr(settings, "HISTORY_EXPORT_CHUNK_ROWS", CHUNK_ROWS)
+    rows = [
+        {
+            "menu_item_id": menu_item_id,
+            "current_price": 100.0 + i,
+            "recommended_price": 105.5 + i,
+            "competitor_avg_price": None if i % 4 == 0 else 99.0,
+            "weather_condition": "Rain" if i % 2 else "Clear",
+            "temperature": 21.5,
+            "event_count": i % 3,
+            # commas, quotes and newlines have to survive both formats
+            "reasoning": f'row {i}, "quoted"\nsecond line',
+            "created_at": START + timedelta(minutes=(i * 7) % count),
+        }
+        for menu_item_id, count in ((3, 5), (2, 15), (1, 30))
+        for i in range(count)
+    ]
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(PricingHistory, rows)
+        db.commit()
+        stored = db.query(PricingHistory).filter(PricingHistory.menu_item_id.in_([1, 2])).order_by(
+            PricingHistory.menu_item_id, PricingHistory.created_at, PricingHistory.id
+        ).all()
+        return [{column: getattr(row, column) for column in EXPORT_COLUMNS} for row in stored]
+    finally:
+        db.close()
+
+
+async def _chunks(fmt: str, **filters) -> list:
+    iterator = iter_export(filters.get("menu_item_ids", [1, 2]), filters.get("start"), filters.get("end"), fmt)
+    if hasattr(iterator, "__aiter__"):
+        return [chunk async for chunk in iterator]
+    return list(iterator)
+
+
+def _row_sizes(chunks, lines_per_row) -> list:
+    return [len(lines_per_row(chunk)) for chunk in chunks]
+
+
+async def test_csv_export_spans_several_batches(db_mode, history):
+    chunks = await _chunks("csv")
+    # header, then one chunk per fetch batch
+    assert chunks[0] == (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+    assert _row_sizes(chunks[1:], lambda c: list(csv.reader(io.StringIO(c.decode())))) == [7, 7, 7, 7, 7, 7, 3]
+
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert len(rows) == 45
+    expected = [
+        {column: "" if value is None else value.isoformat() if isinstance(value, datetime) else str(value)
+         for column, value in row.items()}
+        for row in history
+    ]
+    assert rows == expected
+
+
+async def test_ndjson_export_spans_several_batches(db_mode, history):
+    chunks = await _chunks("ndjson")
+    assert _row_sizes(chunks, lambda c: c.decode().splitlines()) == [7, 7, 7, 7, 7, 7, 3]
+
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [list(row) for row in rows] == [list(EXPORT_COLUMNS)] * 45
+    assert rows == [{**row, "created_at": row["created_at"].isoformat()} for row in history]
+
+
+async def test_export_route_streams_the_same_bytes(db_mode, client, history):
+    for fmt, media_type in (("csv", "text/csv"), ("ndjson", "application/x-ndjson")):
+        response = await client.get("/api/pricing/history/export",
+                                    params={"format": fmt, "menu_item_ids": [1, 2]})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith(media_type)
+        assert response.content == b"".join(await _chunks(fmt))
+
+    # start inclusive, end exclusive, every item when none are given
+    response = await client.get("/api/pricing/history/export", params={
+        "start": (START + timedelta(minutes=2)).isoformat(), "end": (START + timedelta(minutes=4)).isoformat(),
+    })
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted((row["menu_item_id"], row["created_at"]) for row in rows) == sorted(
+        (menu_item_id, (START + timedelta(minutes=m)).isoformat()) for menu_item_id in (1, 2, 3) for m in (2, 3)
+    )
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime
+import pytest
+from app.db.database import SessionLocal
+from app.models.database import PricingHistory
+from app.services.history_recorder import HistoryRecorder, history_recorder
+from app.utils.metrics import handled_errors
+
+pytestmark = pytest.mark.anyio
+
+ITEM = {
+    "menu_item_id": 5,
+    "current_price": 100,
+    "competitor_prices": [],
+    "weather": {"temperature": 20, "condition": "Clear"},
+}
+
+
+def _record(i: int) -> tuple:
+    return (11, 100.0, 100.0 + i, 100.0, "Clear", 20.0, 0, "test", datetime.utcnow())
+
+
+def _history_rows(menu_item_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(PricingHistory).filter(PricingHistory.menu_item_id == menu_item_id).count()
+    finally:
+        db.close()
+
+
+async def test_batch_larger_than_queue_waits_for_room():
+    # drop policy, yet a batch five times the queue size loses nothing while the worker keeps up
+    recorder = HistoryRecorder(max_queue=20, batch_size=10, flush_interval=0.01, block_timeout=5.0)
+    assert await recorder.record_many([_record(i) for i in range(100)]) == 100
+    await recorder.stop()
+    assert recorder.dropped == 0
+    assert recorder.flushed == 100
+    assert _history_rows(11) == 100
+
+
+async def test_batch_drops_are_counted(monkeypatch):
+    recorder = HistoryRecorder(max_queue=10, batch_size=10, flush_interval=0.01, block_timeout=0.05)
+
+    async def stuck_flush(batch):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(recorder, "_flush", stuck_flush)
+    accepted = await recorder.record_many([_record(i) for i in range(50)])
+    assert accepted < 50
+    assert recorder.dropped == 50 - accepted
+    assert recorder.queued == accepted
+    recorder._worker.cancel()
+
+
+async def test_dropped_rows_reported_on_the_response(client, monkeypatch):
+    async def record_many(records):
+        return len(records) - 2
+
+    async def record(record):
+        return False
+
+    monkeypatch.setattr(history_recorder, "record_many", record_many)
+    monkeypatch.setattr(history_recorder, "record", record)
+
+    response = await client.post("/api/pricing/suggest/batch", json={"items": [ITEM] * 5})
+    assert response.status_code == 200
+    assert response.headers["x-history-dropped"] == "2"
+
+    response = await client.post("/api/pricing/suggest", json=ITEM)
+    assert response.headers["x-history-dropped"] == "1"
+
+
+async def test_nothing_dropped_no_header(client):
+    response = await client.post("/api/pricing/suggest/batch", json={"items": [ITEM] * 5})
+    assert response.status_code == 200
+    assert "x-history-dropped" not in response.headers
+
+
+async def test_records_after_stop_are_rejected():
+    recorder = HistoryRecorder(max_queue=20, batch_size=10, flush_interval=0.01)
+    assert await recorder.record(_record(0)) is True
+    await recorder.stop()
+    assert recorder.flushed == 1
+
+    assert await recorder.record(_record(1)) is False
+    assert await recorder.record_many([_record(i) for i in range(3)]) == 0
+    stats = recorder.stats()
+    assert stats["running"] is False
+    assert (stats["rejected"], stats["dropped"], stats["pending"]) == (4, 0, 0)
+
+    # an explicit start takes records again
+    recorder.start()
+    assert await recorder.record(_record(2)) is True
+    await recorder.stop()
+    assert recorder.flushed == 2
+
+
+async def test_batch_drops_are_on_the_metrics(client, monkeypatch):
+    async def record_many(records):
+        return len(records) - 1
+
+    monkeypatch.setattr(history_recorder, "record_many", record_many)
+    before = handled_errors._values.get(("history_batch_dropped",), 0)
+    response = await client.post("/api/pricing/suggest/batch", json={"items": [ITEM] * 3})
+    assert response.headers["x-history-dropped"] == "1"
+    assert handled_errors._values.get(("history_batch_dropped",), 0) == before + 1
+    assert 'history_rows{outcome="rejected"}' in (await client.get("/metrics")).text
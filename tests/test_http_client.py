@@ -0,0 +1,84 @@
+"""The shared upstream client driven through a local mock transport"""
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.services.http_client import HTTPClientManager
+from app.utils.circuit_breaker import CircuitOpenError, OPEN
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def manager():
+    manager = HTTPClientManager()
+    yield manager
+    await manager.close()
+
+
+async def test_requests_go_through_the_mock_transport(manager):
+    seen = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        await asyncio.sleep(0.02)
+        return httpx.Response(200 if request.url.path == "/ok" else 404, json={})
+
+    manager.start(transport=httpx.MockTransport(handler))
+    responses = await asyncio.gather(
+        *(manager.get("http://upstream.test/ok", upstream="mock", params={"i": i}) for i in range(5)),
+        manager.get("http://upstream.test/missing", upstream="mock"),
+    )
+
+    assert [r.status_code for r in responses] == [200] * 5 + [404]
+    assert len(seen) == 6
+    stats = manager.stats()
+    assert stats["running"] is True
+    assert stats["upstreams"]["mock"]["requests"] == 6
+    assert stats["upstreams"]["mock"]["status_codes"] == {200: 5, 404: 1}
+    assert stats["pool"] == {
+        "max_connections": settings.HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "in_flight": 0,
+        "peak_in_flight": 6,
+        "utilization": 0.0,
+    }
+    assert manager.upstreams["mock"].reachability()["status"] == "reachable"
+
+
+async def test_start_is_idempotent_and_close_stops(manager):
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(200)
+
+    manager.start(transport=httpx.MockTransport(handler))
+    client = manager.client
+    manager.start(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    assert manager.client is client
+    assert (await manager.get("http://upstream.test/", upstream="mock")).status_code == 200
+    await manager.close()
+    assert manager.stats()["running"] is False
+    assert calls == 1
+
+
+async def test_failures_open_the_circuit(manager):
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectError("refused", request=request)
+
+    manager.start(transport=httpx.MockTransport(handler))
+    for _ in range(settings.CIRCUIT_BREAKER_MIN_CALLS):
+        with pytest.raises(httpx.ConnectError):
+            await manager.get("http://upstream.test/", upstream="down")
+
+    assert manager.breakers["down"].state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await manager.get("http://upstream.test/", upstream="down")
+    assert calls == settings.CIRCUIT_BREAKER_MIN_CALLS
+    assert manager.upstreams["down"].reachability()["status"] == "unreachable"
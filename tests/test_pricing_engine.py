@@ -0,0 +1,252 @@
+"""The vectorized batch path against the scalar pricing path, and the result cache"""
+import json
+import math
+import random
+import pytest
+from sqlalchemy import event
+from app.core.config import settings
+from app.db.database import SessionLocal, get_engine
+from app.models.database import PricingHistory
+from app.schemas.competitors import CompetitorStats
+from app.schemas.pricing import EventData, PricingRequest, WeatherData
+from app.services.history_recorder import history_recorder
+from app.services.pricing_engine import PricingEngine
+from app.services.pricing_rules import DEFAULT_RULES_FILE, load_rules
+
+pytestmark = pytest.mark.anyio
+
+# band edges of the default rules, either side of each and exactly on it
+EDGES = [10.0, 20.0, 30.0, 35.0]
+TEMPERATURES = [t for edge in EDGES for t in (math.nextafter(edge, -math.inf), edge, math.nextafter(edge, math.inf))]
+TEMPERATURES += [-12.0, 0.0, 15.5, 25.0, 32.0, 44.0, float("nan")]
+CONDITIONS = ["Sunny", "clear sky", "Fair", "Light Rain", "THUNDERSTORM", "Snow", "Cloudy", "Haze", ""]
+POPULARITY = ["High", "medium", "LOW", "Viral", ""]
+
+
+def _random_request(rng: random.Random, menu_item_id: int) -> PricingRequest:
+    current = round(rng.uniform(50, 500), 2)
+    return PricingRequest(
+        menu_item_id=menu_item_id,
+        current_price=current,
+        # ragged, often empty
+        competitor_prices=[round(current * rng.uniform(0.5, 1.6), 2) for _ in range(rng.choice([0, 0, 1, 2, 5]))],
+        weather=WeatherData(temperature=rng.choice(TEMPERATURES), condition=rng.choice(CONDITIONS)),
+        events=[
+            EventData(name=f"event {j}", popularity=rng.choice(POPULARITY),
+                      distance_km=rng.choice([0.0, 0.5, 2.5, round(rng.uniform(0, 20), 3)]))
+            for j in range(rng.choice([0, 0, 1, 3, 7]))
+        ],
+    )
+
+
+def _random_stats(rng: random.Random, menu_item_id: int):
+    count = rng.choice([None, None, 0, 1, 4])
+    if count is None:
+        return None
+    mean = round(rng.uniform(40, 600), 2)
+    return CompetitorStats(
+        menu_item_id=menu_item_id, count=count, mean=mean, median=mean, trimmed_mean=mean,
+        p25=mean, p75=mean, min_price=mean, max_price=mean, latest_prices={}
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_suggest_price(seed):
+    rng = random.Random(seed)
+    engine = PricingEngine(result_cache_size=0)
+    requests = [_random_request(rng, i) for i in range(300)]
+    stats = [_random_stats(rng, i) for i in range(300)]
+
+    batch = engine.suggest_prices_batch(requests)
+    assert len(batch) == len(requests)
+    for request, result in zip(requests, batch):
+        assert result.model_dump() == engine.suggest_price(request).model_dump()
+
+    # stored stats stand in for missing competitor prices
+    batch = engine.suggest_prices_batch(requests, stats)
+    for request, item_stats, result in zip(requests, stats, batch):
+        assert result.model_dump() == engine.suggest_price(request, item_stats).model_dump()
+
+
+def test_batch_of_items_without_competitors_or_events():
+    engine = PricingEngine(result_cache_size=0)
+    requests = [
+        PricingRequest(menu_item_id=i, current_price=100.0 + i, competitor_prices=[],
+                       weather=WeatherData(temperature=t, condition="Cloudy"))
+        for i, t in enumerate(TEMPERATURES)
+    ]
+    assert [r.model_dump() for r in engine.suggest_prices_batch(requests)] == \
+        [engine.suggest_price(r).model_dump() for r in requests]
+    assert engine.suggest_prices_batch([]) == []
+
+
+ITEM = {
+    "menu_item_id": 8,
+    "current_price": 100,
+    "competitor_prices": [90, 120],
+    "weather": {"temperature": 25, "condition": "Sunny"},
+}
+
+
+async def test_batch_size_limit(client, monkeypatch):
+    monkeypatch.setattr(settings, "PRICING_BATCH_MAX_ITEMS", 3)
+    response = await client.post("/api/pricing/suggest/batch", json={"items": [ITEM] * 4})
+    assert response.status_code == 413
+
+    response = await client.post("/api/pricing/suggest/batch", json={"items": [ITEM] * 3})
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
+
+
+async def test_batch_history_is_one_bulk_handoff(client, monkeypatch):
+    calls = []
+    record_many = history_recorder.record_many
+
+    async def counting_record_many(records):
+        calls.append(len(records))
+        return await record_many(records)
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO PRICING_HISTORY"):
+            inserts.append(len(parameters) if executemany else 1)
+
+    inserts = []
+    monkeypatch.setattr(history_recorder, "record_many", counting_record_many)
+    event.listen(get_engine(), "before_cursor_execute", capture)
+    try:
+        response = await client.post("/api/pricing/suggest/batch", json={"items": [ITEM] * 25})
+        assert response.status_code == 200
+        await history_recorder.stop()
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", capture)
+    assert calls == [25]
+    assert inserts == [25]
+
+
+async def test_suggest_uses_stored_competitor_stats(client):
+    response = await client.post("/api/competitors/prices", json={"prices": [
+        {"menu_item_id": 31, "competitor_name": "Cafe Blue", "price": 110},
+        {"menu_item_id": 31, "competitor_name": "Spice Hub", "price": 130},
+    ]})
+    assert response.status_code == 200
+    stored = {**ITEM, "menu_item_id": 31}
+    del stored["competitor_prices"]
+    inline = {**ITEM, "menu_item_id": 31, "competitor_prices": [110, 130]}
+    unknown = {**stored, "menu_item_id": 32}
+
+    single = (await client.post("/api/pricing/suggest", json=stored)).json()
+    assert single == (await client.post("/api/pricing/suggest", json=inline)).json()
+    assert "competitors are pricing higher" in single["reasoning"]
+
+    batch = (await client.post("/api/pricing/suggest/batch", json={"items": [stored, inline, unknown]})).json()
+    assert batch["results"][:2] == [single, single]
+    assert batch["results"][2] == (await client.post("/api/pricing/suggest", json=unknown)).json()
+    assert "competitors" not in batch["results"][2]["reasoning"]
+
+    await history_recorder.stop()
+    db = SessionLocal()
+    try:
+        averages = [row.competitor_avg_price for row in db.query(PricingHistory).order_by(PricingHistory.id)]
+    finally:
+        db.close()
+    # no stats for item 32, its current price is recorded like before
+    assert averages == [120.0, 120.0, 120.0, 120.0, 100.0, 100.0]
+
+
+def _request(**overrides) -> PricingRequest:
+    fields = {
+        "menu_item_id": 5, "current_price": 100.0, "competitor_prices": [90.0, 120.0],
+        "weather": WeatherData(temperature=25.0, condition="Sunny"),
+        "events": [EventData(name="Food Festival", popularity="High", distance_km=1.0)],
+        **overrides,
+    }
+    return PricingRequest(**fields)
+
+
+def test_result_cache_hits_identical_requests():
+    engine = PricingEngine(result_cache_size=16)
+    first = engine.suggest_price(_request())
+    # a separately built but identical request, and ones that only differ in what isn't priced
+    assert engine.suggest_price(_request()) is first
+    assert engine.suggest_price(_request(competitor_prices=[105.0, 105.0])) is first
+    assert engine.suggest_price(
+        _request(events=[EventData(name="Food Festival", popularity="HIGH", distance_km=1.0)])
+    ) is first
+
+    different = [
+        _request(menu_item_id=6),
+        _request(current_price=101.0),
+        _request(competitor_prices=[]),
+        _request(competitor_prices=[90.0, 121.0]),
+        _request(weather=WeatherData(temperature=25.5, condition="Sunny")),
+        _request(weather=WeatherData(temperature=25.0, condition="Rain")),
+        _request(events=[]),
+        _request(events=[EventData(name="Food Festival", popularity="Low", distance_km=1.0)]),
+        _request(events=[EventData(name="Food Festival", popularity="High", distance_km=1.5)]),
+    ]
+    for request in different:
+        assert engine.suggest_price(request) is not first
+    assert engine.cache_stats()["size"] == 1 + len(different)
+
+    uncached = PricingEngine(result_cache_size=0)
+    for request in [_request()] + different:
+        assert engine.suggest_price(request).model_dump() == uncached.suggest_price(request).model_dump()
+
+
+def test_result_cache_evicts_least_recently_used():
+    engine = PricingEngine(result_cache_size=3)
+    first, second, _ = (engine.suggest_price(_request(menu_item_id=i)) for i in range(3))
+    assert engine.suggest_price(_request(menu_item_id=0)) is first
+    engine.suggest_price(_request(menu_item_id=3))
+
+    stats = engine.cache_stats()
+    assert (stats["size"], stats["maxsize"], stats["evictions"]) == (3, 3, 1)
+    # item 1 was the least recently used
+    assert engine.suggest_price(_request(menu_item_id=0)) is first
+    assert engine.suggest_price(_request(menu_item_id=1)) is not second
+
+
+def test_result_cache_hit_rate():
+    engine = PricingEngine(result_cache_size=16)
+    assert engine.cache_stats()["hit_rate"] == 0.0
+    for request in (_request(), _request(), _request(), _request(current_price=120.0)):
+        engine.suggest_price(request)
+    stats = engine.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 2, 0.5)
+
+    disabled = PricingEngine(result_cache_size=0)
+    disabled.suggest_price(_request())
+    disabled.suggest_price(_request())
+    assert (disabled.cache_stats()["hits"], disabled.cache_stats()["size"]) == (0, 0)
+
+
+@pytest.mark.parametrize("change", ["internal_weight", "external_weight"])
+def test_weight_change_clears_the_result_cache(change):
+    engine = PricingEngine(result_cache_size=16)
+    before = engine.suggest_price(_request())
+    setattr(engine, change, getattr(engine, change) + 0.1)
+    assert engine.cache_stats()["size"] == 0
+
+    after = engine.suggest_price(_request())
+    assert after.recommended_price != before.recommended_price
+    assert getattr(after.factors, change) == pytest.approx(getattr(before.factors, change) + 0.1)
+
+
+def test_rules_change_clears_the_result_cache(tmp_path):
+    engine = PricingEngine(result_cache_size=16)
+    before = engine.suggest_price(_request())
+
+    with open(DEFAULT_RULES_FILE, encoding="utf-8") as f:
+        rules = json.load(f)
+    rules["temperature_bands"][0]["adjustment"] = 0.1
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(rules), encoding="utf-8")
+
+    engine.reload_rules(str(path))
+    assert engine.cache_stats()["size"] == 0
+    reloaded = engine.suggest_price(_request())
+    assert reloaded.recommended_price != before.recommended_price
+
+    engine.rules = load_rules()
+    assert engine.cache_stats()["size"] == 0
+    assert engine.suggest_price(_request()).model_dump() == before.model_dump()
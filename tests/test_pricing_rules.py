@@ -0,0 +1,132 @@
+"""The bundled pricing rules against the hard-coded factors they replaced, and bad rule files"""
+import json
+import math
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.schemas.pricing import EventData, PricingRequest, WeatherData
+from app.services.pricing_engine import PricingEngine
+from app.services.pricing_rules import DEFAULT_RULES_FILE, PricingRules, load_rules
+
+
+def _baseline_weather_factor(temperature: float, condition: str) -> float:
+    """PricingEngine.calculate_weather_factor before the rules file"""
+    base_factor = 1.0
+    if 20 <= temperature <= 30:
+        base_factor += 0.8
+    elif temperature > 35:
+        base_factor -= 0.05
+    elif temperature < 10:
+        base_factor -= 0.03
+    condition = condition.lower()
+    if any(word in condition for word in ["sunny", "clear", "fair"]):
+        base_factor += 0.05
+    elif any(word in condition for word in ["rain", "storm", "snow"]):
+        base_factor += -0.08
+    else:
+        base_factor += 0.0
+    return base_factor
+
+
+def _baseline_event_impact(popularity: str, distance_km: float) -> float:
+    return {"low": 0.02, "medium": 0.05, "high": 0.10}.get(popularity.lower(), 0.03) * math.exp(-0.3 * distance_km)
+
+
+def _around(value: float) -> list:
+    return [math.nextafter(value, -math.inf), value, math.nextafter(value, math.inf)]
+
+
+# every band edge, exactly on it and one float either side
+TEMPERATURES = [t for edge in (10.0, 20.0, 30.0, 35.0) for t in _around(edge)]
+TEMPERATURES += [-40.0, 0.0, 9.5, 15.0, 25.0, 32.5, 35.5, 50.0, -math.inf, math.inf, float("nan")]
+CONDITIONS = ["Sunny", "CLEAR SKY", "fair", "Partly sunny with rain", "Light Rain", "Thunderstorm",
+              "Snow", "Clouds", "Haze", ""]
+
+
+@pytest.mark.parametrize("temperature, adjustment", [
+    (math.nextafter(10.0, -math.inf), -0.03), (10.0, 0.0), (15.0, 0.0),
+    (math.nextafter(20.0, -math.inf), 0.0), (20.0, 0.8), (25.0, 0.8), (30.0, 0.8),
+    (math.nextafter(30.0, math.inf), 0.0), (35.0, 0.0), (math.nextafter(35.0, math.inf), -0.05),
+    (float("nan"), 0.0),
+])
+def test_default_temperature_bands(temperature, adjustment):
+    rules = load_rules()
+    assert rules.temperature_adjustment(temperature) == adjustment
+    assert rules.temperature_adjustments(np.array([temperature])).tolist() == [adjustment]
+
+
+def test_default_rules_reproduce_the_baseline_factors():
+    engine = PricingEngine(rules=load_rules(DEFAULT_RULES_FILE))
+    for temperature in TEMPERATURES:
+        for condition in CONDITIONS:
+            factor = engine.calculate_weather_factor(WeatherData(temperature=temperature, condition=condition))
+            assert factor == _baseline_weather_factor(temperature, condition), (temperature, condition)
+
+    temperatures = np.array(TEMPERATURES)
+    assert engine.rules.temperature_adjustments(temperatures).tolist() == \
+        [engine.rules.temperature_adjustment(t) for t in TEMPERATURES]
+
+    for popularity in ["Low", "MEDIUM", "high", "Viral", ""]:
+        for distance in [0.0, 0.5, 2.5, 10.0]:
+            events = [EventData(name="e", popularity=popularity, distance_km=distance)]
+            assert engine.calculate_event_factor(events) == 1.0 + _baseline_event_impact(popularity, distance)
+
+
+def test_first_matching_band_wins():
+    rules = PricingRules({"temperature_bands": [
+        {"min": 0, "max": 10, "adjustment": 0.1},
+        {"min": 5, "max": 20, "adjustment": 0.2},
+        {"above": 20, "adjustment": 0.3},
+    ]})
+    assert [rules.temperature_adjustment(t) for t in (-1.0, 0.0, 7.0, 10.0, 10.5, 20.0, 20.5)] == \
+        [0.0, 0.1, 0.1, 0.1, 0.2, 0.2, 0.3]
+
+
+@pytest.mark.parametrize("rules", [
+    {"temperature_bands": [{"min": 20}]},
+    {"temperature_bands": [{"min": "warm", "adjustment": 0.1}]},
+    {"temperature_bands": [{"min": 20, "adjustment": None}]},
+    {"conditions": [{"adjustment": 0.05}]},
+    {"conditions": [{"keywords": ["sunny"], "adjustment": "a lot"}]},
+    {"popularity_impact": {"high": "big"}},
+    {"popularity_impact": ["high"]},
+    {"default_event_impact": None},
+    {"distance_decay": "fast"},
+    ["temperature_bands"],
+])
+def test_invalid_rules_are_rejected(rules):
+    with pytest.raises(ValueError, match="Invalid pricing rules"):
+        PricingRules(rules)
+
+
+def test_invalid_or_missing_rules_file(tmp_path, monkeypatch):
+    with pytest.raises(FileNotFoundError):
+        load_rules(str(tmp_path / "missing.json"))
+
+    broken = tmp_path / "broken.json"
+    broken.write_text("{\"temperature_bands\": [", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_rules(str(broken))
+
+    invalid = tmp_path / "invalid.json"
+    invalid.write_text(json.dumps({"temperature_bands": [{"min": 20}]}), encoding="utf-8")
+    with pytest.raises(ValueError, match="Invalid pricing rules"):
+        load_rules(str(invalid))
+
+    # PRICING_RULES_FILE is read when no path is given
+    monkeypatch.setattr(settings, "PRICING_RULES_FILE", str(tmp_path / "missing.json"))
+    with pytest.raises(FileNotFoundError):
+        load_rules()
+
+
+def test_failed_reload_keeps_the_current_rules(tmp_path):
+    engine = PricingEngine(result_cache_size=16)
+    rules = engine.rules
+    request = PricingRequest(menu_item_id=1, current_price=100.0,
+                             weather=WeatherData(temperature=25.0, condition="Sunny"))
+    cached = engine.suggest_price(request)
+
+    with pytest.raises(FileNotFoundError):
+        engine.reload_rules(str(tmp_path / "missing.json"))
+    assert engine.rules is rules
+    assert engine.suggest_price(request) is cached
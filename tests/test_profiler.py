@@ -0,0 +1,24 @@
+"""Profiling a request through the middleware"""
+import sys
+import pytest
+from app.core.config import settings
+from app.utils.profiler import request_profiler
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"X-Admin-Key": "admin-test-key"}
+
+
+async def test_profiled_request_leaves_switch_interval_alone(client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", ADMIN["X-Admin-Key"])
+    switch_interval = sys.getswitchinterval()
+
+    response = await client.get("/health", headers={**ADMIN, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = int(response.headers["x-profile-id"])
+    assert sys.getswitchinterval() == switch_interval
+
+    response = await client.get(f"/api/admin/profiles/{profile_id}", headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json()["path"] == "/health"
+    request_profiler.clear()
@@ -0,0 +1,82 @@
+"""Which bucket the rate limiter charges a request to"""
+import pytest
+from app.core.config import Settings, settings
+from app.utils.rate_limit import RateLimitMiddleware, TokenBucketLimiter
+
+
+def _scope(peer: str = "10.0.0.9", **headers) -> dict:
+    return {
+        "type": "http",
+        "path": "/api/pricing/suggest",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        "client": (peer, 50000),
+    }
+
+
+def _middleware(monkeypatch, trusted_proxies: int = 0, client_header=None, burst: int = 3):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", trusted_proxies)
+    monkeypatch.setattr(settings, "RATE_LIMIT_CLIENT_HEADER", client_header)
+    return RateLimitMiddleware(
+        None,
+        TokenBucketLimiter(rate_per_minute=60, burst=burst),
+        TokenBucketLimiter(rate_per_minute=60, burst=burst * 2),
+    )
+
+
+def test_forwarded_for_ignored_without_trusted_proxies(monkeypatch):
+    middleware = _middleware(monkeypatch)
+    assert middleware.client_keys(_scope(x_forwarded_for="1.2.3.4")) == ("10.0.0.9", None)
+
+
+@pytest.mark.parametrize("trusted, forwarded, expected", [
+    (1, "203.0.113.7", "203.0.113.7"),
+    # whatever the client sent is left of what the proxy appended
+    (1, "1.2.3.4, 203.0.113.7", "203.0.113.7"),
+    (2, "1.2.3.4, 203.0.113.7, 10.1.1.1", "203.0.113.7"),
+    # fewer entries than proxies: not from the outermost one, fall back to the peer
+    (2, "203.0.113.7", "10.0.0.9"),
+])
+def test_rightmost_untrusted_hop(monkeypatch, trusted, forwarded, expected):
+    middleware = _middleware(monkeypatch, trusted_proxies=trusted)
+    assert middleware.client_keys(_scope(x_forwarded_for=forwarded))[0] == expected
+
+
+def test_spoofed_forwarded_for_shares_one_bucket(monkeypatch):
+    middleware = _middleware(monkeypatch, trusted_proxies=1)
+    results = [
+        middleware.acquire(_scope(x_forwarded_for=f"198.51.100.{i}, 203.0.113.7"))[0]
+        for i in range(5)
+    ]
+    assert results == [True] * 3 + [False] * 2
+
+
+def test_rotating_client_ids_hit_the_address_bucket(monkeypatch):
+    middleware = _middleware(monkeypatch, client_header="X-Client-Id")
+    results = [middleware.acquire(_scope(x_client_id=f"pos-{i}"))[0] for i in range(8)]
+    # a bucket per id, but six requests per address at most
+    assert results == [True] * 6 + [False] * 2
+
+    # one id is still held to its own bucket
+    other = [middleware.acquire(_scope(peer="10.0.0.10", x_client_id="pos-x"))[0] for _ in range(4)]
+    assert other == [True] * 3 + [False]
+
+
+def test_limiter_ships_disabled():
+    assert Settings.model_fields["RATE_LIMIT_PER_MINUTE"].default == 0
+    assert Settings.model_fields["RATE_LIMIT_TRUSTED_PROXIES"].default == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("trusted_proxies, warnings", [(0, 1), (1, 0)])
+async def test_forwarded_for_without_trusted_proxies_is_logged_once(monkeypatch, capsys, trusted_proxies, warnings):
+    middleware = _middleware(monkeypatch, trusted_proxies=trusted_proxies, burst=10)
+
+    async def app(scope, receive, send):
+        pass
+
+    middleware.app = app
+    await middleware(_scope(), None, None)
+    assert capsys.readouterr().out == ""
+    for i in range(3):
+        await middleware(_scope(x_forwarded_for=f"203.0.113.{i}"), None, None)
+    assert capsys.readouterr().out.count("RATE_LIMIT_TRUSTED_PROXIES=0") == warnings
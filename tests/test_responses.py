@@ -0,0 +1,42 @@
+"""Content negotiation between JSON and MessagePack"""
+import msgpack
+import pytest
+from app.utils.responses import JSON, MSGPACK, negotiate
+
+pytestmark = pytest.mark.anyio
+
+SUGGEST = {
+    "menu_item_id": 3,
+    "current_price": 120,
+    "competitor_prices": [110, 130],
+    "weather": {"temperature": 25, "condition": "Clear"},
+}
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("application/json", JSON),
+    ("application/msgpack", MSGPACK),
+    ("Application/MsgPack", MSGPACK),
+    ("APPLICATION/X-MSGPACK", MSGPACK),
+    ("application/json, application/msgpack;q=0.5", JSON),
+    ("application/json;q=0.5, Application/MsgPack", MSGPACK),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+async def test_negotiated_responses_vary_on_accept(client):
+    response = await client.post("/api/pricing/suggest", json=SUGGEST)
+    assert response.headers["content-type"] == JSON
+    assert "accept" in response.headers["vary"].lower()
+
+    response = await client.post("/api/pricing/suggest", json=SUGGEST, headers={"Accept": "Application/MsgPack"})
+    assert response.headers["content-type"] == MSGPACK
+    assert "accept" in response.headers["vary"].lower()
+    assert msgpack.unpackb(response.content)["menu_item_id"] == 3
+
+    response = await client.post("/api/pricing/suggest", json=SUGGEST, headers={"Accept": "Application/MsgPack;q=0"})
+    assert response.status_code == 406
+    assert "accept" in response.headers["vary"].lower()
@@ -0,0 +1,111 @@
+"""Startup schema check: fingerprint stamping, modes and retries while the database is down"""
+import asyncio
+import pytest
+from sqlalchemy import Column, Integer, Table, create_engine, event, inspect, select
+from app.db import database
+from app.db.database import Base, get_engine, init_db, schema_fingerprint, schema_version
+from app.models.database import WeatherCache
+from app.services.schema_check import SchemaCheck
+from app.utils.metrics import handled_errors
+
+
+@pytest.fixture
+def statements():
+    """SQL run on the sync engine during the test"""
+    seen = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        seen.append(" ".join(statement.split()).upper())
+
+    event.listen(get_engine(), "before_cursor_execute", capture)
+    yield seen
+    event.remove(get_engine(), "before_cursor_execute", capture)
+
+
+@pytest.fixture
+def changed_model():
+    """A model added after the database was stamped, removed again afterwards"""
+    table = Table("schema_check_probe", Base.metadata, Column("id", Integer, primary_key=True))
+    yield table
+    table.drop(get_engine(), checkfirst=True)
+    Base.metadata.remove(table)
+    init_db("always")
+
+
+def _stamp():
+    with get_engine().connect() as conn:
+        return conn.execute(select(schema_version.c.fingerprint, schema_version.c.applied_at)).all()
+
+
+def _writes(statements):
+    """DDL and stamp writes"""
+    return [s for s in statements if s.startswith(("CREATE", "DROP", "ALTER", "INSERT", "DELETE"))]
+
+
+def test_stamped_database_skips_ddl(statements):
+    assert init_db("stamp") == "current"
+    assert _writes(statements) == []
+    # one read of the stamp
+    assert sum(s.startswith("SELECT") and "FROM SCHEMA_VERSION" in s for s in statements) == 1
+
+
+def test_skip_mode_touches_nothing(statements):
+    assert init_db("skip") == "skipped"
+    assert statements == []
+
+
+def test_always_mode_recreates_and_restamps(statements):
+    (fingerprint, applied_at), = _stamp()
+    # dropped behind the stamp's back: stamp mode can't tell, always mode puts it back
+    WeatherCache.__table__.drop(get_engine())
+    assert init_db("stamp") == "current"
+    assert not inspect(get_engine()).has_table(WeatherCache.__tablename__)
+
+    assert init_db("always") == "created"
+    assert inspect(get_engine()).has_table(WeatherCache.__tablename__)
+    assert any(s.startswith("DELETE FROM SCHEMA_VERSION") for s in statements)
+    assert any(s.startswith("INSERT INTO SCHEMA_VERSION") for s in statements)
+
+    (new_fingerprint, new_applied_at), = _stamp()
+    assert new_fingerprint == fingerprint
+    assert new_applied_at >= applied_at
+
+
+def test_model_change_creates_the_table_and_moves_the_stamp(changed_model):
+    (old_fingerprint, _), = _stamp()
+    fingerprint = schema_fingerprint()
+    assert fingerprint != old_fingerprint
+    assert not inspect(get_engine()).has_table(changed_model.name)
+
+    assert init_db("stamp") == "created"
+    assert inspect(get_engine()).has_table(changed_model.name)
+    assert [row.fingerprint for row in _stamp()] == [fingerprint]
+    # the next boot finds the new stamp
+    assert init_db("stamp") == "current"
+
+
+@pytest.mark.anyio
+async def test_schema_check_retries_while_the_database_is_down(monkeypatch, tmp_path):
+    real_engine = get_engine()
+    # a file in a directory that doesn't exist, every connect fails
+    monkeypatch.setattr(database, "_engine", create_engine(f"sqlite:///{tmp_path / 'missing' / 'db.sqlite'}"))
+    errors = handled_errors._values.get(("schema_check",), 0)
+
+    check = SchemaCheck(mode="stamp", startup_wait=0.05, retry_max=0.05)
+    check.start()
+    try:
+        assert await check.wait() is False
+        while check.attempts < 3:
+            await asyncio.sleep(0.05)
+        assert check.status == "pending"
+        assert "unable to open database file" in check.last_error
+        assert handled_errors._values[("schema_check",)] >= errors + 2
+
+        # the database comes back
+        monkeypatch.setattr(database, "_engine", real_engine)
+        assert await check.wait(timeout=5.0) is True
+        assert check.status == "current"
+        assert check.last_error is None
+        assert check.stats()["checked_at"] is not None
+    finally:
+        await check.stop()
@@ -0,0 +1,87 @@
+"""Rate limits and upstream budgets shared by the workers of a host"""
+import multiprocessing
+import pytest
+from sqlalchemy.exc import DBAPIError
+from app.db import database
+from app.utils.quota import UpstreamQuota
+from app.utils.rate_limit import TokenBucketLimiter
+
+WORKERS = 3
+CALLS = 10
+
+
+def _limiter(directory: str, max_clients: int = 1000) -> TokenBucketLimiter:
+    return TokenBucketLimiter(rate_per_minute=1, burst=12, max_clients=max_clients, directory=directory)
+
+
+def _acquire_in_worker(directory: str) -> int:
+    limiter = _limiter(directory)
+    return sum(limiter.acquire("10.0.0.1")[0] for _ in range(CALLS))
+
+
+def _quota_in_worker(directory: str) -> int:
+    quota = UpstreamQuota("test", per_day=12, reserve=0, directory=directory)
+    return sum(quota.acquire() for _ in range(CALLS))
+
+
+def _run_workers(target, directory: str) -> list:
+    with multiprocessing.get_context("fork").Pool(WORKERS) as pool:
+        return pool.map(target, [directory] * WORKERS)
+
+
+def test_rate_limit_holds_across_workers(tmp_path):
+    allowed = _run_workers(_acquire_in_worker, str(tmp_path))
+    # one burst for the host, not one per worker
+    assert sum(allowed) == 12
+    assert len(_limiter(str(tmp_path))) == 1
+
+
+def test_quota_holds_across_workers(tmp_path):
+    allowed = _run_workers(_quota_in_worker, str(tmp_path))
+    assert sum(allowed) == 12
+    stats = UpstreamQuota("test", per_day=12, directory=str(tmp_path)).stats()
+    assert stats["shared"] is True and stats["day_calls"] == 12
+
+
+def test_shared_buckets_evict_the_least_recently_seen(tmp_path):
+    limiter = _limiter(str(tmp_path), max_clients=8)
+    for i in range(8):
+        limiter.acquire(f"client-{i}", now=100.0 + i)
+    limiter.acquire("client-0", now=110.0)
+    limiter.acquire("newcomer", now=111.0)
+    assert len(limiter) == 8
+    assert limiter.evicted_capacity == 1
+    # client-1 was dropped and starts over with a full bucket, client-0 kept its tokens
+    assert limiter.acquire("client-1", now=112.0) == (True, 0.0)
+    assert limiter.acquire("client-0", now=112.0)[0] is True
+
+
+def _dbapi_error(message: str, pgcode=None) -> DBAPIError:
+    orig = Exception(message)
+    orig.pgcode = pgcode
+    return DBAPIError("CREATE TABLE menu_items", {}, orig)
+
+
+@pytest.mark.parametrize("error, retried", [
+    (_dbapi_error('relation "menu_items" already exists', "42P07"), True),
+    (_dbapi_error("table menu_items already exists"), True),
+    (_dbapi_error("permission denied for schema public", "42501"), False),
+    (_dbapi_error("database is locked"), False),
+])
+def test_init_db_retries_only_duplicate_objects(monkeypatch, error, retried):
+    calls = []
+
+    def sync_schema(engine, fingerprint, mode):
+        calls.append(mode)
+        if len(calls) == 1:
+            raise error
+        return "current"
+
+    monkeypatch.setattr(database, "_sync_schema", sync_schema)
+    if retried:
+        assert database.init_db("stamp") == "current"
+        assert len(calls) == 2
+    else:
+        with pytest.raises(DBAPIError):
+            database.init_db("stamp")
+        assert len(calls) == 1